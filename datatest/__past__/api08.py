@@ -11,7 +11,7 @@ from datatest._load.temptable import load_data
 from datatest._load.temptable import new_table_name
 from datatest._load.temptable import savepoint
 from datatest._load.temptable import table_exists
-from datatest._query.query import DEFAULT_CONNECTION
+from datatest._query.query import DEFAULT_POOL
 from datatest._query.query import BaseElement
 from datatest._utils import file_types
 from datatest._utils import string_types
@@ -42,13 +42,15 @@ class DataSource(datatest.Selector):
             data_list = file
 
         new_cls = cls.__new__(cls)
-        new_cls._connection = DEFAULT_CONNECTION
-        cursor = new_cls._connection.cursor()
-        with savepoint(cursor):
-            table = new_table_name(cursor)
-            for obj in data_list:
-                load_csv(cursor, table, obj, encoding=encoding, **fmtparams)
-        new_cls._table = table if table_exists(cursor, table) else None
+        new_cls._init_state(DEFAULT_POOL, rebuildable=False)
+        with new_cls._pool.writer() as connection:
+            cursor = connection.cursor()
+            with savepoint(cursor):
+                table = new_table_name(cursor)
+                for obj in data_list:
+                    load_csv(cursor, table, obj, encoding=encoding,
+                             temporary=False, **fmtparams)
+            new_cls._table = table if table_exists(cursor, table) else None
         new_cls._data = file
         new_cls._args = (encoding,)
         new_cls._kwds = fmtparams
@@ -58,13 +60,14 @@ class DataSource(datatest.Selector):
     @classmethod
     def from_excel(cls, path, worksheet=0):
         new_cls = cls.__new__(cls)
-        new_cls._connection = DEFAULT_CONNECTION
-        cursor = new_cls._connection.cursor()
-        with savepoint(cursor):
-            table = new_table_name(cursor)
-            reader = get_reader.from_excel(path, worksheet=0)
-            load_data(cursor, table, reader)
-        new_cls._table = table if table_exists(cursor, table) else None
+        new_cls._init_state(DEFAULT_POOL, rebuildable=False)
+        with new_cls._pool.writer() as connection:
+            cursor = connection.cursor()
+            with savepoint(cursor):
+                table = new_table_name(cursor)
+                reader = get_reader.from_excel(path, worksheet=0)
+                load_data(cursor, table, reader, temporary=False)
+            new_cls._table = table if table_exists(cursor, table) else None
         new_cls._data = path
         new_cls._args = tuple()
         new_cls._kwds = dict()
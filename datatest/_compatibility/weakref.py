@@ -0,0 +1,39 @@
+"""compatibility layer for weakref (Python standard library)"""
+from __future__ import absolute_import
+from weakref import *
+
+
+try:
+    finalize  # New in Python 3.4
+except NameError:
+    # Simplified version of the Python 3.4 class (finalizers are
+    # not called when the interpreter exits).
+    class finalize(object):
+        """Call *func* with the given arguments when *obj* is garbage
+        collected or when the finalizer is called (whichever comes
+        first). The function is called at most once.
+        """
+        _registry = set()  # <- Keeps finalizers alive.
+
+        def __init__(self, obj, func, *args, **kwds):
+            self._func = func
+            self._args = args
+            self._kwds = kwds
+            self._ref = ref(obj, self)
+            finalize._registry.add(self)
+
+        def __call__(self, _=None):
+            if self in finalize._registry:
+                finalize._registry.discard(self)
+                return self._func(*self._args, **self._kwds)
+
+        def detach(self):
+            if self in finalize._registry:
+                finalize._registry.discard(self)
+                return (self._ref(), self._func, self._args, self._kwds)
+
+        @property
+        def alive(self):
+            return self in finalize._registry
+
+        atexit = False
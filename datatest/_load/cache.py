@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""Persistent on-disk cache for loaded data files.
+
+Each cache entry is an SQLite database file containing a single
+table (named by CACHE_TABLE) that holds the records loaded from a
+source file. Entries are keyed by a fingerprint of the source file
+(its path, size, modification time, and contents) and the arguments
+used to load it.
+
+Entries that are in use (e.g., attached to a connection) are marked
+with hold() and release() so that they are never evicted.
+"""
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from .._compatibility import collections
+from .temptable import get_dtypes
+from .temptable import load_data
+from .temptable import table_exists
+
+
+CACHE_TABLE = 'cached_data'
+CACHE_SUFFIX = '.sqlite3'
+
+_chunk_size = 1024 * 1024  # <- Bytes read at a time when hashing files.
+
+_in_use = collections.Counter()  # <- Reference counts of held entries.
+_in_use_lock = threading.Lock()
+
+
+def is_cacheable(obj):
+    """Returns True if *obj* is a path to an existing file."""
+    try:
+        return os.path.isfile(obj)
+    except (TypeError, ValueError):
+        return False
+
+
+def get_fingerprint(path, *args, **kwds):
+    """Return a hex-digest fingerprint for the file at *path* and
+    the given load arguments.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+
+    hasher = hashlib.sha1()
+    metadata = (path, stat.st_size, stat.st_mtime, args, sorted(kwds.items()))
+    hasher.update(repr(metadata).encode('utf-8'))
+    with open(path, 'rb') as fh:
+        chunk = fh.read(_chunk_size)
+        while chunk:
+            hasher.update(chunk)
+            chunk = fh.read(_chunk_size)
+    return hasher.hexdigest()
+
+
+def hold(cache_file):
+    """Mark *cache_file* as in use so it is not removed by evict()
+    (calls are counted, each must be matched by a call to release).
+    """
+    with _in_use_lock:
+        _in_use[os.path.abspath(cache_file)] += 1
+
+
+def release(cache_file):
+    """Release a *cache_file* that was marked as in use by hold()."""
+    cache_file = os.path.abspath(cache_file)
+    with _in_use_lock:
+        _in_use[cache_file] -= 1
+        if _in_use[cache_file] <= 0:
+            del _in_use[cache_file]
+
+
+def in_use():
+    """Return a set of the cache files currently marked as in use."""
+    with _in_use_lock:
+        return set(_in_use)
+
+
+def get_cache_file(cache_dir, path, loader, args=(), kwds=None,
+                   max_size=None, max_age=None, keep=()):
+    """Return the path of the cache entry for the file at *path*,
+    building the entry if it does not already exist.
+
+    The *loader* must be a function of two arguments (*cursor* and
+    *table*) that loads the contents of *path* into the given table.
+    The *args* and *kwds* are the arguments used to load the file
+    (they are part of the entry's fingerprint).
+
+    Before a new entry is added, old entries are evicted using the
+    given *max_size* and *max_age* limits (see evict()). Entries in
+    *keep* are not evicted (nor are entries marked by hold()).
+    """
+    fingerprint = get_fingerprint(path, *args, **(kwds or {}))
+    cache_file = os.path.join(cache_dir, fingerprint + CACHE_SUFFIX)
+
+    if os.path.isfile(cache_file):
+        os.utime(cache_file, None)  # <- Mark entry as recently used.
+        return cache_file  # <- EXIT!
+
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+
+    # Build entry using a temporary name and then rename it. This
+    # prevents readers from seeing an incomplete file.
+    fd, temp_file = tempfile.mkstemp(suffix='.tmp', dir=cache_dir)
+    os.close(fd)
+    try:
+        build_cache_file(temp_file, loader)
+        # Make room before adding new entry.
+        evict(cache_dir, max_size, max_age, keep)
+
+        try:
+            os.replace(temp_file, cache_file)  # New in Python 3.3.
+        except AttributeError:
+            if os.path.exists(cache_file):
+                os.remove(cache_file)
+            os.rename(temp_file, cache_file)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+    return cache_file
+
+
+def build_cache_file(cache_file, loader):
+    """Create a database at *cache_file* and call *loader* with a
+    cursor and the CACHE_TABLE name to load its records.
+    """
+    connection = sqlite3.connect(cache_file)
+    try:
+        connection.execute('PRAGMA synchronous=OFF')
+        connection.isolation_level = None  # <- Run in 'autocommit' mode.
+        loader(connection.cursor(), CACHE_TABLE)
+    finally:
+        connection.close()
+
+
+def load_cache_file(cursor, table, cache_file, temporary=True,
+                    source_table=CACHE_TABLE):
+    """Load the records from *cache_file* into *table* (columns are
+    aligned the same as any other loaded source). Records are read
+    from the *source_table* of the database. Returns False if the
+    database has no *source_table*, otherwise returns True.
+    """
+    connection = sqlite3.connect(cache_file)
+    try:
+        source = connection.cursor()
+        if not table_exists(source, source_table):
+            return False  # <- EXIT! (Source had no records.)
+        dtypes = get_dtypes(source, source_table)
+        source.execute('SELECT * FROM {0}'.format(source_table))
+        columns = [x[0] for x in source.description]
+        load_data(cursor, table, columns, source, temporary=temporary,
+                  dtypes=dtypes)
+        return True
+    finally:
+        connection.close()
+
+
+def evict(cache_dir, max_size=None, max_age=None, keep=()):
+    """Remove cache entries that have not been used within *max_age*
+    seconds and then remove the least recently used entries until
+    the total size is no more than *max_size* bytes (None means no
+    limit).
+
+    Entries that are in use--marked by hold() or given in *keep*--are
+    never removed (but their sizes still count toward *max_size*).
+    """
+    if max_size is None and max_age is None:
+        return  # <- EXIT!
+
+    keep = in_use().union(os.path.abspath(x) for x in keep)
+
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith(CACHE_SUFFIX):
+            continue
+        path = os.path.join(cache_dir, name)
+        stat = os.stat(path)
+        entries.append((stat.st_mtime, stat.st_size, path))
+    entries.sort(reverse=True)  # <- Most recently used first.
+
+    now = time.time()
+    total_size = 0
+    for last_used, size, path in entries:
+        total_size += size
+        if os.path.abspath(path) in keep:
+            continue
+        if ((max_age is not None and now - last_used > max_age)
+                or (max_size is not None and total_size > max_size)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # <- Already removed or still open (on Windows).
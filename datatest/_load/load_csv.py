@@ -16,14 +16,20 @@ def load_csv(cursor, table, csvfile, encoding=None, **kwds):
     global preferred_encoding
     global fallback_encoding
 
-    default = kwds.get('restval', '')  # Used for default column value.
+    # Keyword arguments used by load_data() rather than the reader.
+    load_kwds = {
+        'default': kwds.get('restval', ''),  # Used for default column value.
+        'temporary': kwds.pop('temporary', True),
+        'batch_size': kwds.pop('batch_size', None),
+        'dtypes': kwds.pop('dtypes', None),
+    }
 
     if encoding:
         # When an encoding is specified, use it to load *csvfile* or
         # fail if there are errors (no fallback recovery):
         with savepoint(cursor):
             reader = get_reader.from_csv(csvfile, encoding, **kwds)
-            load_data(cursor, table, reader, default=default)
+            load_data(cursor, table, reader, **load_kwds)
 
         return  # <- EXIT!
 
@@ -38,7 +44,7 @@ def load_csv(cursor, table, csvfile, encoding=None, **kwds):
     try:
         with savepoint(cursor):
             reader = get_reader.from_csv(csvfile, preferred_encoding, **kwds)
-            load_data(cursor, table, reader, default=default)
+            load_data(cursor, table, reader, **load_kwds)
 
         return  # <- EXIT!
 
@@ -63,7 +69,7 @@ def load_csv(cursor, table, csvfile, encoding=None, **kwds):
             try:
                 with savepoint(cursor):
                     reader = get_reader.from_csv(csvfile, fallback, **kwds)
-                    load_data(cursor, table, reader, default=default)
+                    load_data(cursor, table, reader, **load_kwds)
 
                 msg = (
                     '{0}: loaded {1!r} using fallback {2!r}: specify an '
@@ -1,9 +1,14 @@
 # -*- coding: utf-8 -*-
+import re
 import sqlite3
+from numbers import Integral
+from numbers import Real
 from .._compatibility.collections import Iterable
 from .._compatibility.collections import Mapping
+from .._compatibility.collections import namedtuple
 from .._compatibility.itertools import chain
 from .._compatibility.itertools import count
+from .._compatibility.itertools import islice
 
 
 try:
@@ -60,8 +65,131 @@ def normalize_default(value):
     return repr(value)
 
 
-def create_table(cursor, table, columns, default=''):
-    """Creates a temporary table using *table* and *columns* names."""
+# Sample size used when inferring column types (see infer_dtypes).
+infer_sample_size = 1000
+
+_dtype_names = {
+    int: 'INTEGER',
+    float: 'REAL',
+    str: 'TEXT',
+    'INTEGER': 'INTEGER',
+    'REAL': 'REAL',
+    'TEXT': 'TEXT',
+    'NUMERIC': 'NUMERIC',
+}
+
+_integer_pattern = re.compile(r'^(0|-?[1-9][0-9]*)$')
+_real_pattern = re.compile(
+    r'^-?((0|[1-9][0-9]*)(\.[0-9]*)?|\.[0-9]+)([eE][+-]?[0-9]+)?$')
+_integer_range = (-2 ** 63, 2 ** 63 - 1)  # <- SQLite's 64-bit integers.
+
+
+def _is_integer_text(text):
+    """Return True if SQLite would store *text* as an INTEGER
+    without changing it.
+    """
+    if not _integer_pattern.match(text):
+        return False
+    return _integer_range[0] <= int(text) <= _integer_range[1]
+
+
+def _is_real_text(text):
+    """Return True if SQLite would store *text* as a REAL without
+    changing it (it must be the shortest text that round-trips to
+    the same float, like '1.5' but not '1.50' or '15e-1').
+    """
+    if not _real_pattern.match(text):
+        return False
+    return repr(float(text)) == text
+
+
+def normalize_dtypes(dtypes):
+    """Return a dictionary that maps normalized column names to the
+    SQLite type names given in *dtypes*. Types can be given as type
+    names ('INTEGER', 'REAL', 'TEXT', or 'NUMERIC') or as Python
+    types (int, float, or str).
+    """
+    normalized = {}
+    for column, dtype in (dtypes or {}).items():
+        key = dtype.upper() if isinstance(dtype, string_types) else dtype
+        try:
+            normalized[normalize_names(column)] = _dtype_names[key]
+        except (KeyError, TypeError):
+            msg = 'unsupported type for column {0!r}: {1!r}'
+            raise ValueError(msg.format(column, dtype))
+    return normalized
+
+
+def infer_dtypes(columns, records):
+    """Return a dictionary of column types inferred from the values
+    in *records* (a sequence of rows aligned with *columns*). Columns
+    whose values are all integers get 'INTEGER' and columns whose
+    values are all numbers get 'REAL'. Empty strings and None values
+    are ignored and other columns are left out of the result (they
+    keep no type affinity).
+
+    Strings are only treated as numbers when SQLite would store them
+    as numbers without changing their text. Integers must be in
+    canonical form (no '+' sign or leading zeros) and fit in 64 bits.
+    Reals must round-trip through ``repr(float(text))`` and can not
+    be mixed with integer strings (a REAL column would store '5' as
+    5.0). So values like '007', '+5', ' 12', and '1.50' are not
+    numeric.
+    """
+    is_integer = [True] * len(columns)
+    is_number = [True] * len(columns)
+    has_values = [False] * len(columns)
+    has_integer_text = [False] * len(columns)
+
+    for record in records:
+        for index, value in enumerate(record):
+            if not is_number[index] or value is None or value == '':
+                continue
+            has_values[index] = True
+
+            if isinstance(value, bool):
+                is_number[index] = False
+            elif isinstance(value, Integral):
+                pass
+            elif isinstance(value, Real):
+                is_integer[index] = False
+            elif isinstance(value, string_types):
+                if _is_integer_text(value):
+                    has_integer_text[index] = True
+                elif _is_real_text(value):
+                    is_integer[index] = False
+                else:
+                    is_number[index] = False
+            else:
+                is_number[index] = False
+
+    dtypes = {}
+    for index, column in enumerate(columns):
+        if not has_values[index] or not is_number[index]:
+            continue
+        if is_integer[index]:
+            dtypes[column] = 'INTEGER'
+        elif not has_integer_text[index]:
+            dtypes[column] = 'REAL'
+    return dtypes
+
+
+def _column_def(column, default, dtypes):
+    """Return a column definition for the normalized *column* name."""
+    dtype = dtypes.get(column) if dtypes else None
+    if dtype:
+        return '{0} {1} DEFAULT {2}'.format(column, dtype, default)
+    return '{0} DEFAULT {1}'.format(column, default)
+
+
+def create_table(cursor, table, columns, default='', temporary=True, dtypes=None):
+    """Creates a temporary table using *table* and *columns* names.
+    If *temporary* is False, a regular table is created instead (so
+    it can be read from other connections to the same database).
+
+    The optional *dtypes* mapping gives column types (see
+    normalize_dtypes). Columns without a type have no affinity.
+    """
     columns = normalize_names(columns)
     if columns.count('""') > 1:
         custom_message = ('duplicate column name: contains multiple '
@@ -74,23 +202,59 @@ def create_table(cursor, table, columns, default=''):
         # OperationalError and re-raising it with a modified message.
 
     default = normalize_default(default)
-    column_defs = ['{0} DEFAULT {1}'.format(x, default) for x in columns]
+    dtypes = normalize_dtypes(dtypes)
+    column_defs = [_column_def(x, default, dtypes) for x in columns]
     column_defs = ', '.join(column_defs)
 
-    statement = 'CREATE TEMPORARY TABLE {0} ({1})'.format(table, column_defs)
+    if temporary:
+        statement = 'CREATE TEMPORARY TABLE {0} ({1})'
+    else:
+        statement = 'CREATE TABLE {0} ({1})'
+    statement = statement.format(table, column_defs)
     cursor.execute(statement)
 
 
+def split_table_name(table):
+    """Split a *table* name into a two-tuple of its schema and base
+    name. If *table* is not qualified with a schema name, the schema
+    will be None.
+    """
+    schema, _, name = table.rpartition('.')
+    return (schema or None), name
+
+
+def table_info_statement(table):
+    """Return a 'PRAGMA table_info' statement for *table* (which
+    can be qualified with a schema name).
+    """
+    schema, name = split_table_name(table)
+    if schema:
+        return 'PRAGMA {0}.table_info({1})'.format(schema, name)
+    return 'PRAGMA table_info({0})'.format(name)
+
+
 def get_columns(cursor, table):
     """Returns list of column names used in table."""
-    cursor.execute('PRAGMA table_info({0})'.format(table))
+    cursor.execute(table_info_statement(table))
     columns = [x[1] for x in cursor]
     if not columns:
         raise sqlite3.ProgrammingError('no such table: {0}'.format(table))
     return columns
 
 
-def insert_records(cursor, table, columns, records):
+def get_dtypes(cursor, table):
+    """Returns a dictionary of column names and their declared types
+    (columns without a declared type are not included).
+    """
+    cursor.execute(table_info_statement(table))
+    return dict((x[1], x[2].upper()) for x in cursor if x[2])
+
+
+def insert_records(cursor, table, columns, records, batch_size=None):
+    """Insert *records* into *table*. When *batch_size* is given,
+    records are inserted in batches of the given size (otherwise,
+    all records are passed to a single executemany() call).
+    """
     table = normalize_names(table)
     columns = normalize_names(columns)
     sql = 'INSERT INTO {0} ({1}) VALUES ({2})'.format(
@@ -99,7 +263,14 @@ def insert_records(cursor, table, columns, records):
         ', '.join(['?'] * len(columns)),
     )
     try:
-        cursor.executemany(sql, records)
+        if batch_size:
+            records_iter = iter(records)
+            batch = list(islice(records_iter, batch_size))
+            while batch:
+                cursor.executemany(sql, batch)
+                batch = list(islice(records_iter, batch_size))
+        else:
+            cursor.executemany(sql, records)
     except sqlite3.ProgrammingError as error:
         if 'incorrect number of bindings' in str(error).lower():
             msg = (
@@ -113,20 +284,50 @@ def insert_records(cursor, table, columns, records):
         raise error
 
 
-def alter_table(cursor, table, columns, default=''):
+def alter_table(cursor, table, columns, default='', dtypes=None):
     existing_columns = set(normalize_names(get_columns(cursor, table)))
+    dtypes = normalize_dtypes(dtypes)
     for column in normalize_names(columns):
         if column in existing_columns:
             continue
 
         default = normalize_default(default)
-        sql = 'ALTER TABLE {0} ADD COLUMN {1} DEFAULT {2}'
-        sql = sql.format(table, column, default)
+        sql = 'ALTER TABLE {0} ADD COLUMN {1}'
+        sql = sql.format(table, _column_def(column, default, dtypes))
 
         cursor.execute(sql)
         existing_columns.add(column)
 
 
+def copy_table(cursor, source, table, default='', temporary=True):
+    """Create a new *table* containing the columns and records of
+    the *source* table.
+    """
+    columns = get_columns(cursor, source)
+    dtypes = get_dtypes(cursor, source)
+    create_table(cursor, table, columns, default=default,
+                 temporary=temporary, dtypes=dtypes)
+    cursor.execute('INSERT INTO {0} SELECT * FROM {1}'.format(table, source))
+
+
+def get_indexes(cursor, table):
+    """Returns list of (name, sql) tuples for the indexes on *table*
+    (automatic indexes are not included).
+    """
+    cursor.execute('''
+        SELECT name, sql
+        FROM sqlite_master
+        WHERE type='index' AND tbl_name=? AND sql IS NOT NULL
+
+        UNION ALL
+
+        SELECT name, sql
+        FROM sqlite_temp_master
+        WHERE type='index' AND tbl_name=? AND sql IS NOT NULL
+    ''', (table, table))
+    return cursor.fetchall()
+
+
 def drop_table(cursor, table):
     table = normalize_names(table)
     cursor.execute('DROP TABLE IF EXISTS {0}'.format(table))
@@ -155,14 +356,26 @@ class savepoint(object):
         if exc_type is None:
             self.cursor.execute('RELEASE {0}'.format(self.name))
         else:
+            # A "ROLLBACK TO" leaves the savepoint on the transaction
+            # stack so it must also be released. Otherwise, the outer
+            # transaction stays open and its changes are never seen
+            # by other connections.
             self.cursor.execute('ROLLBACK TO {0}'.format(self.name))
+            self.cursor.execute('RELEASE {0}'.format(self.name))
 
 
 def load_data(cursor, table, *args, **kwds):
     """
-    load_data(cursor, table, columns, records, default='')
-    load_data(cursor, table, records, default='')
+    load_data(cursor, table, columns, records, default='', temporary=True, batch_size=None, dtypes=None)
+    load_data(cursor, table, records, default='', temporary=True, batch_size=None, dtypes=None)
+
+    The *dtypes* can be a mapping of column names to types (see
+    normalize_dtypes) or the string 'infer' to infer types from the
+    first *infer_sample_size* records (see infer_dtypes). Values are
+    converted by SQLite's type affinity as they are inserted.
     """
+    global infer_sample_size
+
     try:
         records, = args
         columns = None
@@ -170,6 +383,9 @@ def load_data(cursor, table, *args, **kwds):
         columns, records = args
 
     default = kwds.pop('default', '')
+    temporary = kwds.pop('temporary', True)
+    batch_size = kwds.pop('batch_size', None)
+    dtypes = kwds.pop('dtypes', None)
     if kwds:
         msg = 'load_data() got unexpected keyword argument {0!r}'
         raise TypeError(msg.format(next(iter(kwds.keys()))))
@@ -200,9 +416,151 @@ def load_data(cursor, table, *args, **kwds):
     if isinstance(first_record, Mapping):
         records = ([rec.get(c, '') for c in columns] for rec in records)
 
+    if isinstance(dtypes, string_types) and dtypes == 'infer':
+        sample = list(islice(records, infer_sample_size))
+        dtypes = infer_dtypes(columns, sample)
+        records = chain(sample, records)
+
     with savepoint(cursor):
         if table_exists(cursor, table):
-            alter_table(cursor, table, columns, default=default)
+            alter_table(cursor, table, columns, default=default, dtypes=dtypes)
         else:
-            create_table(cursor, table, columns, default=default)
-        insert_records(cursor, table, columns, records)
+            create_table(cursor, table, columns, default=default,
+                         temporary=temporary, dtypes=dtypes)
+        insert_records(cursor, table, columns, records, batch_size)
+
+
+LoadProfile = namedtuple(
+    typename='LoadProfile',
+    field_names=(
+        'batch_size',     # Number of records per executemany() call.
+        'journal_mode',   # PRAGMA journal_mode (e.g., 'MEMORY').
+        'cache_size',     # PRAGMA cache_size (negative values are KiB).
+        'temp_store',     # PRAGMA temp_store (e.g., 'MEMORY').
+        'locking_mode',   # PRAGMA locking_mode (e.g., 'EXCLUSIVE').
+        'defer_indexes',  # If True, rebuild indexes after loading.
+    ),
+)
+
+# Preset profiles for bulk loading. Fields set to None leave the
+# connection's current settings unchanged.
+load_profiles = {
+    'default': LoadProfile(
+        batch_size=None,
+        journal_mode=None,
+        cache_size=None,
+        temp_store=None,
+        locking_mode=None,
+        defer_indexes=False,
+    ),
+    'fast-ephemeral': LoadProfile(
+        batch_size=10000,
+        journal_mode='MEMORY',
+        cache_size=-262144,  # <- 256 MiB
+        temp_store='MEMORY',
+        locking_mode='EXCLUSIVE',
+        defer_indexes=True,
+    ),
+    'low-memory': LoadProfile(
+        batch_size=1000,
+        journal_mode=None,
+        cache_size=-2048,  # <- 2 MiB
+        temp_store='FILE',
+        locking_mode=None,
+        defer_indexes=False,
+    ),
+}
+
+
+def get_load_profile(profile):
+    """Return a LoadProfile for *profile*. The *profile* can be the
+    name of a preset, a mapping of LoadProfile fields (unspecified
+    fields use the 'default' preset), a LoadProfile, or None.
+    """
+    if profile is None:
+        return load_profiles['default']
+    if isinstance(profile, LoadProfile):
+        return profile
+    if isinstance(profile, Mapping):
+        return load_profiles['default']._replace(**profile)
+    try:
+        return load_profiles[profile]
+    except KeyError:
+        msg = 'unknown load profile {0!r}, expected one of: {1}'
+        names = ', '.join(repr(x) for x in sorted(load_profiles))
+        raise ValueError(msg.format(profile, names))
+
+
+class bulk_load(object):
+    """Context manager to apply a load *profile* (see LoadProfile)
+    to the cursor's connection while loading records into *table*.
+    Connection settings are restored when the block exits.
+
+    This should be used outside of any open transaction. Some
+    settings can not always be applied: databases in WAL mode keep
+    their journal and locking modes (changing them would lock out
+    other connections) and temp_store can not be changed while the
+    connection has temporary tables (doing so would delete them).
+    In these cases, the current settings are kept.
+    """
+    def __init__(self, cursor, table, profile=None):
+        self.cursor = cursor
+        self.table = table
+        self.profile = get_load_profile(profile)
+        self._original_pragmas = []
+        self._indexes = []
+
+    def _get_pragma(self, name):
+        self.cursor.execute('PRAGMA {0}'.format(name))
+        return self.cursor.fetchone()[0]
+
+    def _has_temp_tables(self):
+        self.cursor.execute('SELECT COUNT(*) FROM sqlite_temp_master')
+        return self.cursor.fetchone()[0] > 0
+
+    def _is_wal(self):
+        return str(self._get_pragma('journal_mode')).lower() == 'wal'
+
+    def __enter__(self):
+        profile = self.profile
+        pragmas = [
+            ('journal_mode', profile.journal_mode),
+            ('cache_size', profile.cache_size),
+            ('temp_store', profile.temp_store),
+            ('locking_mode', profile.locking_mode),
+        ]
+        for name, value in pragmas:
+            if value is None:
+                continue
+            if name == 'temp_store' and self._has_temp_tables():
+                continue
+            if name in ('journal_mode', 'locking_mode') and self._is_wal():
+                continue
+
+            original = self._get_pragma(name)
+            try:
+                self.cursor.execute('PRAGMA {0}={1}'.format(name, value))
+            except sqlite3.OperationalError:  # <- Database is locked.
+                continue
+
+            self._original_pragmas.append((name, original))
+
+        if profile.defer_indexes and table_exists(self.cursor, self.table):
+            self._indexes = get_indexes(self.cursor, self.table)
+            for name, _ in self._indexes:
+                self.cursor.execute('DROP INDEX {0}'.format(name))
+
+        return profile
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        for _, sql in self._indexes:
+            self.cursor.execute(sql)  # <- Rebuild indexes.
+
+        for name, original in reversed(self._original_pragmas):
+            self.cursor.execute('PRAGMA {0}={1}'.format(name, original))
+
+        if self._original_pragmas:
+            # When leaving EXCLUSIVE locking mode, locks are not
+            # released until the next time the database is read.
+            self.cursor.execute('SELECT 1 FROM sqlite_master LIMIT 1')
+            self.cursor.fetchall()
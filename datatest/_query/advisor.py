@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+import threading
+
+from .._compatibility import collections
+
+
+class IndexAdvisor(object):
+    """Records the columns used by queries and decides when an
+    index for a combination of columns should be created::
+
+        advisor = IndexAdvisor(hits=10)
+
+        if advisor.record(('A', 'B'), elapsed=0.25):
+            ...  # <- Create index for columns 'A' and 'B'.
+
+    An index is advised once a combination has been used *hits*
+    times or once the queries that use it have taken a total of
+    *seconds* (whichever comes first). Either threshold can be None
+    to disable it. Each combination is only advised once.
+    """
+    def __init__(self, hits=10, seconds=None):
+        self.hits = hits
+        self.seconds = seconds
+        self.created = []  # <- Combinations that have been advised.
+        self._hit_counts = collections.defaultdict(int)
+        self._elapsed = collections.defaultdict(float)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_columns(where_columns, key_columns):
+        """Return the combination of columns to index for a query
+        with the given *where_columns* and *key_columns* (used by
+        GROUP BY or ORDER BY clauses). Where-clause columns come
+        first (sorted by name) so they can be matched as a prefix.
+        """
+        columns = []
+        for column in list(sorted(where_columns)) + list(key_columns):
+            if column not in columns:
+                columns.append(column)
+        return tuple(columns)
+
+    def record(self, columns, elapsed=0.0):
+        """Record a query that used *columns* and took *elapsed*
+        seconds. Returns True if an index should be created for
+        *columns* (this happens only once per combination).
+        """
+        if not columns:
+            return False
+
+        with self._lock:
+            if columns in self.created:
+                return False
+
+            self._hit_counts[columns] += 1
+            self._elapsed[columns] += elapsed
+            if ((self.hits is not None
+                    and self._hit_counts[columns] >= self.hits)
+                    or (self.seconds is not None
+                        and self._elapsed[columns] >= self.seconds)):
+                self.created.append(columns)
+                return True
+        return False
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+import threading
+
+from .._compatibility import collections
+
+
+class MemoryBudget(object):
+    """Keeps track of the size (in bytes) of items that can be
+    evicted and decides which items to evict when their total size
+    exceeds *max_bytes*::
+
+        budget = MemoryBudget(max_bytes=2**30)
+        budget.set_size('a', 5000)
+        budget.touch('a')  # <- Mark as recently used.
+
+        for key in budget.get_evictions():
+            ...  # <- Evict item.
+
+    Items are evicted in least recently used order. The budget can
+    be used from multiple threads.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._sizes = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def set_size(self, key, size):
+        """Set the *size* of the item for *key* and mark it as the
+        most recently used.
+        """
+        with self._lock:
+            self._sizes.pop(key, None)
+            self._sizes[key] = size
+
+    def touch(self, key):
+        """Mark the item for *key* as the most recently used (does
+        nothing if *key* is not being tracked).
+        """
+        with self._lock:
+            size = self._sizes.pop(key, None)
+            if size is not None:
+                self._sizes[key] = size
+
+    def discard(self, key):
+        """Stop tracking the item for *key*."""
+        with self._lock:
+            self._sizes.pop(key, None)
+
+    @property
+    def total(self):
+        """The total size of all tracked items."""
+        return sum(self._sizes.values())
+
+    def get_evictions(self, keep=None):
+        """Return a list of keys that should be evicted (least recently
+        used first) to bring the total size within the budget. The
+        item for *keep* is never included. Returned keys are no longer
+        tracked.
+        """
+        with self._lock:
+            total = sum(self._sizes.values())
+            evictions = []
+            for key, size in list(self._sizes.items()):
+                if total <= self.max_bytes:
+                    break
+                if key == keep:
+                    continue
+                del self._sizes[key]
+                total -= size
+                evictions.append(key)
+            return evictions
+
+    def __len__(self):
+        return len(self._sizes)
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+import threading
+
+from .._compatibility import collections
+
+
+class LRUCache(object):
+    """A mapping-like cache that holds up to *maxsize* items and
+    discards the least recently used items when it is full::
+
+        cache = LRUCache(maxsize=128)
+        cache.set('key', 'value')
+        found, value = cache.get('key')
+
+    The cache can be used from multiple threads.
+    """
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return a two-tuple of a boolean (True if *key* was found)
+        and the cached value (or None if *key* was not found).
+        """
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return False, None
+            self._data[key] = value  # <- Move to most recently used.
+            self.hits += 1
+            return True, value
+
+    def set(self, key, value):
+        """Add *key* and *value* to the cache."""
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)  # <- Least recently used.
+
+    def clear(self):
+        """Remove all items from the cache."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
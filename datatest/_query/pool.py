@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+import atexit
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import weakref
+try:
+    from urllib.request import pathname2url
+except ImportError:
+    from urllib import pathname2url  # <- Python 2.
+
+from .._compatibility import collections
+from .._compatibility import contextlib
+from .._compatibility import itertools
+from .._load.cache import hold
+from .._load.cache import release
+
+
+class _Connection(sqlite3.Connection):
+    """SQLite connection that supports weak references (the built-in
+    connection type does not).
+    """
+    pass
+
+
+def _get_attached_limit(connection):
+    """Return the maximum number of databases that can be attached
+    to *connection*.
+    """
+    try:
+        return connection.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+    except AttributeError:  # <- getlimit() is new in Python 3.11.
+        return 10  # <- SQLite's default SQLITE_MAX_ATTACHED.
+
+
+class ConnectionPool(object):
+    """A pool of SQLite connections to a single database file.
+
+    Each thread receives its own connection for reading but all
+    writes are made through a single connection that is guarded
+    by a lock::
+
+        pool = ConnectionPool()
+
+        connection = pool.connection()  # <- Per-thread connection.
+
+        with pool.writer() as connection:
+            ...                         # <- Serialized writes.
+
+    When *database* is omitted, a new temporary file is created and
+    it is removed when the pool is closed (or when the interpreter
+    exits). Tables that need to be visible to all connections must
+    be created as regular (non-temporary) tables.
+
+    The *mode* determines where the data is stored:
+
+    * ``'file'`` (the default) uses a database file. If *mmap_size*
+      is given, connections read the file using memory-mapped I/O
+      of up to *mmap_size* bytes.
+    * ``'memory'`` uses a private in-memory database. Since it can
+      only be reached from a single connection, that connection is
+      shared by all threads.
+    * ``'shared-memory'`` uses a named in-memory database with a
+      shared cache so that each thread can have its own connection
+      (requires Python 3.4 or newer). Readers do not take table
+      locks (they use read-uncommitted isolation) so they are not
+      blocked by the writer. But changes to the schema (e.g., adding
+      a table or column) fail with "database table is locked" while
+      other connections are reading.
+    """
+    _memory_names = ('datatest-{0}'.format(x) for x in itertools.count())
+
+    def __init__(self, database=None, timeout=60.0, mode='file', mmap_size=None):
+        self._is_tempfile = False
+        self._uri = sys.version_info[:2] >= (3, 4)  # <- URI filenames.
+        if mode == 'file':
+            if database is None:
+                fd, database = tempfile.mkstemp(prefix='datatest-', suffix='.db')
+                os.close(fd)
+                self._is_tempfile = True
+                atexit.register(self.close)
+        elif mode == 'memory':
+            database = ':memory:'
+        elif mode == 'shared-memory':
+            if sys.version_info[:2] < (3, 4):
+                msg = "mode 'shared-memory' requires Python 3.4 or newer"
+                raise ValueError(msg)
+            name = database or next(self._memory_names)
+            database = 'file:{0}?mode=memory&cache=shared'.format(name)
+        else:
+            msg = "mode must be 'file', 'memory', or 'shared-memory', got {0!r}"
+            raise ValueError(msg.format(mode))
+
+        self.database = database
+        self.timeout = timeout
+        self.mode = mode
+        self.mmap_size = mmap_size
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._connections = weakref.WeakSet()
+        self._attached = collections.OrderedDict()  # <- Schema to (name, path).
+        self._attached_version = 0
+        self._schema_names = ('db{0}'.format(x) for x in itertools.count())
+
+        self._write_connection = self._connect()
+        self.max_attached = _get_attached_limit(self._write_connection)
+
+        # Write-ahead logging lets readers and the writer work at
+        # the same time (readers don't block the writer and the
+        # writer doesn't block readers).
+        self._write_connection.execute('PRAGMA journal_mode=WAL')
+
+    def _connect(self):
+        # The synchronous flag is set to "OFF" for faster insertions
+        # and commits. Since the database is temporary, long-term
+        # integrity should not be a concern--in the unlikely event
+        # of data corruption, it should be entirely acceptable to
+        # simply rebuild the temporary tables.
+        kwds = {'uri': True} if self._uri else {}
+        connection = sqlite3.connect(
+            self.database,
+            timeout=self.timeout,
+            check_same_thread=False,  # <- Checked by pool, see below.
+            factory=_Connection,
+            **kwds
+        )
+        connection.execute('PRAGMA synchronous=OFF')
+        if self.mmap_size is not None:
+            connection.execute('PRAGMA mmap_size={0:d}'.format(self.mmap_size))
+        if self.mode == 'shared-memory':
+            connection.execute('PRAGMA read_uncommitted=1')
+        connection.isolation_level = None  # <- Run in 'autocommit' mode.
+        self._connections.add(connection)
+        return connection
+
+    @property
+    def write_connection(self):
+        """The connection used for writing. Code that uses this
+        connection directly is responsible for its own locking (see
+        :meth:`writer`).
+        """
+        return self._write_connection
+
+    def connection(self):
+        """Return a connection for use by the calling thread. The
+        connection is created on first use and is reused by later
+        calls from the same thread.
+        """
+        if self.mode == 'memory':
+            return self._write_connection  # <- EXIT! (Only connection.)
+
+        # Since connections are stored in thread-local storage, they
+        # are never shared between threads (even though sqlite3's own
+        # same-thread check is disabled to allow a clean shutdown).
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._connect()
+            self._local.connection = connection
+            self._local.attached = collections.OrderedDict()
+            self._local.attached_version = None
+
+        if self._local.attached_version != self._attached_version:
+            with self._lock:
+                self._sync_attached(connection, self._local.attached)
+                self._local.attached_version = self._attached_version
+        return connection
+
+    def _sync_attached(self, connection, attached):
+        """Attach and detach databases on *connection* to match
+        the pool. The *attached* mapping records the databases
+        currently attached to *connection* and is updated in place.
+        """
+        for schema in list(attached.keys()):
+            if self._attached.get(schema) != attached[schema]:
+                connection.execute('DETACH DATABASE {0}'.format(schema))
+                del attached[schema]
+
+        for schema, (name, path) in self._attached.items():
+            if schema not in attached:
+                if not os.path.exists(path):
+                    continue  # <- Skip files that were removed after
+                              #    being attached to other connections.
+                statement = 'ATTACH DATABASE ? AS {0}'.format(schema)
+                connection.execute(statement, (name,))
+                attached[schema] = (name, path)
+
+    def can_attach(self):
+        """Return True if another database can be attached (SQLite
+        limits the number of attached databases, 10 by default).
+        """
+        with self._lock:
+            return len(self._attached) < self.max_attached
+
+    def attach(self, path, read_only=False):
+        """Attach the database file *path* to all connections in
+        the pool and return its schema name. Connections in other
+        threads attach the database on their next use.
+
+        Attached files are marked as in use (see cache.hold()) so that
+        cache entries are not evicted while they are attached.
+
+        If *read_only* is True, the file is opened in read-only mode
+        (requires Python 3.4 or newer, older versions open the file
+        normally and rely on the caller not to write to it).
+
+        Since SQLite cannot attach databases inside a transaction,
+        this must not be called while the write connection has an
+        open savepoint. Use can_attach() to check that the limit of
+        attached databases has not been reached.
+        """
+        name = path
+        if read_only and self._uri:
+            url = pathname2url(os.path.abspath(path))
+            name = 'file:{0}?mode=ro'.format(url)
+
+        with self._lock:
+            schema = next(self._schema_names)
+            statement = 'ATTACH DATABASE ? AS {0}'.format(schema)
+            self._write_connection.execute(statement, (name,))
+            self._attached[schema] = (name, path)
+            self._attached_version += 1
+        hold(path)
+        return schema
+
+    def detach(self, schema):
+        """Detach the database with the given *schema* name from
+        all connections in the pool.
+        """
+        with self._lock:
+            if schema not in self._attached:
+                return  # <- EXIT! (Pool was closed.)
+            _, path = self._attached.pop(schema)
+            self._write_connection.execute('DETACH DATABASE {0}'.format(schema))
+            self._attached_version += 1
+        release(path)
+
+    @contextlib.contextmanager
+    def writer(self):
+        """Context manager that acquires the pool's write lock and
+        returns the write connection. Only one thread at a time can
+        hold the write connection.
+        """
+        with self._lock:
+            yield self._write_connection
+
+    def close(self):
+        """Close all connections and remove the temporary database
+        file (if one was created).
+        """
+        with self._lock:
+            for connection in list(self._connections):
+                connection.close()
+            self._connections.clear()
+            self._local = threading.local()
+
+            for _, path in self._attached.values():
+                release(path)
+            self._attached.clear()
+
+            if self._is_tempfile:
+                for suffix in ('', '-wal', '-shm'):
+                    path = self.database + suffix
+                    if os.path.exists(path):
+                        os.remove(path)
+                self._is_tempfile = False
@@ -1,13 +1,27 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
+import csv
 import inspect
 try:
     import sqlite3
 except ImportError:
     sqlite3 = None  # Missing from Jython and Micropython.
+import hashlib
+import math
+import multiprocessing
+import os
+import random
+import re
+import shutil
 import sys
+import tempfile
+import threading
+import time
+import zlib
 from io import IOBase
 from glob import glob
+from multiprocessing.pool import ThreadPool
+from numbers import Integral
 from numbers import Number
 
 from .._compatibility.builtins import *
@@ -16,6 +30,7 @@ from .._compatibility import collections
 from .._compatibility import contextlib
 from .._compatibility import functools
 from .._compatibility import itertools
+from .._compatibility import weakref
 from .._utils import _expects_multiple_params
 from .._utils import _flatten
 from .._utils import iterpeek
@@ -26,13 +41,37 @@ from .._utils import _make_token
 from .._utils import _unique_everseen
 from .._utils import file_types
 from .._utils import string_types
+from .._utils import regex_types
 from .._load.get_reader import get_reader
 from .._load.load_csv import load_csv
+from .._load.temptable import alter_table
+from .._load.temptable import create_table
 from .._load.temptable import drop_table
+from .._load.temptable import get_columns
+from .._load.temptable import get_dtypes
 from .._load.temptable import load_data
 from .._load.temptable import new_table_name
 from .._load.temptable import savepoint
 from .._load.temptable import table_exists
+from .._load.temptable import copy_table
+from .._load.temptable import split_table_name
+from .._load.temptable import table_info_statement
+from .._load.temptable import bulk_load
+from .._load.temptable import get_load_profile
+from .._load.cache import CACHE_TABLE
+from .._load.cache import CACHE_SUFFIX
+from .._load.cache import build_cache_file
+from .._load.cache import get_cache_file
+from .._load.cache import in_use as cache_files_in_use
+from .._load.cache import is_cacheable
+from .._load.cache import load_cache_file
+from .advisor import IndexAdvisor
+from .budget import MemoryBudget
+from . import vectorize
+from .sketch import HyperLogLog
+from .sketch import QuantileSketch
+from .lrucache import LRUCache
+from .pool import ConnectionPool
 
 try:
     FileNotFoundError  # New in Python 3.3.
@@ -40,14 +79,109 @@ except NameError:
     # If not available, use as an alias for OSError.
     FileNotFoundError = OSError
 
-# For the following database connection, the synchronous flag is
-# set to "OFF" for faster insertions and commits. Since the database
-# is temporary, long-term integrity should not be a concern--in the
-# unlikely event of data corruption, it should be entirely acceptable
-# to simply rebuild the temporary tables.
-DEFAULT_CONNECTION = sqlite3.connect('')  # <- Using '' makes a temp file.
-DEFAULT_CONNECTION.execute('PRAGMA synchronous=OFF')
-DEFAULT_CONNECTION.isolation_level = None  # <- Run in 'autocommit' mode.
+# All Selectors share a pool of connections to the same temporary
+# database file. Each thread reads through its own connection while
+# writes are serialized through the pool's write connection.
+DEFAULT_POOL = ConnectionPool()
+
+# The write connection is also available as DEFAULT_CONNECTION for
+# backwards compatibility (used by the "__past__" API modules).
+DEFAULT_CONNECTION = DEFAULT_POOL.write_connection
+
+# Pools for other storage modes are created when first requested
+# and then shared by all Selectors using the same settings.
+_storage_pools = {('file', None): DEFAULT_POOL}
+_storage_pools_lock = threading.Lock()
+
+
+def _get_pool(storage='file', mmap_size=None):
+    """Return the connection pool for the given *storage* mode and
+    *mmap_size* (see ConnectionPool for details).
+    """
+    key = (storage, mmap_size)
+    with _storage_pools_lock:
+        pool = _storage_pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(mode=storage, mmap_size=mmap_size)
+            _storage_pools[key] = pool
+    return pool
+
+
+# Tables of Selectors that were closed or garbage collected. They
+# are dropped the next time a Selector loads data or is closed (so
+# a table is never dropped in the middle of another transaction).
+_pending_releases = collections.deque()
+
+# Optional limit for the total size of Selector tables (see
+# Selector.set_memory_budget).
+_memory_budget = None
+
+
+def _schedule_release(pool, tables, budget_key):
+    """Schedule *tables* (a list of table or view names) to be
+    dropped. Tables that belong to an attached database are detached
+    instead. Called by Selector finalizers.
+    """
+    global _memory_budget
+    _pending_releases.append((pool, tables))
+    if _memory_budget is not None:
+        _memory_budget.discard(budget_key)
+
+
+def _drop_table_or_view(cursor, name):
+    """Drop the table or view *name* (dropping a table also drops
+    its indexes).
+    """
+    cursor.execute('SELECT type FROM sqlite_master WHERE name=?', (name,))
+    row = cursor.fetchone()
+    if row and row[0] == 'view':
+        cursor.execute('DROP VIEW {0}'.format(name))
+    else:
+        drop_table(cursor, name)
+
+
+def _release_pending():
+    """Drop the tables scheduled by _schedule_release()."""
+    while True:
+        try:
+            pool, tables = _pending_releases.popleft()
+        except IndexError:
+            return  # <- EXIT! (No more tables.)
+
+        try:
+            with pool.writer() as connection:
+                for table in tables:
+                    schema, _ = split_table_name(table)
+                    if schema:
+                        pool.detach(schema)
+                    else:
+                        _drop_table_or_view(connection.cursor(), table)
+        except sqlite3.Error:
+            pass  # <- Pool was already closed.
+
+
+def _get_table_size(cursor, table):
+    """Return the number of bytes used by *table* and its indexes
+    (tables in attached databases have a size of zero).
+    """
+    schema, _ = split_table_name(table)
+    if schema:
+        return 0  # <- EXIT!
+
+    try:
+        cursor.execute('''
+            SELECT SUM(pgsize)
+            FROM dbstat
+            WHERE name IN (SELECT name FROM sqlite_master WHERE tbl_name=?)
+        ''', (table,))
+    except sqlite3.OperationalError:
+        # When SQLite is built without the "dbstat" virtual table,
+        # the size is estimated from the length of the values.
+        columns = ('"{0}"'.format(x.replace('"', '""'))
+                   for x in get_columns(cursor, table))
+        lengths = ' + '.join('IFNULL(LENGTH({0}), 0)'.format(x) for x in columns)
+        cursor.execute('SELECT SUM({0}) FROM {1}'.format(lengths, table))
+    return cursor.fetchone()[0] or 0
 
 
 _Mapping = collections.Mapping    # Get direct reference to eliminate
@@ -267,6 +401,36 @@ def _make_dataresult(iterable):
     return Result(iterable, eval_type)
 
 
+def _freeze(obj):
+    """Return a hashable representation of *obj* for use in cache
+    keys. Raises a TypeError if *obj* contains unhashable values.
+    """
+    if isinstance(obj, regex_types):
+        return (regex_types, obj.pattern, obj.flags)
+    if isinstance(obj, collections.Mapping):
+        items = frozenset((_freeze(k), _freeze(v)) for k, v in obj.items())
+        return (obj.__class__, items)
+    if isinstance(obj, collections.Set):
+        return (obj.__class__, frozenset(_freeze(x) for x in obj))
+    if isinstance(obj, (list, tuple)):
+        return (obj.__class__, tuple(_freeze(x) for x in obj))
+    hash(obj)  # <- Raises TypeError if unhashable.
+    return obj
+
+
+def _copy_fetched(obj):
+    """Return a copy of a fetched result (containers are copied so
+    cached results can not be changed by callers). Tuples are
+    immutable and are returned as-is (copying them would also fail
+    for namedtuples whose constructors take separate arguments).
+    """
+    if isinstance(obj, collections.Mapping):
+        return obj.__class__((k, _copy_fetched(v)) for k, v in obj.items())
+    if isinstance(obj, (list, collections.Set)):
+        return obj.__class__(obj)
+    return obj
+
+
 def _apply_to_data(function, data_iterator):
     """Apply a *function* of one argument to the to the given
     iterator *data_iterator*.
@@ -277,28 +441,30 @@ def _apply_to_data(function, data_iterator):
     return function(data_iterator)
 
 
-def _map_data(function, iterable):
-    def wrapper(iterable):
-        if isinstance(iterable, BaseElement):
-            return function(iterable)  # <- EXIT!
+def _map_group(function, iterable):
+    """Apply *function* to each element of a single group."""
+    if isinstance(iterable, BaseElement):
+        return function(iterable)  # <- EXIT!
 
-        evaluation_type = _get_evaluation_type(iterable)
-        if issubclass(evaluation_type, collections.Set):
-            evaluation_type = list
+    evaluation_type = _get_evaluation_type(iterable)
+    if issubclass(evaluation_type, collections.Set):
+        evaluation_type = list
 
-        def domap(func, itrbl):
-            if _expects_multiple_params(func):
-                for x in itrbl:
-                    if isinstance(x, BaseElement):
-                        yield func(x)
-                    else:
-                        yield func(*x)
-            else:
-                for x in itrbl:
+    def domap(func, itrbl):
+        if _expects_multiple_params(func):
+            for x in itrbl:
+                if isinstance(x, BaseElement):
                     yield func(x)
-        return Result(domap(function, iterable), evaluation_type)
+                else:
+                    yield func(*x)
+        else:
+            for x in itrbl:
+                yield func(x)
+    return Result(domap(function, iterable), evaluation_type)
 
-    return _apply_to_data(wrapper, iterable)
+
+def _map_data(function, iterable):
+    return _apply_to_data(functools.partial(_map_group, function), iterable)
 
 
 def _reduce_data(function, iterable):
@@ -310,17 +476,88 @@ def _reduce_data(function, iterable):
     return _apply_to_data(wrapper, iterable)
 
 
+def _filter_group(function, iterable):
+    """Filter the elements of a single group with *function*."""
+    if isinstance(iterable, BaseElement):
+        raise TypeError(('filter expects a collection of data elements, '
+                         'got 1 data element: {0}').format(iterable))
+    filtered_data = filter(function, iterable)
+    return Result(filtered_data, _get_evaluation_type(iterable))
+
+
 def _filter_data(function, iterable):
+    return _apply_to_data(functools.partial(_filter_group, function), iterable)
+
+
+def _map_filter_data(steps, iterable):
+    """Apply consecutive map and filter *steps* to each group in a
+    single pass. The *steps* are (group_function, function) pairs
+    where group_function is _map_group or _filter_group.
+
+    Results are the same as applying _map_data() and _filter_data()
+    in turn but each element passes through all of the steps at once
+    (instead of through a chain of generators).
+    """
+    has_map = any(x is _map_group for x, _ in steps)
+
+    def dosteps(itrbl):
+        compiled = []  # <- List of (is_map, function, multiple_params).
+        for group_function, function in steps:
+            is_map = group_function is _map_group
+            multiple = is_map and _expects_multiple_params(function)
+            compiled.append((is_map, function, multiple))
+
+        for x in itrbl:
+            for is_map, function, multiple in compiled:
+                if is_map:
+                    if multiple and not isinstance(x, BaseElement):
+                        x = function(*x)
+                    else:
+                        x = function(x)
+                elif not (function(x) if function is not None else x):
+                    break  # <- Filtered out.
+            else:
+                yield x
+
     def wrapper(iterable):
         if isinstance(iterable, BaseElement):
-            raise TypeError(('filter expects a collection of data elements, '
-                             'got 1 data element: {0}').format(iterable))
-        filtered_data = filter(function, iterable)
-        return Result(filtered_data, _get_evaluation_type(iterable))
+            for group_function, function in steps:
+                iterable = group_function(function, iterable)
+            return iterable  # <- EXIT!
+
+        evaluation_type = _get_evaluation_type(iterable)
+        if has_map and issubclass(evaluation_type, collections.Set):
+            evaluation_type = list
+        return Result(dosteps(iterable), evaluation_type)
 
     return _apply_to_data(wrapper, iterable)
 
 
+def _fuse_steps(execution_plan):
+    """Return *execution_plan* with each run of two or more map()
+    and filter() steps replaced by a single _map_filter_data() step.
+    """
+    group_functions = {_map_data: _map_group, _filter_data: _filter_group}
+
+    def flush(run):
+        if len(run) < 2:
+            return run
+        steps = tuple((group_functions[x[0]], x[1][0]) for x in run)
+        return [_execution_step(_map_filter_data, (steps, RESULT_TOKEN), {})]
+
+    new_plan = []
+    run = []
+    for step in execution_plan:
+        if step[0] in group_functions:
+            run.append(step)
+        else:
+            new_plan.extend(flush(run))
+            new_plan.append(step)
+            run = []
+    new_plan.extend(flush(run))
+    return tuple(new_plan)
+
+
 def _apply_data(function, data):
     """Group-wise function application."""
     return _apply_to_data(function, data)
@@ -428,6 +665,162 @@ def _sqlite_max(iterable):
     return max(iterable, default=None, key=_sqlite_sortkey)
 
 
+_aggregate_names = ('sum', 'count', 'avg', 'min', 'max')
+_aggregate_types = {}
+def _get_aggregate_type(functions):
+    """Return the namedtuple type used for the results of the given
+    aggregate *functions* (a tuple of names like 'sum' or 'max').
+    """
+    aggregate_type = _aggregate_types.get(functions)
+    if aggregate_type is None:
+        aggregate_type = collections.namedtuple(
+            typename='aggregate',
+            field_names=functions,
+        )
+        _aggregate_types[functions] = aggregate_type
+    return aggregate_type
+
+
+def _sqlite_aggregate(functions, iterable):
+    """Calculate several aggregate values in a single pass and return
+    them as a namedtuple. The *functions* is a tuple of names ('sum',
+    'count', 'avg', 'min', or 'max'). Results match those of
+    _sqlite_sum(), _sqlite_count(), etc.
+    """
+    aggregate_type = _get_aggregate_type(functions)
+    if isinstance(iterable, BaseElement):
+        single_functions = {
+            'sum': _sqlite_sum,
+            'count': _sqlite_count,
+            'avg': _sqlite_avg,
+            'min': _sqlite_min,
+            'max': _sqlite_max,
+        }
+        return aggregate_type(*(single_functions[x](iterable) for x in functions))
+
+    need_total = 'sum' in functions or 'avg' in functions
+    need_min = 'min' in functions
+    need_max = 'max' in functions
+
+    count = 0
+    total = None
+    min_value = min_key = max_value = max_key = None
+    for x in iterable:
+        if x == None:
+            continue
+        if need_total:
+            real = _sqlite_cast_as_real(x)
+            total = real if total is None else total + real
+        if need_min or need_max:
+            key = _sqlite_sortkey(x)
+            if need_min and (min_key is None or key < min_key):
+                min_value, min_key = x, key
+            if need_max and (max_key is None or key > max_key):
+                max_value, max_key = x, key
+        count += 1
+
+    values = {
+        'sum': total,
+        'count': count,
+        'avg': total / count if need_total and count else None,
+        'min': min_value,
+        'max': max_value,
+    }
+    return aggregate_type(*(values[x] for x in functions))
+
+
+def _aggregate_data(functions, iterable):
+    """Apply _sqlite_aggregate() to each group of *iterable*."""
+    return _apply_to_data(functools.partial(_sqlite_aggregate, functions), iterable)
+
+
+def _approx_count_distinct(precision, iterable):
+    """Return the approximate number of distinct, non-None values
+    using a HyperLogLog sketch with the given *precision*.
+    """
+    if isinstance(iterable, BaseElement):
+        iterable = [iterable]
+    sketch = HyperLogLog(precision)
+    sketch.update(x for x in iterable if x != None)
+    return sketch.estimate()
+
+
+def _approx_count_distinct_data(precision, iterable):
+    """Apply _approx_count_distinct() to each group of *iterable*."""
+    function = functools.partial(_approx_count_distinct, precision)
+    return _apply_to_data(function, iterable)
+
+
+def _approx_quantile(q, k, iterable):
+    """Return the approximate value at quantile *q* of non-None
+    values (ordered like SQLite's ORDER BY) using a KLL sketch of
+    size *k*. Returns None if there are no values.
+    """
+    if isinstance(iterable, BaseElement):
+        iterable = [iterable]
+    sketch = QuantileSketch(k, key=_sqlite_sortkey)
+    sketch.update(x for x in iterable if x != None)
+    return sketch.quantile(q)
+
+
+def _approx_quantile_data(q, k, iterable):
+    """Apply _approx_quantile() to each group of *iterable*."""
+    return _apply_to_data(functools.partial(_approx_quantile, q, k), iterable)
+
+
+def _sample_values(n, fraction, rng, iterable):
+    """Return a list of *n* values chosen from *iterable* with
+    reservoir sampling or, if *fraction* is given, an iterator of
+    values that are each chosen with a probability of *fraction*.
+    Chosen values keep their original order. The *rng* is a
+    random.Random() instance.
+    """
+    if fraction is not None:
+        return (x for x in iterable if rng.random() < fraction)  # <- EXIT!
+
+    reservoir = []  # <- List of (index, value) items.
+    for index, value in enumerate(iterable):
+        if index < n:
+            reservoir.append((index, value))
+        else:
+            position = rng.randint(0, index)
+            if position < n:
+                reservoir[position] = (index, value)
+    reservoir.sort(key=lambda item: item[0])
+    return [value for _, value in reservoir]
+
+
+def _sample_data(n, fraction, seed, iterable):
+    """Sample each group of *iterable* (see _sample_values()). Each
+    group gets its own random generator, seeded in turn from one
+    seeded with *seed*, so results can be reproduced.
+    """
+    rng = random.Random(seed)
+
+    def wrapper(group):
+        if isinstance(group, BaseElement):
+            return group
+        group_rng = random.Random(rng.random())
+        values = _sample_values(n, fraction, group_rng, group)
+        return Result(values, _get_evaluation_type(group))
+
+    return _apply_to_data(wrapper, iterable)
+
+
+def _limit_data(n, iterable):
+    """Return the first *n* elements of *iterable* (or the first *n*
+    groups if it's a collection of items). Elements after the first
+    *n* are never evaluated.
+    """
+    if isinstance(iterable, BaseElement):
+        return iterable  # <- EXIT!
+
+    limited = itertools.islice(iterable, n)
+    if _is_collection_of_items(iterable):
+        limited = DictItems(limited)
+    return Result(limited, _get_evaluation_type(iterable))
+
+
 def _sqlite_distinct(iterable):
     """Filter iterable to unique values, while maintaining
     evaluation_type.
@@ -522,7 +915,13 @@ def _get_step_repr(step):
     """Helper function to return repr for a single query step."""
     func, args, kwds = step
     func_repr = getattr(func, '__name__', repr(func))
-    args_repr = _make_args_repr(args)
+    if func is _map_filter_data:  # <- Show fused steps by name.
+        names = {_map_group: 'map', _filter_group: 'filter'}
+        fused = ('{0}({1})'.format(names[x], _make_args_repr([f]))
+                 for x, f in args[0])
+        args_repr = ', '.join(itertools.chain(fused, [_make_args_repr(args[1:])]))
+    else:
+        args_repr = _make_args_repr(args)
     kwds_repr = _make_kwds_repr(kwds)
     return '{0}, ({1}), {{{2}}}'.format(func_repr, args_repr, kwds_repr)
 
@@ -537,16 +936,262 @@ _execution_step = collections.namedtuple(
     field_names=('function', 'args', 'kwds')
 )
 
+_select_statement = collections.namedtuple(
+    typename='select_statement',
+    field_names=(
+        'columns',          # Normalized columns given to the select method.
+        'key',              # Key of *columns* (or None if ungrouped).
+        'key_columns',      # Escaped key column names.
+        'sqlfunc',          # SQL aggregate function name (or None).
+        'distinct',         # True if values are selected as a set.
+        'select_clause',
+        'trailing_clause',  # GROUP BY or ORDER BY clause (or None).
+        'where',            # Where-condition keywords.
+        'where_sql',        # Where-clause and parameters for *where*.
+        'sample',           # Sample (n, fraction, seed) arguments (or None).
+    ),
+)
+
 RESULT_TOKEN = _make_token(
     'RESULT',
     'Token for representing a data result when optimizing execution plan.',
 )
 
 
+class _DryRun(Exception):
+    """Raised in place of executing a statement when a Selector is
+    only recording its queries (see Selector._log_queries).
+    """
+    pass
+
+
+_index_pattern = re.compile(
+    r'USING (?:COVERING )?INDEX (\S+)|USING (INTEGER PRIMARY KEY)')
+
+
+def _format_sql_explanation(stmnt, params, query_plan):
+    """Return a formatted explanation of an SQL statement and the
+    rows returned by "EXPLAIN QUERY PLAN" for the statement.
+    """
+    details = [row[-1] for row in query_plan]
+    indexes = []
+    for detail in details:
+        for match in _index_pattern.finditer(detail):
+            index = match.group(1) or match.group(2)
+            if index not in indexes:
+                indexes.append(index)
+
+    lines = ['SQL:']
+    lines.extend('  {0}'.format(x.strip()) for x in stmnt.strip().splitlines())
+    lines.append('  -- params: {0!r}'.format(list(params)))
+    lines.append('  -- index: {0}'.format(', '.join(indexes) or 'none'))
+    lines.append('Query Plan:')
+    lines.extend('  {0}'.format(x) for x in details)
+    return '\n'.join(lines)
+
+
+def _describe_rows(value):
+    """Return a short description of the number of rows in a fetched
+    result *value*.
+    """
+    if isinstance(value, collections.Mapping):
+        rows = 0
+        for group in value.values():
+            if isinstance(group, (list, collections.Set)):
+                rows += len(group)
+            else:
+                rows += 1
+        return '{0} groups, {1} rows'.format(len(value), rows)
+    if isinstance(value, (list, collections.Set)):
+        return '{0} rows'.format(len(value))
+    if callable(value):
+        return 'no rows'  # <- Method of a data source.
+    return '1 value'
+
+
+def _is_truthy(value):
+    """Predicate used for filter steps without a function."""
+    return bool(value)
+
+
+# Stable predicate wrappers (the same wrapper is used for the
+# life of the wrapped function so it's registered with SQLite
+# only once).
+_sql_predicates = weakref.WeakKeyDictionary()
+
+
+def _get_sql_predicate(function):
+    """Return a predicate that can be used in a where-clause to
+    implement a filter step using *function* (or None if it can
+    not be used). The wrapper returns a bool so that values are
+    tested for truth the same way as Python's filter().
+    """
+    if function is None:
+        return _is_truthy  # <- EXIT!
+
+    try:
+        return _sql_predicates[function]
+    except KeyError:
+        pass
+    except TypeError:
+        return None  # <- EXIT! (Does not support weak references.)
+
+    function_ref = weakref.ref(function)  # <- Keeps cache entry from
+    def predicate(value):                  #    holding on to *function*.
+        try:
+            return bool(function_ref()(value))
+        except Exception as err:
+            _predicate_errors.error = err  # <- Re-raised by _PredicateCursor.
+            raise
+    _sql_predicates[function] = predicate
+    return predicate
+
+
+# Exceptions raised inside SQLite by filter predicates (SQLite
+# replaces them with an OperationalError). Kept per thread because
+# partitions are queried in separate threads.
+_predicate_errors = threading.local()
+
+
+def _pop_predicate_error():
+    """Return the last exception raised by a filter predicate in the
+    current thread (or None) and clear it.
+    """
+    err = getattr(_predicate_errors, 'error', None)
+    _predicate_errors.error = None
+    return err
+
+
+class _PredicateCursor(object):
+    """Wrapper for a cursor whose query calls Python functions. When
+    SQLite fails because a predicate raised an exception, the original
+    exception is raised in place of SQLite's OperationalError.
+    """
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def _call(self, method, *args):
+        try:
+            return method(*args)
+        except sqlite3.OperationalError:
+            err = _pop_predicate_error()
+            if err is not None:
+                raise err
+            raise
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self._call(next, self._cursor)
+
+    def next(self):  # For Python 2.x compatibility.
+        return self.__next__()
+
+    def fetchone(self):
+        return self._call(self._cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self._call(self._cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._call(self._cursor.fetchall)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
 ########################################################
 # Main data handling classes (Query and Selector).
 ########################################################
 
+_vector_aggregates = {
+    _sqlite_sum: 'sum',
+    _sqlite_count: 'count',
+    _sqlite_avg: 'avg',
+    _sqlite_min: 'min',
+    _sqlite_max: 'max',
+}
+
+
+def _get_vector_step(step):
+    """Return a (name, function) step for vectorize.execute() that
+    matches the execution *step* (or None if it can't be vectorized).
+    """
+    function, args, _ = step
+    if function is _apply_to_data and args[0] in _vector_aggregates:
+        return (_vector_aggregates[args[0]], None)
+    if function is _map_data and vectorize.is_ufunc(args[0]):
+        return ('map', args[0])
+    if function is _filter_data and vectorize.is_ufunc(args[0]):
+        return ('filter', args[0])
+    return None
+
+
+def _vectorize_plan(execution_plan):
+    """Return *execution_plan* with each run of vectorizable steps
+    (map() and filter() steps that use ufuncs, optionally followed
+    by an aggregate) replaced by a single _execute_vectorized() step.
+    """
+    new_plan = []
+    run = []
+    for step in execution_plan:
+        vector_step = _get_vector_step(step)
+        if vector_step:
+            run.append((vector_step, step))
+            if vector_step[0] not in vectorize.AGGREGATES:
+                continue  # <- Aggregates end the current run.
+        if run:
+            vector_steps, python_steps = zip(*run)
+            new_plan.append(_execution_step(
+                _execute_vectorized, (vector_steps, python_steps, RESULT_TOKEN), {}))
+            run = []
+        if not vector_step:
+            new_plan.append(step)
+    if run:
+        vector_steps, python_steps = zip(*run)
+        new_plan.append(_execution_step(
+            _execute_vectorized, (vector_steps, python_steps, RESULT_TOKEN), {}))
+    return tuple(new_plan)
+
+
+def _execute_vectorized(vector_steps, python_steps, data):
+    """Execute *vector_steps* on *data* with NumPy, group by group.
+    Groups that can't be vectorized are executed with the equivalent
+    *python_steps* instead.
+    """
+    has_map = any(name == 'map' for name, _ in vector_steps)
+    ends_with_aggregate = vector_steps[-1][0] in vectorize.AGGREGATES
+
+    def execute_group(values):
+        if isinstance(values, BaseElement):
+            result = values
+            for step in python_steps:
+                result = Query._execute_step(step, result)
+            return result  # <- EXIT!
+
+        evaluation_type = _get_evaluation_type(values)
+        values = list(values)
+        try:
+            result = vectorize.execute(vector_steps, values)
+        except vectorize.CannotVectorize:
+            result = Result(iter(values), evaluation_type)
+            for step in python_steps:
+                result = Query._execute_step(step, result)
+            return result  # <- EXIT!
+
+        if ends_with_aggregate:
+            return result
+        if has_map and issubclass(evaluation_type, collections.Set):
+            evaluation_type = list  # <- Same as _map_data().
+        return Result(iter(result), evaluation_type)
+
+    if _is_collection_of_items(data):
+        result = DictItems((k, execute_group(v)) for k, v in data)
+        return Result(result, _get_evaluation_type(data))
+    return execute_group(data)
+
+
 class Query(object):
     """Query(columns, **where)
     Query(selector, columns, **where)
@@ -583,6 +1228,7 @@ class Query(object):
         self.args = (_normalize_columns(columns),)
         self.kwds = where
         self._query_steps = []
+        self._compiled = {}
 
     @classmethod
     def from_object(cls, obj):
@@ -607,6 +1253,7 @@ class Query(object):
         new_query.args = ()
         new_query.kwds = {}
         new_query._query_steps = []
+        new_query._compiled = {}
         return new_query
 
     @staticmethod
@@ -623,6 +1270,7 @@ class Query(object):
         new_query.args = self.args
         new_query.kwds = dict(self.kwds)                  # Makes copies of
         new_query._query_steps = list(self._query_steps)  # mutable types.
+        new_query._compiled = {}
         return new_query
 
     def _add_step(self, name, *args, **kwds):
@@ -685,6 +1333,127 @@ class Query(object):
         """Filter elements, removing duplicate values."""
         return self._add_step('distinct')
 
+    def aggregate(self, *functions):
+        """Calculate several aggregate values--any of 'sum', 'count',
+        'avg', 'min', or 'max'--in a single pass over the data and
+        return them as a named tuple::
+
+            query = select('A').aggregate('sum', 'count', 'max')
+            result = query.fetch()  # <- aggregate(sum=..., count=..., max=...)
+
+        When the data is grouped, a named tuple is returned for each
+        group. For Selector sources, the values are calculated by a
+        single SQL statement.
+        """
+        if not functions:
+            raise TypeError('aggregate() requires at least one function name')
+        for name in functions:
+            if name not in _aggregate_names:
+                msg = 'aggregate function must be one of {0}, got {1!r}'
+                raise ValueError(msg.format(', '.join(_aggregate_names), name))
+        if len(set(functions)) != len(functions):
+            raise ValueError('aggregate function names must be unique')
+        return self._add_step('aggregate', *functions)
+
+    def approx_count_distinct(self, precision=14):
+        """Estimate the number of distinct, non-None values using a
+        HyperLogLog sketch. This uses a fixed amount of memory (2 **
+        *precision* bytes per group) instead of keeping every value
+        like ``distinct().count()`` does.
+
+        The relative standard error of the estimate is ``1.04 /
+        sqrt(2 ** precision)``--about 0.8% for the default *precision*
+        of 14. An allowance of a few times this error makes a cheap
+        first-pass check::
+
+            with datatest.allowed.percent(0.03):
+                datatest.validate(select('A').approx_count_distinct(), 1000000)
+        """
+        if not 4 <= precision <= 16:
+            msg = 'precision must be from 4 to 16, got {0!r}'
+            raise ValueError(msg.format(precision))
+        return self._add_step('approx_count_distinct', precision)
+
+    def approx_quantile(self, q, k=200):
+        """Estimate the value at quantile *q* (from 0.0 to 1.0) of
+        the non-None values using a KLL sketch that keeps about 3 *
+        *k* values per group. Values are ordered like SQLite's ORDER
+        BY clause (numbers before text). Returns None for groups with
+        no values.
+
+        The rank of the returned value is within ``2.296 / k ** 0.9723``
+        (as a fraction of all values) of *q* with about 99% confidence
+        --about 1.3% for the default *k* of 200::
+
+            median = select('A').approx_quantile(0.5)
+        """
+        if not 0.0 <= q <= 1.0:
+            raise ValueError('q must be from 0.0 to 1.0, got {0!r}'.format(q))
+        if k < 8:
+            raise ValueError('k must be 8 or greater, got {0!r}'.format(k))
+        return self._add_step('approx_quantile', q, k)
+
+    def sample(self, n=None, fraction=None, seed=None):
+        """Select a random sample of elements--either *n* elements or
+        a *fraction* (greater than 0.0 and up to 1.0) of them. When the
+        data is grouped, each group is sampled separately. Give a *seed*
+        to get the same sample every time the query is executed::
+
+            query = select('A').sample(n=1000, seed=42)
+
+        Sampled elements keep their original order. For ungrouped
+        Selector sources, rows are sampled in blocks of consecutive
+        rows so that only the chosen blocks are read from the table.
+        Other data is sampled in a single pass (using reservoir
+        sampling when *n* is given).
+        """
+        if (n is None) == (fraction is None):
+            raise TypeError('sample() requires either n or fraction (but not both)')
+        if n is not None and (not isinstance(n, Integral) or n < 1):
+            raise ValueError('n must be a positive integer, got {0!r}'.format(n))
+        if fraction is not None and not 0.0 < fraction <= 1.0:
+            msg = 'fraction must be greater than 0.0 and up to 1.0, got {0!r}'
+            raise ValueError(msg.format(fraction))
+        return self._add_step('sample', n, fraction, seed)
+
+    def limit(self, n):
+        """Select only the first *n* elements or, when the data is
+        grouped, the first *n* groups. Later elements are never read
+        so exploratory queries finish quickly even for large data::
+
+            query = select('A').limit(100)
+
+        For ungrouped Selector sources, this becomes an SQL ``LIMIT``
+        clause. Which elements come first is unspecified for
+        partitioned Selectors (see :meth:`Selector.partition`).
+        """
+        if not isinstance(n, Integral) or n < 0:
+            raise ValueError('n must be a non-negative integer, got {0!r}'.format(n))
+        return self._add_step('limit', n)
+
+    # Steps whose results depend only on the selected data (results
+    # of queries that use other steps are not cached).
+    _cacheable_steps = frozenset(
+        ['sum', 'count', 'avg', 'min', 'max', 'aggregate', 'distinct'])
+
+    def _get_cache_key(self, optimize=True):
+        """Return a key for the Selector's result cache or None if
+        the query results should not be cached.
+        """
+        for name, _, _ in self._query_steps:
+            if name not in self._cacheable_steps:
+                return None  # <- EXIT!
+
+        for value in self.kwds.values():
+            if callable(value) and not isinstance(value, type):
+                return None  # <- EXIT!
+
+        steps = tuple((name, args) for name, args, _ in self._query_steps)
+        try:
+            return _freeze((self.args, self.kwds, steps, optimize))
+        except TypeError:
+            return None
+
     @staticmethod
     def _translate_step(query_step):
         """Accept a query step and return a corresponding execution
@@ -722,6 +1491,21 @@ class Query(object):
         elif name == 'distinct':
             function = _sqlite_distinct
             args = (RESULT_TOKEN,)
+        elif name == 'aggregate':
+            function = _aggregate_data
+            args = (tuple(query_args), RESULT_TOKEN)
+        elif name == 'approx_count_distinct':
+            function = _approx_count_distinct_data
+            args = (query_args[0], RESULT_TOKEN)
+        elif name == 'approx_quantile':
+            function = _approx_quantile_data
+            args = (query_args[0], query_args[1], RESULT_TOKEN)
+        elif name == 'sample':
+            function = _sample_data
+            args = tuple(query_args) + (RESULT_TOKEN,)
+        elif name == 'limit':
+            function = _limit_data
+            args = (query_args[0], RESULT_TOKEN)
         elif name == 'select':
             raise ValueError("this method does not handle 'select' step")
         else:
@@ -744,51 +1528,143 @@ class Query(object):
             execution_plan.append(execution_step)
         return tuple(execution_plan)
 
+    _sql_functions = {
+        _sqlite_sum: 'SUM',
+        _sqlite_count: 'COUNT',
+        _sqlite_avg: 'AVG',
+        _sqlite_min: 'MIN',
+        _sqlite_max: 'MAX',
+    }
+
     @staticmethod
-    def _optimize(execution_plan):
-        try:
-            step_0 = execution_plan[0]
-            step_1 = execution_plan[1]
-            step_2 = execution_plan[2]
-            remaining_steps = execution_plan[3:]
-        except IndexError:
-            return None  # <- EXIT!
+    def _get_value_column(columns):
+        """Return the name of the single column whose values are
+        selected by the normalized *columns* (or None if values come
+        from multiple columns).
+        """
+        _, value = _parse_columns(columns)
+        inner = tuple(value)[0]
+        return inner if isinstance(inner, str) else None
 
-        if step_0 != (getattr, (RESULT_TOKEN, '_select'), {}):
-            return None  # <- EXIT!
+    @staticmethod
+    def _as_distinct(columns):
+        """Return normalized *columns* with its values in a set
+        (so that _select_aggregate() uses DISTINCT).
+        """
+        key, value = _parse_columns(columns)
+        value = set(value)
+        if isinstance(columns, collections.Mapping):
+            return {key: value}
+        return value
 
-        if step_2[0] == _apply_to_data:
-            func_dict = {
-                _sqlite_sum: 'SUM',
-                _sqlite_count: 'COUNT',
-                _sqlite_avg: 'AVG',
-                _sqlite_min: 'MIN',
-                _sqlite_max: 'MAX',
-            }
-            py_function = step_2[1][0]
-            sqlite_function = func_dict.get(py_function, None)
-            if sqlite_function:
-                func_1, args_1, kwds_1 = step_1
-                args_1 = (sqlite_function,) + args_1  # <- Add SQL function
-                optimized_steps = (                   #    as 1st arg.
-                    (getattr, (RESULT_TOKEN, '_select_aggregate'), {}),
-                    (func_1, args_1, kwds_1),
-                )
-            else:
-                optimized_steps = ()
-        elif step_2 == (_sqlite_distinct, (RESULT_TOKEN,), {}):
-            optimized_steps = (
-                (getattr, (RESULT_TOKEN, '_select_distinct'), {}),
-                step_1,
-            )
-        else:
-            optimized_steps = ()
+    @classmethod
+    def _optimize(cls, execution_plan):
+        """Return an optimized execution plan (or None if the plan
+        can not be optimized). Rules are applied in order to steps
+        that directly follow a Selector's _select() step:
+
+        1. filter() steps become WHERE conditions (only for selections
+           of a single, ungrouped column that has no other condition).
+        2. distinct() followed by sum(), count(), avg(), min(), max(),
+           or aggregate() becomes an aggregate of DISTINCT values (e.g.,
+           "COUNT(DISTINCT ...)").
+        3. sum(), count(), avg(), min(), max(), or aggregate() become
+           SQL aggregates (aggregate() only for selections of a single
+           column).
+        4. distinct() becomes "SELECT DISTINCT".
+        5. sample() becomes a sample of rowid blocks (only for ungrouped
+           selections of non-distinct values).
+        6. limit() becomes a LIMIT clause (only for ungrouped selections
+           of non-distinct values).
+
+        Any remaining steps are executed in Python.
+        """
+        if len(execution_plan) < 3:
+            return None  # <- EXIT!
 
-        if optimized_steps:
-            return optimized_steps + remaining_steps
-        return None
+        if execution_plan[0] != (getattr, (RESULT_TOKEN, '_select'), {}):
+            return None  # <- EXIT!
 
-    def execute(self, source=None, optimize=True):
+        func_1, args_1, kwds_1 = execution_plan[1]
+        columns = args_1[0]
+        steps = list(execution_plan[2:])
+        optimized = False
+
+        # Rule 1: Push filters down into WHERE conditions.
+        column = cls._get_value_column(columns)
+        while (steps and steps[0][0] is _filter_data
+                and column is not None
+                and not isinstance(columns, collections.Mapping)
+                and column not in kwds_1):
+            predicate = _get_sql_predicate(steps[0][1][0])
+            if predicate is None:
+                break
+            kwds_1 = dict(kwds_1)
+            kwds_1[column] = predicate
+            steps.pop(0)
+            optimized = True
+
+        select_step = (getattr, (RESULT_TOKEN, '_select'), {})
+        if steps:
+            step_a = steps[0]
+            step_b = steps[1] if len(steps) > 1 else None
+            is_distinct = lambda step: step == (_sqlite_distinct, (RESULT_TOKEN,), {})
+            get_sql_function = lambda step: (
+                step[0] == _apply_to_data
+                and cls._sql_functions.get(step[1][0], None))
+            is_aggregates = lambda step: (
+                step[0] == _aggregate_data and column is not None)
+
+            if (is_distinct(step_a) and step_b and get_sql_function(step_b)
+                    and column is not None):
+                # Rule 2: Aggregate distinct values.
+                select_step = (getattr, (RESULT_TOKEN, '_select_aggregate'), {})
+                args_1 = (get_sql_function(step_b), cls._as_distinct(columns))
+                steps = steps[2:]
+                optimized = True
+            elif is_distinct(step_a) and step_b and is_aggregates(step_b):
+                # Rule 2: Aggregate distinct values (several aggregates).
+                select_step = (getattr, (RESULT_TOKEN, '_select_aggregates'), {})
+                args_1 = (step_b[1][0], cls._as_distinct(columns))
+                steps = steps[2:]
+                optimized = True
+            elif is_aggregates(step_a):
+                # Rule 3: Aggregate values (several aggregates).
+                select_step = (getattr, (RESULT_TOKEN, '_select_aggregates'), {})
+                args_1 = (step_a[1][0],) + args_1
+                steps = steps[1:]
+                optimized = True
+            elif get_sql_function(step_a):
+                # Rule 3: Aggregate values.
+                select_step = (getattr, (RESULT_TOKEN, '_select_aggregate'), {})
+                args_1 = (get_sql_function(step_a),) + args_1  # <- Add SQL function
+                steps = steps[1:]                              #    as 1st arg.
+                optimized = True
+            elif is_distinct(step_a):
+                # Rule 4: Select distinct values.
+                select_step = (getattr, (RESULT_TOKEN, '_select_distinct'), {})
+                steps = steps[1:]
+                optimized = True
+            elif (step_a[0] is _sample_data
+                    and isinstance(columns, collections.Sequence)):
+                # Rule 5: Sample rowid blocks.
+                select_step = (getattr, (RESULT_TOKEN, '_select_sample'), {})
+                args_1 = (step_a[1][:3],) + args_1
+                steps = steps[1:]
+                optimized = True
+            elif (step_a[0] is _limit_data
+                    and isinstance(columns, collections.Sequence)):
+                # Rule 6: Limit the number of rows.
+                select_step = (getattr, (RESULT_TOKEN, '_select_limit'), {})
+                args_1 = (step_a[1][0],) + args_1
+                steps = steps[1:]
+                optimized = True
+
+        if not optimized:
+            return None
+        return (select_step, (func_1, args_1, kwds_1)) + tuple(steps)
+
+    def execute(self, source=None, optimize=True, vectorize=False):
         """A Query can be executed to return a single value or an
         iterable :class:`Result` appropriate for lazy evaluation::
 
@@ -796,6 +1672,13 @@ class Query(object):
             result = query.execute()  # <- Returns Result (iterator)
 
         Setting *optimize* to False turns-off query optimization.
+
+        Setting *vectorize* to True executes sum(), count(), avg(),
+        min(), and max() steps--and map() and filter() steps whose
+        function is a NumPy ufunc (e.g., ``numpy.sqrt``)--using NumPy
+        arrays, group by group. Groups whose values are not all
+        numbers are executed in Python as usual (as are all groups
+        when NumPy is not installed).
         """
         if source:
             if self.source:
@@ -810,19 +1693,57 @@ class Query(object):
                 raise ValueError("missing 'source' argument, none found")
             result = self.source
 
-        execution_plan = self._get_execution_plan(result, self._query_steps)
-        if optimize:
-            execution_plan = self._optimize(execution_plan) or execution_plan
+        return self._compile(optimize, vectorize)._execute(result)
+
+    def _compile(self, optimize=True, vectorize=False):
+        """Return the CompiledQuery used by execute() (queries are
+        compiled on first use and the compiled query is reused by
+        later calls).
+        """
+        compiled = self._compiled.get((optimize, vectorize))
+        if compiled is None:
+            compiled = CompiledQuery(self, optimize, vectorize)
+            self._compiled[(optimize, vectorize)] = compiled
+        return compiled
+
+    def compile(self, optimize=True, vectorize=False):
+        """Compile the query into a :class:`CompiledQuery` whose
+        execution plan and SQL statements are built once and then
+        reused every time it's executed::
+
+            compiled = select({'A': 'C'}, B='x').sum().compile()
+            result1 = compiled.execute()
+            result2 = compiled.execute(other_selector)
+
+        See :meth:`execute` for details about *optimize* and
+        *vectorize*.
+        """
+        return CompiledQuery(self, optimize, vectorize)
 
+    @staticmethod
+    def _execute_step(step, result):
+        """Execute an execution *step* and return its result (the
+        *result* of the previous step replaces RESULT_TOKEN).
+        """
         replace_token = lambda x: result if x is RESULT_TOKEN else x
-        for step in execution_plan:
-            function, args, keywords = step  # Unpack 3-tuple.
-            function = replace_token(function)
-            args = tuple(replace_token(x) for x in args)
-            keywords = dict((k, replace_token(v)) for k, v in keywords.items())
-            result = function(*args, **keywords)
+        function, args, keywords = step  # Unpack 3-tuple.
+        function = replace_token(function)
+        args = tuple(replace_token(x) for x in args)
+        keywords = dict((k, replace_token(v)) for k, v in keywords.items())
+        return function(*args, **keywords)
 
-        return result
+    @staticmethod
+    def _make_cached_result(cached):
+        """Return a copy of a *cached* value. The cache holds a 2-tuple
+        of the fetched value and a flag telling whether the uncached
+        query returned a Result--if it did, the copy is wrapped in a
+        Result object too.
+        """
+        value, is_result = cached
+        value = _copy_fetched(value)
+        if is_result:
+            return _make_dataresult(value)
+        return value
 
     def fetch(self):
         """Executes query and returns an eagerly evaluated result."""
@@ -871,6 +1792,84 @@ class Query(object):
         else:
             return formatted
 
+    def explain(self, analyze=False, optimize=True, vectorize=False,
+                file=sys.stdout):
+        """Print an explanation of how the query is executed: its
+        execution plan, the SQL statements sent to SQLite (with their
+        parameters), and SQLite's query plan for each statement (which
+        shows if an index is used)::
+
+            query = select({'A': 'C'}, B='x').sum()
+            query.explain()
+
+        If *analyze* is True, the query is executed and the time
+        taken by each step and the number of rows it returned are
+        reported as well. Otherwise, the query is not executed. The
+        steps are those of the compiled plan that :meth:`execute`
+        runs (with prepared statements and fused map() and filter()
+        steps) but results are never taken from the result cache.
+
+        If *optimize* is False, the unoptimized plan is explained.
+        See :meth:`execute` for details about *vectorize*. If *file*
+        is None, the explanation is returned as a string.
+        """
+        source = self.source
+        sections = [self._explain(optimize, file=None)]
+
+        execution_plan = None
+        if source is not None:
+            compiled = self._compile(optimize, vectorize)
+            execution_plan = compiled._get_plan(source)
+
+        if isinstance(source, Selector):
+            with source._log_queries(dry_run=not analyze) as query_log:
+                if analyze:
+                    timings = self._analyze(source, execution_plan)
+                else:
+                    try:
+                        result = source
+                        for step in execution_plan:
+                            result = self._execute_step(step, result)
+                    except _DryRun:
+                        pass
+            for stmnt, params, query_plan in query_log:
+                sections.append(_format_sql_explanation(stmnt, params, query_plan))
+        elif analyze and source is not None:
+            timings = self._analyze(source, execution_plan)
+
+        if analyze and source is not None:
+            lines = ['Step Timings:']
+            for index, (step, elapsed, rows) in enumerate(timings, start=1):
+                lines.append('  {0}. {1}'.format(index, _get_step_repr(step)))
+                lines.append('     {0:.6f} seconds, {1}'.format(elapsed, rows))
+            sections.append('\n'.join(lines))
+
+        formatted = '\n'.join(sections)
+        if file:
+            file.write(formatted)
+            file.write('\n')
+        else:
+            return formatted
+
+    def _analyze(self, source, execution_plan):
+        """Execute *execution_plan* and return a list of (step, elapsed,
+        rows) tuples. Results are fetched after each step so the time
+        spent on a step is not deferred to the steps that follow it.
+        """
+        timings = []
+        result = source
+        for step in execution_plan:
+            start = time.time()
+            result = self._execute_step(step, result)
+            if isinstance(result, Result):
+                fetched = result.fetch()
+                result = _make_dataresult(fetched)
+            else:
+                fetched = result
+            elapsed = time.time() - start
+            timings.append((step, elapsed, _describe_rows(fetched)))
+        return timings
+
     def __repr__(self):
         class_repr = self.__class__.__name__
 
@@ -922,31 +1921,593 @@ with contextlib.suppress(AttributeError):  # inspect.Signature() is new in 3.3
     ])
 
 
-_registered_function_ids = collections.defaultdict(set)
+class _PreparedSelect(object):
+    """A call to one of a Selector's select methods (_select(),
+    _select_distinct(), _select_aggregate(), etc.) whose SQL is built
+    once for each set of fieldnames and reused by later calls.
+    """
+    def __init__(self, method, args, where):
+        self.method = method
+        self.args = args
+        self.where = where
+        self._statements = {}  # <- Keyed by fieldnames.
+
+    def __call__(self, selector):
+        fieldnames = tuple(selector.fieldnames)
+        statement = self._statements.get(fieldnames)
+        if statement is None:
+            statement = selector._prepare(self.method, self.args, self.where)
+            self._statements[fieldnames] = statement
+        return selector._run_prepared(statement)
+
+    def __repr__(self):
+        args_repr = _make_args_repr(self.args)
+        kwds_repr = _make_kwds_repr(self.where)
+        if args_repr and kwds_repr:
+            args_repr = args_repr + ', '
+        return 'prepared {0}({1}{2})'.format(self.method, args_repr, kwds_repr)
+
+
+class CompiledQuery(object):
+    """A query that has been compiled for repeated execution (see
+    :meth:`Query.compile`).
+
+    Execution plans are built and optimized on first use and SQL
+    statements are built once for each set of fieldnames. Later
+    executions--against the same source or against other Selectors
+    with the same fieldnames--reuse them.
+    """
+    def __init__(self, query, optimize=True, vectorize=False):
+        self.query = query.__copy__()
+        self.optimize = optimize
+        self.vectorize = vectorize
+        self._plans = {}  # <- Keyed by True for Selectors, else False.
+        self._cache_key = self.query._get_cache_key(optimize)
+
+    def _get_plan(self, source):
+        is_selector = isinstance(source, Selector)
+        plan = self._plans.get(is_selector)
+        if plan is not None:
+            return plan  # <- EXIT!
+
+        query = self.query
+        plan = query._get_execution_plan(source, query._query_steps)
+        if self.optimize:
+            plan = query._optimize(plan) or plan
+        if is_selector:
+            (_, (_, method), _), (_, args, kwds) = plan[:2]
+            prepared = _PreparedSelect(method, args, kwds)
+            plan = (_execution_step(prepared, (RESULT_TOKEN,), {}),) + plan[2:]
+        if self.vectorize:
+            plan = _vectorize_plan(plan)
+        plan = _fuse_steps(plan)
+        self._plans[is_selector] = plan
+        return plan
+
+    def execute(self, source=None):
+        """Execute the compiled query and return a single value or
+        an iterable :class:`Result`. If *source* is given, the query
+        is executed against it instead of the query's own source.
+        """
+        if source is not None:
+            Query._validate_source(source)
+        else:
+            source = self.query.source
+            if source is None:
+                raise ValueError("missing 'source' argument, none found")
+        return self._execute(source)
+
+    def _execute(self, source):
+        result_cache = None
+        if isinstance(source, Selector) and source._result_cache is not None:
+            if self._cache_key is not None:
+                result_cache = source._result_cache
+                found, cached = result_cache.get(self._cache_key)
+                if found:
+                    return Query._make_cached_result(cached)  # <- EXIT!
+
+        result = source
+        for step in self._get_plan(source):
+            result = Query._execute_step(step, result)
+
+        if result_cache is not None:
+            is_result = isinstance(result, Result)
+            if is_result:
+                result = result.fetch()
+            cached = (result, is_result)
+            result_cache.set(self._cache_key, cached)
+            return Query._make_cached_result(cached)
+        return result
+
+    def fetch(self, source=None):
+        """Execute the compiled query and return an eagerly evaluated
+        result.
+        """
+        result = self.execute(source)
+        if isinstance(result, Result):
+            return result.fetch()
+        return result
+
+    def __repr__(self):
+        return '<{0} of {1!r}>'.format(self.__class__.__name__, self.query)
+
+
+_function_names = weakref.WeakKeyDictionary()
+_function_numbers = itertools.count()
+def _get_function_name(func):
+    """Return the name used to call the user-defined function *func*
+    from SQL.
+
+    Each function is given a numbered name that stays the same for
+    as long as the function exists (so statements that use it have
+    the same text and can be reused from the statement cache). Unlike
+    object ids, names are never reused by later functions. Functions
+    that can not be weakly referenced are named using their ids.
+    """
+    try:
+        name = _function_names.get(func)
+        if name is None:
+            name = 'FUNC{0}'.format(next(_function_numbers))
+            _function_names[func] = name
+    except TypeError:  # <- Unhashable or no weak reference support.
+        name = 'FUNC_{0}'.format(id(func))
+    return name
+
+
+_registered_functions = weakref.WeakKeyDictionary()
 def _register_function(connection, func_list):
     """Register user-defined functions with SQLite connection.
 
-    This uses a global defaultdict to prevent from registering
-    the same function multiple times with the same connection.
+    This uses a global mapping to prevent from registering the
+    same function multiple times with the same connection. The
+    mapping holds weak references so that entries are discarded
+    with their connections (e.g., when a pooled thread exits).
     """
-    connection_id = id(connection)
+    registered_names = _registered_functions.setdefault(connection, set())
     for func in func_list:
-        func_id = id(func)
-        if func_id in _registered_function_ids[connection_id]:
-            return  # <- EXIT! (if already registered)
+        name = _get_function_name(func)
+        if name in registered_names:
+            continue  # <- Skip if already registered.
 
-        _registered_function_ids[connection_id].add(func_id)
+        registered_names.add(name)
 
-        name = 'FUNC{0}'.format(func_id)
         if isinstance(func, collections.Hashable):
             connection.create_function(name, 1, func)  # <- Register!
         else:
             @functools.wraps(func)
-            def wrapper(x):
+            def wrapper(x, func=func):
                 return func(x)
             connection.create_function(name, 1, wrapper)  # <- Register!
 
 
+def _sqlite_regexp(pattern, value):
+    """Implements the REGEXP operator for SQLite ("X REGEXP Y" is
+    evaluated as regexp(Y, X)). Patterns are compiled once and then
+    reused from the re module's cache. Like datatest's regex
+    predicates, non-string values raise a TypeError.
+    """
+    try:
+        return re.search(pattern, value) is not None
+    except TypeError as err:
+        if not isinstance(value, string_types):
+            value_repr = repr(value)
+            if len(value_repr) > 45:
+                value_repr = value_repr[:42] + '...'
+            msg = 'expected string or bytes-like object, got {0}: {1}'
+            err = TypeError(msg.format(value.__class__.__name__, value_repr))
+        _predicate_errors.error = err  # <- Re-raised by _PredicateCursor.
+        raise err
+
+
+def _register_regexp(connection):
+    """Register the REGEXP function with SQLite connection (only
+    the first call for a given connection registers the function).
+    """
+    registered_names = _registered_functions.setdefault(connection, set())
+    if 'REGEXP' not in registered_names:
+        registered_names.add('REGEXP')
+        connection.create_function('REGEXP', 2, _sqlite_regexp)
+
+
+try:
+    _blob_type = buffer  # Python 2.x returns buffer objects for BLOBs.
+except NameError:
+    _blob_type = bytes
+
+# SQLite storage classes (as returned by typeof) and the Python
+# types of the values they hold.
+_sqlite_storage_types = [
+    ('integer', int),
+    ('real', float),
+    ('text', type(u'')),
+    ('blob', _blob_type),
+    ('null', type(None)),
+]
+
+
+def _typeof_clause(key, type_):
+    """Return a where-clause expression that checks that values in
+    *key* are instances of *type_* (or None to apply no filter).
+    """
+    names = [x for x, y in _sqlite_storage_types if issubclass(y, type_)]
+    if len(names) == len(_sqlite_storage_types):
+        return None  # <- EXIT! (Matches all values.)
+    if not names:
+        return '0'  # <- EXIT! (Matches no values.)
+    names = ', '.join("'{0}'".format(x) for x in names)
+    return 'typeof({0}) IN ({1})'.format(key, names)
+
+
+_simple_regex = re.compile(r"""
+    ^(?P<start>\^|\\A)?                             # Start anchor.
+    (?P<literal>(?:[^\\.^$*+?{}\[\]|()]|\\[^A-Za-z0-9])*)  # Literal text.
+    (?P<end>\$|\\Z)?$                               # End anchor.
+""", re.VERBOSE)
+
+_ascii_flag = getattr(re, 'ASCII', 0)  # New in Python 3.0.
+_default_flags = re.compile(u'').flags  # <- UNICODE on Python 3.x.
+_supported_flags = re.IGNORECASE | re.UNICODE | re.DOTALL | _ascii_flag
+
+
+def _is_ascii(text):
+    try:
+        text.encode('ascii')
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return False
+    return True
+
+
+def _regex_clause(key, regex):
+    """Return a two-tuple of a where-clause expression and a list
+    of parameters that match *key* values using *regex*. Simple
+    patterns (a literal string with optional anchors) are matched
+    with GLOB or LIKE (when using IGNORECASE) and other patterns
+    use the REGEXP operator.
+
+    GLOB and LIKE are only used for text values (and LIKE only for
+    ASCII text because it does not fold case for other characters
+    the way Python does--e.g., "k" and the Kelvin sign). All other
+    values are passed to REGEXP so they are handled like datatest's
+    regex predicates (non-string values raise a TypeError).
+    """
+    pattern = regex.pattern
+    match = None
+    if isinstance(pattern, string_types) and not (regex.flags & ~_supported_flags):
+        match = _simple_regex.match(pattern)
+    ignorecase = regex.flags & re.IGNORECASE
+    if match and not _is_ascii(match.group('literal')):
+        # LIKE only ignores case for ASCII characters and Python 2.x
+        # str patterns can only be used as parameters if ASCII.
+        if ignorecase or not isinstance(pattern, type(u'')):
+            match = None
+
+    regex_flags = regex.flags & ~_default_flags
+    flags = ''.join(y for x, y in [(re.IGNORECASE, 'i'),
+                                   (re.MULTILINE, 'm'),
+                                   (re.DOTALL, 's'),
+                                   (re.VERBOSE, 'x'),
+                                   (re.UNICODE, 'u'),
+                                   (_ascii_flag, 'a')] if regex_flags & x)
+    if flags:
+        pattern = '(?{0}){1}'.format(flags, pattern)
+    regexp_clause = '{0} REGEXP ?'.format(key)
+
+    if not match:
+        return regexp_clause, [pattern]  # <- EXIT!
+
+    literal = re.sub(r'\\(.)', r'\1', match.group('literal'))
+    if ignorecase:
+        escaped = re.sub(r'([\\%_])', r'\\\1', literal)
+        wildcard = '%'
+        operator = "{0} LIKE ? ESCAPE '\\'"
+    else:
+        escaped = re.sub(r'([*?[])', r'[\1]', literal)
+        wildcard = '*'
+        operator = '{0} GLOB ?'
+    operator = operator.format(key)
+
+    start = '' if match.group('start') else wildcard
+    if not match.group('end'):
+        params = [start + escaped + wildcard]
+    else:
+        params = [start + escaped]
+        if match.group('end') == '$':  # A "$" also matches before a
+            params.append(params[0] + '\n')  # trailing newline.
+    clause = ' OR '.join([operator] * len(params))
+
+    condition = "typeof({0})='text'".format(key)
+    if ignorecase:  # <- Non-ASCII text has fewer bytes than characters.
+        condition += ' AND length({0})=length(CAST({0} AS BLOB))'.format(key)
+    clause = 'CASE WHEN {0} THEN {1} ELSE {2} END'.format(
+        condition, clause, regexp_clause)
+    return clause, params + [pattern]
+
+
+def _load_object(cursor, table, obj, *args, **kwds):
+    """Load records from *obj* into *table* using the Selector's
+    connection (tables are created as regular tables so they can
+    be read from other connections).
+    """
+    batch_size = kwds.pop('batch_size', None)
+    dtypes = kwds.pop('dtypes', None)
+    if ((
+            isinstance(obj, string_types)
+            and obj.lower().endswith('.csv')
+        ) or (
+            isinstance(obj, file_types)
+            and getattr(obj, 'name', '').lower().endswith('.csv')
+        )
+    ):
+        load_csv(cursor, table, obj, temporary=False,
+                 batch_size=batch_size, dtypes=dtypes, *args, **kwds)
+    else:
+        reader = get_reader(obj, *args, **kwds)
+        load_data(cursor, table, reader, temporary=False,
+                  batch_size=batch_size, dtypes=dtypes)
+
+
+def _make_loader(obj, args, kwds, profile):
+    """Return a loader function for *obj* (see get_cache_file())."""
+    def loader(cursor, table):
+        with bulk_load(cursor, table, profile):
+            _load_object(cursor, table, obj, *args,
+                         batch_size=profile.batch_size, **kwds)
+    return loader
+
+
+def _load_file_task(task):
+    """Load a file into its own database file and return the path
+    of the database (called from worker processes). When a cache
+    directory is given, the cache entry for the file is used.
+    """
+    path, args, kwds, profile, cache_dir, cache_limits, temp_dir = task
+    loader = _make_loader(path, args, kwds, profile)
+    if cache_dir:
+        return get_cache_file(cache_dir, path, loader, args, kwds,
+                              **cache_limits)
+
+    fd, db_file = tempfile.mkstemp(suffix=CACHE_SUFFIX, dir=temp_dir)
+    os.close(fd)
+    build_cache_file(db_file, loader)
+    return db_file
+
+
+def _load_files_in_parallel(paths, args, kwds, profile, cache_dir,
+                            cache_limits, workers):
+    """Generator that parses the files in *paths* using a pool of
+    *workers* processes and yields the path of a database file for
+    each (in the same order as *paths*). Temporary database files
+    are removed once the following file is requested.
+    """
+    temp_dir = tempfile.mkdtemp(prefix='datatest-')
+    if cache_dir:
+        # Worker processes do not share this process's record of the
+        # cache files in use, so it's passed along with the limits.
+        keep = cache_files_in_use().union(cache_limits.get('keep', ()))
+        cache_limits = dict(cache_limits, keep=keep)
+    tasks = [(path, args, kwds, profile, cache_dir, cache_limits, temp_dir)
+             for path in paths]
+    process_pool = multiprocessing.Pool(workers)
+    try:
+        for db_file in process_pool.imap(_load_file_task, tasks):
+            yield db_file
+            if not cache_dir:
+                os.remove(db_file)
+    finally:
+        process_pool.terminate()
+        process_pool.join()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def _partition_hash(value, n):
+    """Return the partition number (from 0 to *n* - 1) for *value*.
+    Values that SQLite considers equal (like 1 and 1.0) are always
+    assigned to the same partition.
+    """
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, Integral):
+        text = str(int(value))
+    else:
+        text = repr(value)
+    return zlib.crc32(text.encode('utf-8')) % n
+
+
+_partition_threads = None  # <- Shared by all partitioned Selectors.
+_partition_threads_lock = threading.Lock()
+
+
+def _get_partition_threads():
+    """Return the thread pool used to query partitions (created on
+    first use with one thread per CPU). Threads are reused so each
+    keeps its own connection open between queries.
+    """
+    global _partition_threads
+    with _partition_threads_lock:
+        if _partition_threads is None:
+            _partition_threads = ThreadPool(multiprocessing.cpu_count())
+    return _partition_threads
+
+
+def _combine_sums(values):
+    """Combine partial SUM() values (NULL if all are NULL)."""
+    values = [x for x in values if x is not None]
+    return sum(values[1:], values[0]) if values else None
+
+
+_combine_functions = {
+    'SUM': _combine_sums,
+    'COUNT': sum,
+    'MIN': _sqlite_min,
+    'MAX': _sqlite_max,
+}
+
+
+_FileSource = collections.namedtuple(
+    typename='FileSource',
+    field_names=(
+        'path',      # Path of the CSV file.
+        'args',      # Positional arguments used to load the file.
+        'kwds',      # Keyword arguments used to load the file.
+        'offset',    # Number of bytes loaded so far.
+        'header',    # Bytes of the header line.
+        'checksum',  # Digest of the bytes before *offset*.
+        'rowids',    # List of (first, last) rowid ranges of its rows.
+        'rows',      # Number of rows loaded from the file.
+    ),
+)
+
+_checksum_chunk_size = 1024 * 1024  # <- Bytes read at a time when hashing.
+
+
+def _is_csv_path(obj):
+    """Returns True if *obj* is the path of an existing CSV file."""
+    return (isinstance(obj, string_types)
+            and obj.lower().endswith('.csv')
+            and is_cacheable(obj))
+
+
+def _file_hash(fh, offset):
+    """Return a hash object updated with the bytes of *fh* that come
+    before *offset* (more bytes can be added to continue the hash).
+    """
+    digest = hashlib.sha1()
+    fh.seek(0)
+    remaining = offset
+    while remaining > 0:
+        chunk = fh.read(min(remaining, _checksum_chunk_size))
+        if not chunk:
+            break
+        digest.update(chunk)
+        remaining -= len(chunk)
+    return digest
+
+
+def _file_checksum(fh, offset):
+    """Return a digest of the bytes that come before *offset*."""
+    return _file_hash(fh, offset).hexdigest()
+
+
+def _snapshot_file(path, args, kwds):
+    """Return a _FileSource for the current contents of *path* (no
+    rows are recorded yet).
+    """
+    with open(path, 'rb') as fh:
+        header = fh.readline()
+        offset = os.fstat(fh.fileno()).st_size
+        checksum = _file_checksum(fh, offset)
+    return _FileSource(path, args, kwds, offset, header, checksum, [], 0)
+
+
+def _complete_records_end(data, quotechar=b'"'):
+    """Return the position just past the newline that ends the last
+    complete CSV record in *data* (or 0 if there is none). Newlines
+    inside quoted fields do not end records. If *quotechar* is None,
+    fields are not quoted.
+    """
+    if quotechar is None:
+        return data.rfind(b'\n') + 1  # <- EXIT!
+
+    # Text between the quotechars at odd indexes is quoted (escaped
+    # quotes, like "", end and restart a quoted part).
+    parts = data.split(quotechar)
+    position = len(data)
+    for index in range(len(parts) - 1, -1, -1):
+        part = parts[index]
+        position -= len(part)
+        if index % 2 == 0:
+            newline = part.rfind(b'\n')
+            if newline != -1:
+                return position + newline + 1  # <- EXIT!
+        position -= len(quotechar)
+    return 0
+
+
+def _get_quotechar(kwds):
+    """Return the quotechar (as bytes) used to read a CSV file with
+    the given load *kwds* (or None if fields are not quoted).
+    """
+    if kwds.get('quoting') == csv.QUOTE_NONE:
+        return None
+    quotechar = kwds.get('quotechar', '"')
+    if quotechar is None:
+        return None
+    if not isinstance(quotechar, bytes):
+        quotechar = quotechar.encode(kwds.get('encoding') or 'utf-8')
+    return quotechar
+
+
+def _read_appended(source):
+    """Return a three-tuple of the *source*'s new offset, the bytes
+    of the complete records that were appended since it was loaded, and
+    the checksum of the file up to the new offset. The whole loaded
+    part of the file is hashed, so changes anywhere before the old
+    offset are detected. If the loaded part of the file has changed,
+    returns (None, None, None).
+    """
+    with open(source.path, 'rb') as fh:
+        size = os.fstat(fh.fileno()).st_size
+        if size < source.offset or fh.readline() != source.header:
+            return None, None, None  # <- EXIT! (File was changed.)
+
+        digest = _file_hash(fh, source.offset)
+        if digest.hexdigest() != source.checksum:
+            return None, None, None  # <- EXIT! (File was changed.)
+
+        fh.seek(source.offset)
+        appended = fh.read(size - source.offset)
+
+    # An incomplete last record (including one whose quoted field
+    # is still open) is left for the next refresh.
+    end = _complete_records_end(appended, _get_quotechar(source.kwds))
+    appended = appended[:end]
+    digest.update(appended)  # <- Continue hash to new offset.
+    return source.offset + end, appended, digest.hexdigest()
+
+
+def _max_rowid(cursor, table):
+    """Return the largest rowid in *table* (or 0 if it's empty or
+    does not exist).
+    """
+    if '.' not in table and not table_exists(cursor, table):
+        return 0
+    cursor.execute('SELECT MAX(_ROWID_) FROM {0}'.format(table))
+    return cursor.fetchone()[0] or 0
+
+
+_max_sample_blocks = 500  # <- Larger samples use larger blocks.
+
+
+def _rowid_blocks_clause(rowid, first, span, fraction, rng):
+    """Return a where-clause that selects a random *fraction* of the
+    blocks of consecutive rowids in the range of *span* rowids that
+    starts at *first*. Blocks are chosen using *rng* (a random.Random
+    instance) and adjacent blocks are combined into a single range.
+
+    Blocks are as small as possible (down to a single rowid) while
+    keeping the number of chosen blocks within _max_sample_blocks.
+    """
+    block_size = max(1, int(math.ceil(span * fraction / _max_sample_blocks)))
+    block_count = (span + block_size - 1) // block_size
+    chosen = max(1, int(round(block_count * fraction)))
+
+    ranges = []  # <- List of [start, stop] rowids.
+    for block in sorted(rng.sample(range(block_count), chosen)):
+        start = first + block * block_size
+        if ranges and ranges[-1][1] == start - 1:
+            ranges[-1][1] = start + block_size - 1
+        else:
+            ranges.append([start, start + block_size - 1])
+
+    clauses = []
+    for start, stop in ranges:
+        if start == stop:
+            clauses.append('{0}={1}'.format(rowid, start))
+        else:
+            clauses.append('{0} BETWEEN {1} AND {2}'.format(rowid, start, stop))
+    return ' OR '.join(clauses)
+
+
 class Selector(object):
     """A class to quickly load and select tabular data. The given
     *objs*, *\*args*, and *\*\*kwds*, can be any values supported
@@ -957,12 +2518,27 @@ class Selector(object):
     Create an empty Selector that can be populated later::
 
         select = datatest.Selector()
+
+    By default, data is stored in a temporary database file. Use the
+    *storage* keyword to keep data in memory instead: ``'memory'``
+    uses a private in-memory database (shared by all threads through
+    a single connection) and ``'shared-memory'`` uses an in-memory
+    database that each thread can reach through its own connection
+    (requires Python 3.4 or newer)::
+
+        select = datatest.Selector('myfile.csv', storage='memory')
+
+    When using the default ``'file'`` storage, the *mmap_size*
+    keyword enables memory-mapped I/O of up to the given number of
+    bytes::
+
+        select = datatest.Selector('myfile.csv', mmap_size=2**30)
     """
     def __init__(self, objs=None, *args, **kwds):
         """Initialize self."""
-        self._connection = DEFAULT_CONNECTION
-        self._table = None
-        self._obj_strings = []
+        storage = kwds.pop('storage', 'file')
+        mmap_size = kwds.pop('mmap_size', None)
+        self._init_state(_get_pool(storage, mmap_size))
         if objs:
             try:
                 self.load_data(objs, *args, **kwds)
@@ -970,6 +2546,32 @@ class Selector(object):
                 __tracebackhide__ = True
                 raise
 
+    def _init_state(self, pool, rebuildable=True):
+        """Set the attributes of an empty Selector that uses the
+        connection *pool*. If *rebuildable* is False, load calls are
+        not recorded and the table can not be rebuilt after it's
+        evicted. Also used by the alternate constructors of the
+        "__past__" API modules.
+        """
+        self._pool = pool
+        self._finalizer = None
+        self._evicted = False
+        # Calls that can rebuild the table (None if it can't be rebuilt).
+        self._load_calls = [] if rebuildable else None
+        self._budget_key = weakref.ref(self)
+        self._partitions = []         # <- Partition tables and the
+        self._partition_spec = None   #    column and conditions used.
+        self._table = None
+        self._obj_strings = []
+        self._index_advisor = None
+        self._fieldnames = None     # <- Schema cache (reset by
+        self._fieldname_set = None  #    load_data).
+        self._result_cache = None
+        self._read_only = False     # <- True if table is attached
+        self._cached_entry = False  #    (and if it's a cache entry).
+        self._file_sources = []  # <- CSV files that can be refreshed.
+        self._query_log = None   # <- Used by Query.explain().
+
     def load_data(self, objs, *args, **kwds):
         """Load data from one or more objects. The given *objs*,
         *\*args*, and *\*\*kwds*, can be any values supported by
@@ -1001,7 +2603,69 @@ class Selector(object):
 
             select = datatest.Selector()
             select.load_data('*.csv')
+
+        Use the *cache_dir* keyword to keep a persistent copy of the
+        loaded data. Files are fingerprinted by path, size, mtime,
+        and content (along with the given load arguments) and later
+        loads of unchanged files skip parsing entirely::
+
+            select = datatest.Selector('big.csv', cache_dir='.cache')
+
+        Use the *cache_max_size* (in bytes) and *cache_max_age* (in
+        seconds since last used) keywords to limit the cache. When a
+        new entry is added, entries older than *cache_max_age* are
+        removed and then the least recently used entries are removed
+        until the cache is no larger than *cache_max_size*. Entries
+        that are attached to a Selector are never removed::
+
+            select = datatest.Selector('big.csv', cache_dir='.cache',
+                                       cache_max_size=10 * 1024 ** 3)
+
+        Use the *profile* keyword to tune SQLite while loading large
+        amounts of data. It can be the name of a preset ('default',
+        'fast-ephemeral', or 'low-memory') or a dictionary of settings
+        (batch_size, journal_mode, cache_size, temp_store, locking_mode,
+        and defer_indexes)::
+
+            select = datatest.Selector('big.csv', profile='fast-ephemeral')
+
+        Selectors that use file storage (the default) keep their
+        database in WAL mode so that other threads can read while
+        records are loaded. For these Selectors, the journal_mode and
+        locking_mode settings are not applied (so 'fast-ephemeral'
+        does not take an EXCLUSIVE lock) but the other settings are.
+
+        Use the *workers* keyword to parse multiple files at the same
+        time using a pool of processes. Records are still inserted
+        by a single writer (in the same order as the files are given)
+        so columns are combined just as they are when loading files
+        one after another::
+
+            select = datatest.Selector()
+            select.load_data('partitions/*.csv', workers=4)
+
+        Use the *dtypes* keyword to store columns with a numeric type
+        (so aggregates and comparisons don't need to convert values
+        row by row). It can be a dictionary of column types (given as
+        int, float, str, or an SQLite type name) or the string 'infer'
+        to infer types from a sample of records::
+
+            select = datatest.Selector()
+            select.load_data('myfile.csv', dtypes={'amount': float})
+
+        Values that can not be converted to a column's type are kept
+        as they are. Columns that already exist keep their type.
         """
+        load_call = ('load_data', (objs,) + args, dict(kwds))
+        cache_dir = kwds.pop('cache_dir', None)
+        cache_limits = {
+            'max_size': kwds.pop('cache_max_size', None),
+            'max_age': kwds.pop('cache_max_age', None),
+        }
+        profile = get_load_profile(kwds.pop('profile', None))
+        workers = kwds.pop('workers', None)
+        _release_pending()
+
         if isinstance(objs, string_types):
             obj_list = glob(objs)  # Get shell-style wildcard matches.
             if not obj_list:
@@ -1013,27 +2677,577 @@ class Selector(object):
         else:
             obj_list = objs
 
-        cursor = self._connection.cursor()
-        with savepoint(cursor):
-            table = self._table or new_table_name(cursor)
-            for obj in obj_list:
-                if ((
-                        isinstance(obj, string_types)
-                        and obj.lower().endswith('.csv')
-                    ) or (
-                        isinstance(obj, file_types)
-                        and getattr(obj, 'name', '').lower().endswith('.csv')
-                    )
-                ):
-                    load_csv(cursor, table, obj, *args, **kwds)
-                else:
-                    reader = get_reader(obj, *args, **kwds)
-                    load_data(cursor, table, reader)
+        # Take note of CSV files so they can be refreshed later.
+        snapshots = {}
+        for index, obj in enumerate(obj_list):
+            if _is_csv_path(obj):
+                snapshots[index] = _snapshot_file(obj, args, dict(kwds))
+        file_sources = []
+
+        # Files are only parsed in parallel when there are two or more.
+        parallel_indexes = set()
+        if workers and workers > 1:
+            indexes = [i for i, obj in enumerate(obj_list) if is_cacheable(obj)]
+            if len(indexes) > 1:
+                parallel_indexes.update(indexes)
+
+        cache_files = [None] * len(obj_list)
+        if cache_dir:
+            for index, obj in enumerate(obj_list):
+                if index in parallel_indexes or not is_cacheable(obj):
+                    continue
+                loader = _make_loader(obj, args, kwds, profile)
+                keep = [x for x in cache_files if x]  # <- Not loaded yet.
+                cache_files[index] = get_cache_file(
+                    cache_dir, obj, loader, args, kwds, keep=keep,
+                    **cache_limits)
+
+            # When an empty Selector loads a single cached file, the
+            # file is attached (read-only) and its table is queried
+            # in place. If no more databases can be attached, the
+            # entry's records are copied instead (see below).
+            if (not self._table and len(obj_list) == 1 and cache_files[0]
+                    and self._pool.can_attach()):
+                schema = self._pool.attach(cache_files[0], read_only=True)
+                self._table = '{0}.{1}'.format(schema, CACHE_TABLE)
+                self._read_only = True
+                self._cached_entry = True
+                self._append_obj_string(obj_list[0])
+                if 0 in snapshots:
+                    with self._pool.writer() as connection:
+                        last = _max_rowid(connection.cursor(), self._table)
+                    self._file_sources.append(snapshots[0]._replace(
+                        rowids=[(1, last)] if last else [], rows=last))
+                self._record_load_call(*load_call)
+                self._reset_caches()
+                return  # <- EXIT!
+
+        parallel_files = _load_files_in_parallel(
+            [obj_list[i] for i in sorted(parallel_indexes)],
+            args, kwds, profile, cache_dir,
+            dict(cache_limits, keep=[x for x in cache_files if x]), workers,
+        )
+
+        with self._pool.writer() as connection, \
+                contextlib.closing(parallel_files):
+            cursor = connection.cursor()
+            attached_schema, _ = split_table_name(self._table or '')
+            if attached_schema or not self._table or self._partitions:
+                table = new_table_name(cursor)  # <- New or staging table.
+            else:
+                table = self._table
 
-                self._append_obj_string(obj)
+            with bulk_load(cursor, table, profile), savepoint(cursor):
+                if attached_schema:
+                    # Copy attached table so new records can be added.
+                    copy_table(cursor, self._table, table, temporary=False)
 
-        if not self._table and table_exists(cursor, table):
-            self._table = table
+                for index, obj in enumerate(obj_list):
+                    if index in parallel_indexes:
+                        cache_file = next(parallel_files)
+                    else:
+                        cache_file = cache_files[index]
+
+                    first = _max_rowid(cursor, table) + 1
+                    if cache_file:
+                        load_cache_file(cursor, table, cache_file,
+                                        temporary=False)
+                    else:
+                        _load_object(cursor, table, obj, *args,
+                                     batch_size=profile.batch_size, **kwds)
+
+                    if index in snapshots and not self._partitions:
+                        last = _max_rowid(cursor, table)
+                        rowids = [(first, last)] if last >= first else []
+                        file_sources.append(snapshots[index]._replace(
+                            rowids=rowids, rows=last - first + 1))
+
+                    self._append_obj_string(obj)
+
+                if self._partitions and table_exists(cursor, table):
+                    self._distribute(cursor, table)
+
+            if attached_schema:
+                self._pool.detach(attached_schema)
+                self._table = table
+                self._read_only = False
+                self._cached_entry = False
+            elif not self._table and table_exists(cursor, table):
+                self._table = table
+            self._file_sources.extend(file_sources)
+            self._reset_caches()
+        self._record_load_call(*load_call)
+
+    def refresh(self):
+        """Load records that were appended to CSV files since they
+        were loaded. Only the new lines are parsed and inserted, so
+        refreshing a large file that grows throughout the day is
+        cheap::
+
+            select = datatest.Selector('feed.csv')
+            ...
+            select.refresh()  # <- Load rows added to feed.csv.
+
+        Records are only loaded once they are complete (ending with
+        a newline that is not inside a quoted field). The previously
+        loaded part of each file is checked against a checksum--if
+        it has changed (e.g., a row or the header was edited or the
+        file was truncated), the file's old records are removed and
+        the whole file is loaded again. Sources other than CSV file
+        paths are not refreshed. Partitioned Selectors can not be
+        refreshed (a RuntimeError is raised).
+        """
+        if self._partitions:
+            raise RuntimeError('cannot refresh a partitioned Selector')
+
+        changes = [_read_appended(x) for x in self._file_sources]
+        if all(offset is not None and not appended
+               for offset, appended, _ in changes):
+            return  # <- EXIT! (No changes.)
+
+        with self._pool.writer() as connection:
+            cursor = connection.cursor()
+            attached_schema, _ = split_table_name(self._table or '')
+            if attached_schema or not self._table:
+                table = new_table_name(cursor)
+            else:
+                table = self._table
+
+            file_sources = []
+            with savepoint(cursor):
+                if attached_schema:
+                    copy_table(cursor, self._table, table, temporary=False)
+
+                for source, change in zip(self._file_sources, changes):
+                    source = self._refresh_source(cursor, table, source, *change)
+                    file_sources.append(source)
+
+            if attached_schema:
+                self._pool.detach(attached_schema)
+                self._table = table
+                self._read_only = False
+                self._cached_entry = False
+            elif not self._table and table_exists(cursor, table):
+                self._table = table
+            self._file_sources = file_sources
+            self._reset_caches()
+        self._update_budget()
+
+    @staticmethod
+    def _refresh_source(cursor, table, source, offset, appended, checksum):
+        """Load the *appended* bytes of a CSV file *source* into
+        *table* (or reload the whole file if it has changed) and
+        return an updated _FileSource with the given *offset* and
+        *checksum*.
+        """
+        if offset is not None and source.rowids:
+            count = 0
+            for first, last in source.rowids:
+                cursor.execute(
+                    'SELECT COUNT(*) FROM {0} WHERE _ROWID_ BETWEEN ? AND ?'
+                    .format(table), (first, last))
+                count += cursor.fetchone()[0]
+            if count != source.rows:
+                offset = None  # <- Records are missing, reload file.
+
+        if offset is None:
+            for first, last in source.rowids:
+                cursor.execute(
+                    'DELETE FROM {0} WHERE _ROWID_ BETWEEN ? AND ?'
+                    .format(table), (first, last))
+            source = _snapshot_file(source.path, source.args, source.kwds)
+            path = source.path
+        elif not appended:
+            return source  # <- EXIT! (Nothing to load.)
+        else:
+            fd, path = tempfile.mkstemp(prefix='datatest-', suffix='.csv')
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(source.header)
+                fh.write(appended)
+            source = source._replace(offset=offset, checksum=checksum)
+
+        try:
+            first = _max_rowid(cursor, table) + 1
+            _load_object(cursor, table, path, *source.args, **source.kwds)
+            last = _max_rowid(cursor, table)
+        finally:
+            if path != source.path:
+                os.remove(path)
+
+        if last < first:
+            return source
+        return source._replace(rowids=source.rowids + [(first, last)],
+                               rows=source.rows + last - first + 1)
+
+    def attach(self, path, table):
+        """Attach an existing SQLite database file and query one
+        of its tables in place. The file is opened read-only and no
+        records are copied, so even very large tables are available
+        right away::
+
+            select = datatest.Selector()
+            select.attach('warehouse.db', table='orders')
+
+        If the Selector already contains data, the records from the
+        table are added to it instead (just as if they were loaded
+        with :meth:`load_data`). Likewise, loading more data into a
+        Selector with an attached table first copies the attached
+        records into a new table.
+
+        Records are also copied when SQLite's limit of attached
+        databases (10 by default, shared with Selectors that query
+        *cache_dir* entries in place) has been reached.
+        """
+        if not os.path.isfile(path):
+            __tracebackhide__ = True
+            raise FileNotFoundError('no such file: {0!r}'.format(path))
+
+        _release_pending()
+        if not self._table and self._pool.can_attach():
+            schema = self._pool.attach(path, read_only=True)
+            qualified_name = '{0}.{1}'.format(schema, table)
+            with self._pool.writer() as connection:
+                cursor = connection.cursor()
+                cursor.execute(table_info_statement(qualified_name))
+                if not cursor.fetchall():
+                    self._pool.detach(schema)
+                    msg = 'no table {0!r} in {1!r}'.format(table, path)
+                    raise LookupError(msg)
+
+            self._table = qualified_name
+            self._read_only = True
+            self._append_obj_string(path)
+            self._record_load_call('attach', (path, table), {})
+            self._reset_caches()
+            return  # <- EXIT!
+
+        # Copy the records (the Selector already has data or no more
+        # databases can be attached).
+        with self._pool.writer() as connection:
+            cursor = connection.cursor()
+            attached_schema, _ = split_table_name(self._table or '')
+            if attached_schema or self._partitions or not self._table:
+                new_table = new_table_name(cursor)
+            else:
+                new_table = self._table
+
+            with savepoint(cursor):
+                if attached_schema:
+                    copy_table(cursor, self._table, new_table, temporary=False)
+                if not load_cache_file(cursor, new_table, path,
+                                       temporary=False, source_table=table):
+                    msg = 'no table {0!r} in {1!r}'.format(table, path)
+                    raise LookupError(msg)  # <- Rolls back savepoint.
+                if self._partitions:
+                    self._distribute(cursor, new_table)
+
+            if attached_schema:
+                self._pool.detach(attached_schema)
+                self._table = new_table
+                self._read_only = False
+                self._cached_entry = False
+            elif not self._table and table_exists(cursor, new_table):
+                self._table = new_table
+            self._append_obj_string(path)
+            self._reset_caches()
+        self._record_load_call('attach', (path, table), {})
+
+    def partition(self, column, n, method='hash'):
+        """Split the Selector's records into *n* partition tables by
+        the values in *column*. Grouped queries whose key includes
+        *column* (and sum, count, min, and max aggregates grouped by
+        any key) are then run on all partitions at the same time and
+        their results are merged::
+
+            select = datatest.Selector('big.csv')
+            select.partition('region', 8)
+
+            select({'region': 'amount'}).sum()  # <- Runs in parallel.
+
+        The *method* can be ``'hash'`` (records are assigned by a hash
+        of the column value) or ``'range'`` (each partition holds a
+        contiguous range of values with boundaries chosen so that
+        partitions are about the same size). Records loaded later are
+        added to the matching partitions.
+
+        Partitions are queried from a pool of threads (SQLite does not
+        hold Python's global interpreter lock while it runs a query).
+        Other queries read all partitions as if they were one table.
+        Partitioned Selectors can not be refreshed (see
+        :meth:`refresh`).
+
+        .. note:: Partitioning does not keep the order in which
+                  records were loaded. Groups are still returned in
+                  key order, but the order of ungrouped results (and
+                  of values within groups whose key does not include
+                  *column*) is unspecified. So ``select('A').limit(3)``
+                  can return different records after partitioning.
+        """
+        if method not in ('hash', 'range'):
+            msg = "method must be 'hash' or 'range', got {0!r}"
+            raise ValueError(msg.format(method))
+        if n < 1:
+            raise ValueError('n must be 1 or greater, got {0!r}'.format(n))
+        if not self._table:
+            raise RuntimeError('cannot partition a Selector with no data')
+        self._assert_fields_exist([column])
+
+        _release_pending()
+        old_tables = [self._table] + self._partitions
+        escaped = self._escape_field_name(column)
+
+        with self._pool.writer() as connection:
+            cursor = connection.cursor()
+            if method == 'hash':
+                connection.create_function(
+                    'datatest_partition', 2, _partition_hash)
+                conditions = [
+                    ('datatest_partition({0}, ?) = ?'.format(escaped), (n, i))
+                    for i in range(n)
+                ]
+            else:
+                cursor.execute('SELECT COUNT(*) FROM {0}'.format(self._table))
+                total = cursor.fetchone()[0]
+                statement = 'SELECT {0} FROM {1} ORDER BY {0} LIMIT 1 OFFSET ?'
+                statement = statement.format(escaped, self._table)
+                bounds = []
+                for i in range(1, n):
+                    cursor.execute(statement, (total * i // n,))
+                    row = cursor.fetchone()
+                    if row is not None:
+                        bounds.append(row[0])
+                conditions = []
+                lower = None
+                for upper in bounds + [None]:
+                    clauses = []
+                    params = []
+                    if lower is not None:
+                        clauses.append('{0} >= ?'.format(escaped))
+                        params.append(lower)
+                    if upper is not None:
+                        if lower is None:  # <- First partition gets NULLs.
+                            clauses.append('({0} IS NULL OR {0} < ?)'.format(escaped))
+                        else:
+                            clauses.append('{0} < ?'.format(escaped))
+                        params.append(upper)
+                    conditions.append((' AND '.join(clauses) or '1', tuple(params)))
+                    lower = upper
+
+            table = new_table_name(cursor)
+            columns = get_columns(cursor, self._table)
+            dtypes = get_dtypes(cursor, self._table)
+            old_spec = (self._partitions, self._partition_spec)
+            try:
+                with savepoint(cursor):
+                    partitions = []
+                    for i in range(len(conditions)):
+                        name = '{0}_p{1}'.format(table, i)
+                        create_table(cursor, name, columns, temporary=False,
+                                     dtypes=dtypes)
+                        partitions.append(name)
+                    self._partitions = partitions
+                    self._partition_spec = (column, conditions)
+                    self._distribute(cursor, self._table, view=table)
+            except Exception:
+                self._partitions, self._partition_spec = old_spec
+                raise
+
+        self._table = table  # <- Registers finalizer for new tables.
+        self._read_only = False
+        self._cached_entry = False
+        self._file_sources = []
+        _schedule_release(self._pool, old_tables, None)
+        _release_pending()
+        self._reset_caches()
+        self._record_load_call('partition', (column, n), {'method': method})
+
+    def _distribute(self, cursor, source, view=None):
+        """Insert the records of the *source* table into the partition
+        tables and recreate the view (named *view* or the Selector's
+        current table) that combines them. Unless *source* is the
+        Selector's own table, it is dropped afterwards.
+        """
+        _, conditions = self._partition_spec
+        columns = get_columns(cursor, source)
+        dtypes = get_dtypes(cursor, source)
+        escaped = ', '.join(self._escape_field_name(x) for x in columns)
+        if any('datatest_partition' in x for x, _ in conditions):
+            cursor.connection.create_function(
+                'datatest_partition', 2, _partition_hash)
+
+        for name, (condition, params) in zip(self._partitions, conditions):
+            alter_table(cursor, name, columns, dtypes=dtypes)
+            statement = 'INSERT INTO {0} ({1}) SELECT {1} FROM {2} WHERE {3}'
+            statement = statement.format(name, escaped, source, condition)
+            cursor.execute(statement, params)
+
+        view = view or self._table_name
+        if source != self._table_name:
+            drop_table(cursor, source)  # <- Drop staging table.
+
+        cursor.execute('DROP VIEW IF EXISTS {0}'.format(view))
+        selects = ' UNION ALL '.join(
+            'SELECT * FROM {0}'.format(x) for x in self._partitions)
+        cursor.execute('CREATE VIEW {0} AS {1}'.format(view, selects))
+
+    @property
+    def _table(self):
+        """Name of the table that holds the Selector's data. If the
+        table was evicted to stay within the memory budget, it is
+        rebuilt before it is returned.
+        """
+        if self._evicted:
+            self._rebuild_table()
+        if _memory_budget is not None:
+            _memory_budget.touch(self._budget_key)
+        return self._table_name
+
+    @_table.setter
+    def _table(self, table):
+        # The finalizer for the old table is detached (not called)
+        # because the caller has already taken care of it.
+        if self._finalizer is not None:
+            self._finalizer.detach()
+        self._table_name = table
+        if table:
+            tables = [table] + self._partitions
+            self._finalizer = weakref.finalize(
+                self, _schedule_release, self._pool, tables, self._budget_key)
+            self._finalizer.atexit = False  # <- Pool is closed at exit.
+        else:
+            self._finalizer = None
+
+    def _record_load_call(self, method, args, kwds):
+        """Record a call that loaded data (so the table can be rebuilt
+        if it's evicted) and charge the table to the memory budget.
+        Only calls that load from files can be replayed.
+        """
+        global _memory_budget
+
+        objs = args[0]
+        if isinstance(objs, string_types) or (
+                isinstance(objs, list)
+                and all(isinstance(x, string_types) for x in objs)):
+            if self._load_calls is not None:
+                self._load_calls.append((method, args, kwds))
+        else:
+            self._load_calls = None  # <- Can not be rebuilt.
+        self._update_budget()
+
+    def _update_budget(self):
+        """Update the size of the Selector's table in the memory
+        budget and evict the least recently used tables of other
+        Selectors if the budget is exceeded.
+        """
+        global _memory_budget
+
+        budget = _memory_budget
+        if budget is None or self._load_calls is None or not self._table_name:
+            return  # <- EXIT!
+
+        with self._pool.writer() as connection:
+            cursor = connection.cursor()
+            tables = self._partitions or [self._table_name]
+            size = sum(_get_table_size(cursor, x) for x in tables)
+        budget.set_size(self._budget_key, size)
+
+        for key in budget.get_evictions(keep=self._budget_key):
+            selector = key()
+            if selector is not None:
+                selector._evict()
+
+    def _evict(self):
+        """Drop the Selector's table to free memory. The table is
+        rebuilt from the recorded load calls when it's next used.
+        """
+        if self._finalizer is not None:
+            self._finalizer()
+        self._table = None
+        self._partitions = []
+        self._partition_spec = None
+        self._evicted = True
+        self._reset_caches()
+        _release_pending()
+
+    def _rebuild_table(self):
+        """Replay the recorded load calls to rebuild an evicted table."""
+        load_calls = self._load_calls
+        self._evicted = False
+        self._load_calls = []
+        self._obj_strings = []
+        self._file_sources = []
+        self._read_only = False
+        self._cached_entry = False
+        for method, args, kwds in load_calls:
+            getattr(self, method)(*args, **kwds)
+
+    def close(self):
+        """Drop the Selector's table (and its indexes) to release the
+        memory or disk space it uses. After closing, the Selector is
+        empty. Selectors can also be used as context managers::
+
+            with datatest.Selector('example.csv') as select:
+                ...
+
+        Tables are also dropped when a Selector is garbage collected,
+        but calling close() releases them right away.
+        """
+        global _memory_budget
+
+        if self._finalizer is not None:
+            self._finalizer()
+        self._table = None
+        self._partitions = []
+        self._partition_spec = None
+        self._evicted = False
+        self._load_calls = []
+        self._obj_strings = []
+        self._file_sources = []
+        self._read_only = False
+        self._cached_entry = False
+        if _memory_budget is not None:
+            _memory_budget.discard(self._budget_key)
+        self._reset_caches()
+        _release_pending()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @staticmethod
+    def set_memory_budget(max_bytes):
+        """Limit the total size of the tables of all Selectors to
+        *max_bytes*. When a Selector loads data and the limit is
+        exceeded, the tables of the least recently used Selectors
+        are dropped::
+
+            datatest.Selector.set_memory_budget(2**30)  # <- 1 GiB
+
+        A Selector whose table was dropped loads its data again the
+        next time it is used. Since this requires the original files,
+        only Selectors that were loaded from files (including attached
+        databases) are counted and evicted. Setting *max_bytes* to None
+        removes the limit.
+        """
+        global _memory_budget
+
+        if max_bytes is None:
+            _memory_budget = None
+        else:
+            _memory_budget = MemoryBudget(max_bytes)
+
+    def _reset_caches(self):
+        """Reset cached values that depend on the loaded data."""
+        self._fieldnames = None
+        if self._result_cache is not None:
+            self._result_cache.clear()
+
+    @property
+    def _connection(self):
+        """The calling thread's connection (used for reading)."""
+        return self._pool.connection()
 
     def _append_obj_string(self, obj):
         """Get string for *obj*, limit to one line, and append to list."""
@@ -1064,18 +3278,73 @@ class Selector(object):
     @property
     def fieldnames(self):
         """A list of field names used by the data source."""
-        cursor = self._connection.cursor()
-        cursor.execute('PRAGMA table_info({0})'.format(self._table))
-        return [x[1] for x in cursor]
+        if self._fieldnames is None:
+            self._load_schema()
+        return list(self._fieldnames)
+
+    def _load_schema(self):
+        """Get field names from the database and cache them (the
+        cache is reset when new data is loaded).
+        """
+        if self._table:
+            cursor = self._connection.cursor()
+            cursor.execute(table_info_statement(self._table))
+            fieldnames = tuple(x[1] for x in cursor)
+        else:
+            fieldnames = tuple()
+        self._fieldname_set = frozenset(fieldnames)
+        self._fieldnames = fieldnames
 
     def __iter__(self):
         """Return iterable of dictionary rows (like csv.DictReader)."""
+        return self.iter_rows(dict)
+
+    def iter_rows(self, row_type=dict, arraysize=1000):
+        """Return an iterator of rows. Rows are fetched *arraysize*
+        at a time so iterating over a large Selector uses a constant
+        amount of memory.
+
+        The *row_type* can be :py:class:`dict`, :py:class:`tuple`,
+        or :py:func:`collections.namedtuple` (field names that are
+        not valid identifiers are renamed)::
+
+            for row in select.iter_rows(tuple):
+                ...
+
+        Using tuples is the fastest because rows are returned as
+        they are received from SQLite.
+        """
+        if row_type is dict:
+            fieldnames = self.fieldnames
+            make_row = lambda x: dict(zip(fieldnames, x))
+        elif row_type is tuple:
+            make_row = None
+        elif row_type is collections.namedtuple:
+            row_cls = collections.namedtuple('Row', self.fieldnames, rename=True)
+            make_row = row_cls._make
+        else:
+            msg = 'row_type must be dict, tuple, or namedtuple, got {0!r}'
+            raise ValueError(msg.format(row_type))
+
+        if not self._table:
+            return iter([])  # <- EXIT!
+
         cursor = self._connection.cursor()
+        cursor.arraysize = arraysize
         cursor.execute('SELECT * FROM ' + self._table)
+        return self._fetch_rows(cursor, make_row)
 
-        fieldnames = self.fieldnames
-        dict_row = lambda x: dict(zip(fieldnames, x))
-        return (dict_row(row) for row in cursor.fetchall())
+    @staticmethod
+    def _fetch_rows(cursor, make_row):
+        rows = cursor.fetchmany()
+        while rows:
+            if make_row:
+                for row in rows:
+                    yield make_row(row)
+            else:
+                for row in rows:
+                    yield row
+            rows = cursor.fetchmany()
 
     def __call__(self, columns, **where):
         """After a Selector has been created, it can be called like a
@@ -1124,32 +3393,116 @@ class Selector(object):
             __tracebackhide__ = True
             raise
 
-    def _execute_query(self, select_clause, trailing_clause=None, **kwds_filter):
-        """Execute query and return cursor object."""
+    @contextlib.contextmanager
+    def _advise_index(self, key, where):
+        """Context manager that records the columns used by a query
+        (the *key* columns and the *where* columns that SQLite can
+        match with an index) and creates an automatic index when
+        the index advisor calls for one.
+        """
+        if not self._index_advisor or self._read_only:
+            yield
+            return  # <- EXIT!
+
+        if not key:
+            key_columns = ()
+        elif isinstance(key, str):
+            key_columns = (key,)
+        else:
+            key_columns = tuple(key)
+        where_columns = [k for k, v in where.items()
+                         if not callable(v) and v is not Ellipsis]
+        columns = IndexAdvisor.get_columns(where_columns, key_columns)
+
+        start = time.time()
+        yield
+        elapsed = time.time() - start
+
+        if self._index_advisor.record(columns, elapsed):
+            self.create_index(*columns)
+
+    def _execute_query(self, select_clause, trailing_clause=None,
+                       _from_table=None, _where_sql=None, **kwds_filter):
+        """Execute query and return cursor object. If *_from_table*
+        is given, it's queried instead of the Selector's own table.
+        If *_where_sql* is given, it's used as the already built
+        (clause, params) for *kwds_filter* (see _build_where_clause).
+        """
         try:
             # Register where-clause functions with SQLite connection.
-            func_list = [x for x in kwds_filter.values() if callable(x)]
+            func_list = [x for x in kwds_filter.values()
+                         if callable(x) and not isinstance(x, type)]
             _register_function(self._connection, func_list)
+            uses_regexp = any(isinstance(x, regex_types)
+                              for x in kwds_filter.values())
+            if uses_regexp:
+                _register_regexp(self._connection)
 
             # Build select-query.
-            stmnt = 'SELECT {0} FROM {1}'.format(select_clause, self._table)
-            where_clause, params = self._build_where_clause(kwds_filter)
+            stmnt = 'SELECT {0} FROM {1}'.format(select_clause, _from_table or self._table)
+            where_clause, params = _where_sql or self._build_where_clause(kwds_filter)
             if where_clause:
                 stmnt = '{0} WHERE {1}'.format(stmnt, where_clause)
             if trailing_clause:
                 stmnt = '{0}\n{1}'.format(stmnt, trailing_clause)
 
+            # Record query (when explaining a query).
+            if self._query_log is not None:
+                self._record_query(stmnt, params)
+
             # Execute query.
+            _pop_predicate_error()
             cursor = self._connection.cursor()
             cursor.execute(stmnt, params)
 
+        except _DryRun:
+            raise
         except Exception as e:
+            err = _pop_predicate_error()
+            if err is not None:
+                raise err
             exc_cls = e.__class__
             msg = '{0}\n  query: {1}\n  params: {2}'.format(e, stmnt, params)
             raise exc_cls(msg)
 
+        if func_list or uses_regexp:
+            return _PredicateCursor(cursor)
         return cursor
 
+    @contextlib.contextmanager
+    def _log_queries(self, dry_run=False):
+        """Context manager that records the SQL statements executed
+        by the Selector. Returns a list of (statement, parameters,
+        query plan) tuples. If *dry_run* is True, statements are not
+        executed--_DryRun is raised in their place.
+        """
+        query_log = []
+        self._query_log = (query_log, dry_run)
+        try:
+            yield query_log
+        finally:
+            self._query_log = None
+
+    def _record_query(self, stmnt, params):
+        """Add a statement and its query plan to the query log."""
+        query_log, dry_run = self._query_log
+        cursor = self._connection.cursor()
+
+        # EXPLAIN statements do not check for schema changes made by
+        # other connections (e.g., new indexes). So the schema is
+        # reloaded by reading from sqlite_master and the version is
+        # included in the statement text so that cached statements
+        # prepared with an older schema are not reused.
+        cursor.execute('SELECT 1 FROM sqlite_master LIMIT 1')
+        cursor.fetchall()
+        cursor.execute('PRAGMA schema_version')
+        version = cursor.fetchone()[0]
+        explain = 'EXPLAIN QUERY PLAN {0}\n-- schema version {1}'
+        cursor.execute(explain.format(stmnt, version), params)
+        query_log.append((stmnt, params, cursor.fetchall()))
+        if dry_run:
+            raise _DryRun()
+
     @staticmethod
     def _build_where_clause(where_dict):
         """Return 'WHERE' clause that implements *where* keyword
@@ -1160,9 +3513,22 @@ class Selector(object):
         items = where_dict.items()
         items = sorted(items, key=lambda x: x[0])  # Ordered by key.
         for key, val in items:
+            # If value is Ellipsis (a wildcard), no filter is needed.
+            if val is Ellipsis:
+                continue
+            # If value is a type, check the SQLite storage class.
+            elif isinstance(val, type):
+                typeof_clause = _typeof_clause(key, val)
+                if typeof_clause:
+                    clause.append(typeof_clause)
+            # If value is a regular expression.
+            elif isinstance(val, regex_types):
+                regex_clause, regex_params = _regex_clause(key, val)
+                clause.append(regex_clause)
+                params.extend(regex_params)
             # If value is a function.
-            if callable(val):
-                func_name = 'FUNC{0}'.format(id(val))
+            elif callable(val):
+                func_name = _get_function_name(val)
                 clause.append('{0}({1})'.format(func_name, key))
             # If value is a collection of strings.
             elif nonstringiter(val):
@@ -1224,12 +3590,37 @@ class Selector(object):
 
         raise TypeError('type {0!r} not supported'.format(type(columns)))
 
+    def _format_aggregates(self, columns, sqlfuncs, cursor):
+        """Return the results of a query that selects several aggregate
+        values (see _select_aggregates()) as a namedtuple or, if the
+        *columns* are grouped, as a Result of namedtuples by group.
+        """
+        aggregate_type = _get_aggregate_type(tuple(x.lower() for x in sqlfuncs))
+        if not isinstance(columns, collections.Mapping):
+            return aggregate_type(*next(cursor))  # <- EXIT!
+
+        key = tuple(columns.keys())[0]
+        key_type = type(key)
+        if issubclass(key_type, str):
+            slice_index = 1
+            keyfunc = lambda row: row[0]
+        else:
+            slice_index = len(key)
+            if issubclass(key_type, tuple) and hasattr(key_type, '_fields'):
+                keyfunc = lambda row: key_type(*row[:slice_index])  # If namedtuple.
+            else:
+                keyfunc = lambda row: key_type(row[:slice_index])
+        items = ((keyfunc(row), aggregate_type(*row[slice_index:])) for row in cursor)
+        return Result(DictItems(items), evaluation_type=dict)
+
     def _assert_fields_exist(self, fieldnames):
         """Assert that given fieldnames are present in data source,
         raises LookupError if fields are missing.
         """
         #assert not isinstance(fieldnames, BaseElement)
-        available = self.fieldnames
+        if self._fieldnames is None:
+            self._load_schema()
+        available = self._fieldname_set
         for name in fieldnames:
             if name not in available:
                 msg = '{0!r} not in {1!r}'.format(name, self)
@@ -1252,57 +3643,335 @@ class Selector(object):
 
         return key_columns, value_columns
 
+    def _groups_partitioned(self, key):
+        """Return True if the Selector is partitioned and all records
+        of each *key* group belong to a single partition.
+        """
+        if not self._partitions or not key:
+            return False
+        key_columns = (key,) if isinstance(key, str) else tuple(key)
+        return self._partition_spec[0] in key_columns
+
+    def _query_partitions(self, select_clause, trailing_clause, where, where_sql=None):
+        """Execute a query on each partition at the same time and
+        return a list of fetched rows for each partition.
+        """
+        def run(table):
+            cursor = self._execute_query(
+                select_clause, trailing_clause, _from_table=table,
+                _where_sql=where_sql, **where)
+            return cursor.fetchall()
+
+        if self._pool.mode == 'memory':  # <- Only one connection.
+            return [run(x) for x in self._partitions]
+        return _get_partition_threads().map(run, self._partitions)
+
+    @staticmethod
+    def _sort_rows(rows, key_length):
+        """Sort *rows* by their first *key_length* values (to match
+        an SQLite ORDER BY clause).
+        """
+        sortkey = lambda row: tuple(_sqlite_sortkey(x) for x in row[:key_length])
+        return sorted(rows, key=sortkey)
+
+    def _merge_partitions(self, select_clause, trailing_clause, key_columns,
+                          where, where_sql=None):
+        """Query all partitions and return the combined rows (used
+        when each group belongs to a single partition).
+        """
+        rows = self._query_partitions(select_clause, trailing_clause, where, where_sql)
+        return self._sort_rows(itertools.chain(*rows), len(key_columns))
+
+    def _combine_partitions(self, sqlfunc, select_clause, trailing_clause,
+                            key_columns, where, where_sql=None):
+        """Query all partitions and return rows that combine the
+        partial aggregate values of each group.
+        """
+        combine = _combine_functions[sqlfunc]
+        key_length = len(key_columns)
+
+        grouped = collections.OrderedDict()
+        partitions = self._query_partitions(
+            select_clause, trailing_clause, where, where_sql)
+        for rows in partitions:
+            for row in rows:
+                grouped.setdefault(row[:key_length], []).append(row[key_length:])
+
+        combined = []
+        for key, partials in grouped.items():
+            combined.append(key + tuple(combine(x) for x in zip(*partials)))
+        return self._sort_rows(combined, key_length)
+
     def _select(self, columns, **where):
-        key, value = _parse_columns(columns)
-        key_columns, value_columns = self._parse_key_value(key, value)
+        statement = self._prepare('_select', (columns,), where)
+        return self._run_prepared(statement)
 
-        select_clause = ', '.join(key_columns + value_columns)
-        if isinstance(value, collections.Set):
-            select_clause = 'DISTINCT ' + select_clause
+    def _select_distinct(self, columns, **where):
+        statement = self._prepare('_select_distinct', (columns,), where)
+        return self._run_prepared(statement)
 
-        if key:
-            order_by = 'ORDER BY {0}'.format(', '.join(key_columns))
+    def _select_aggregate(self, sqlfunc, columns, **where):
+        statement = self._prepare('_select_aggregate', (sqlfunc, columns), where)
+        return self._run_prepared(statement)
+
+    def _select_aggregates(self, functions, columns, **where):
+        statement = self._prepare('_select_aggregates', (functions, columns), where)
+        return self._run_prepared(statement)
+
+    def _select_sample(self, sample, columns, **where):
+        statement = self._prepare('_select_sample', (sample, columns), where)
+        return self._run_prepared(statement)
+
+    def _select_limit(self, n, columns, **where):
+        statement = self._prepare('_select_limit', (n, columns), where)
+        return self._run_prepared(statement)
+
+    def _prepare(self, method, args, where):
+        """Build the SQL for a call to a select *method* ('_select',
+        '_select_distinct', '_select_aggregate', '_select_aggregates',
+        '_select_sample', or '_select_limit') with the given *args*
+        and *where* conditions. Returns a _select_statement
+        that can be run with _run_prepared().
+
+        Statements do not include the table name so they can be
+        reused by any Selector with the same fieldnames.
+        """
+        if method == '_select_aggregate':
+            sqlfunc, columns = args
+            sqlfunc = sqlfunc.upper()
+        elif method == '_select_aggregates':
+            functions, columns = args
+            sqlfunc = tuple(x.upper() for x in functions)
         else:
-            order_by = None
-        cursor = self._execute_query(select_clause, order_by, **where)
-        return self._format_results(columns, cursor)
+            sqlfunc, columns = None, args[-1]
+        sample = args[0] if method == '_select_sample' else None
 
-    def _select_distinct(self, columns, **where):
         key, value = _parse_columns(columns)
         key_columns, value_columns = self._parse_key_value(key, value)
+        distinct = isinstance(value, collections.Set)
+
+        if sqlfunc:
+            if distinct:
+                func = lambda col: 'DISTINCT {0}'.format(col)
+                value_columns = tuple(func(col) for col in value_columns)
+            sqlfuncs = sqlfunc if isinstance(sqlfunc, tuple) else (sqlfunc,)
+            value_columns = tuple('{0}({1})'.format(func, x)
+                                  for func in sqlfuncs for x in value_columns)
+            select_clause = ', '.join(key_columns + value_columns)
+        else:
+            select_clause = ', '.join(key_columns + value_columns)
+            if distinct or method == '_select_distinct':
+                select_clause = 'DISTINCT ' + select_clause
 
-        all_columns = ', '.join(key_columns + value_columns)
-        select_clause = 'DISTINCT {0}'.format(all_columns)
         if key:
-            order_by = 'ORDER BY {0}'.format(', '.join(key_columns))
+            keyword = 'GROUP BY' if sqlfunc else 'ORDER BY'
+            trailing_clause = '{0} {1}'.format(keyword, ', '.join(key_columns))
         else:
-            order_by = None
-        cursor = self._execute_query(select_clause, order_by, **where)
-        return self._format_results(columns, cursor)
+            trailing_clause = None
 
-    def _select_aggregate(self, sqlfunc, columns, **where):
-        key, value = _parse_columns(columns)
-        key_columns, value_columns = self._parse_key_value(key, value)
+        if method == '_select_limit':
+            limit_clause = 'LIMIT {0:d}'.format(args[0])
+            if trailing_clause:
+                limit_clause = '{0} {1}'.format(trailing_clause, limit_clause)
+            trailing_clause = limit_clause
+
+        return _select_statement(
+            columns=columns,
+            key=key,
+            key_columns=key_columns,
+            sqlfunc=sqlfunc,
+            distinct=distinct,
+            select_clause=select_clause,
+            trailing_clause=trailing_clause,
+            where=where,
+            where_sql=self._build_where_clause(where),
+            sample=sample,
+        )
 
-        if isinstance(value, collections.Set):
-            func = lambda col: 'DISTINCT {0}'.format(col)
-            value_columns = tuple(func(col) for col in value_columns)
+    def _run_prepared(self, statement):
+        """Execute a _select_statement (see _prepare()) and return
+        its formatted results.
+        """
+        columns, key, key_columns, sqlfunc, distinct, select_clause, \
+            trailing_clause, where, where_sql, sample = statement
+
+        if sample is not None:
+            with self._advise_index(key, where):
+                return self._run_sample(statement)  # <- EXIT!
+
+        with self._advise_index(key, where):
+            if self._groups_partitioned(key):
+                cursor = self._merge_partitions(
+                    select_clause, trailing_clause, key_columns, where, where_sql)
+            elif (sqlfunc and self._partitions
+                    and sqlfunc in _combine_functions and not distinct):
+                cursor = self._combine_partitions(
+                    sqlfunc, select_clause, trailing_clause, key_columns,
+                    where, where_sql)
+            else:
+                cursor = self._execute_query(
+                    select_clause, trailing_clause, _where_sql=where_sql, **where)
 
-        sqlfunc = sqlfunc.upper()
-        value_columns = tuple('{0}({1})'.format(sqlfunc, x) for x in value_columns)
-        select_clause = ', '.join(key_columns + value_columns)
-        if key:
-            group_by = 'GROUP BY {0}'.format(', '.join(key_columns))
-        else:
-            group_by = None
-        cursor = self._execute_query(select_clause, group_by, **where)
-        results =  self._format_results(columns, cursor)
+        if isinstance(sqlfunc, tuple):
+            return self._format_aggregates(columns, sqlfunc, cursor)  # <- EXIT!
+
+        results = self._format_results(columns, cursor)
+
+        if not sqlfunc:
+            return results  # <- EXIT!
 
         if isinstance(columns, collections.Mapping):
             results = DictItems((k, next(v)) for k, v in results)
             return Result(results, evaluation_type=dict)
         return next(results)
 
+    def _get_rowid_alias(self):
+        """Return a name that refers to the rowid of the Selector's
+        table (or None if the table is partitioned--views have no
+        rowids--or if every alias is also the name of a column).
+        """
+        if self._partitions:
+            return None
+        fieldnames = set(x.lower() for x in self.fieldnames)
+        for alias in ('rowid', '_rowid_', 'oid'):
+            if alias not in fieldnames:
+                return alias
+        return None
+
+    def _run_sample(self, statement):
+        """Execute a _select_sample statement (an ungrouped selection)
+        and return a Result of the sampled values.
+
+        Rows are sampled in blocks of consecutive rowids that are
+        chosen with a random generator seeded from the statement's
+        seed. Only the chosen blocks are read (using the table's rowid
+        b-tree) instead of sorting every row with "ORDER BY RANDOM()".
+        When *n* is given, about twice as many rows as needed are read
+        and then reduced to *n* with reservoir sampling--if the blocks
+        hold fewer than *n* matching rows, all matching rows are
+        sampled instead.
+        """
+        n, fraction, seed = statement.sample
+        rng = random.Random(seed)
+        select_clause = statement.select_clause
+        where = statement.where
+        where_clause, params = statement.where_sql
+
+        rowid = self._get_rowid_alias()
+        if rowid is not None:
+            cursor = self._connection.cursor()
+            cursor.execute('SELECT MIN({0}), MAX({0}) FROM {1}'.format(rowid, self._table))
+            first, last = cursor.fetchone()
+            span = (last - first + 1) if first is not None else 0
+            if n is not None:
+                target = min(1.0, 2.0 * n / span) if span else 1.0
+            else:
+                target = fraction
+
+            if target < 1.0:
+                blocks = _rowid_blocks_clause(rowid, first, span, target, rng)
+                if where_clause:
+                    blocks = '({0}) AND ({1})'.format(where_clause, blocks)
+                cursor = self._execute_query(
+                    select_clause, _where_sql=(blocks, params), **where)
+                rows = cursor.fetchall()
+                if n is None:
+                    return self._format_results(statement.columns, rows)  # <- EXIT!
+                if len(rows) >= n:
+                    rows = _sample_values(n, None, rng, rows)
+                    return self._format_results(statement.columns, rows)  # <- EXIT!
+
+        rows = self._execute_query(
+            select_clause, _where_sql=statement.where_sql, **where)
+        rows = _sample_values(n, fraction, rng, rows)
+        return self._format_results(statement.columns, rows)
+
+    _aggregate_functions = ('sum', 'count', 'avg', 'min', 'max')
+
+    def aggregate(self, measures, **where):
+        """Calculate several aggregate values with a single query
+        and return a dictionary of results (one for each measure).
+
+        The *measures* maps column names to aggregate function names
+        ('sum', 'count', 'avg', 'min', or 'max'), or to a list of
+        names. Results are keyed by (column, function) tuples::
+
+            select = datatest.Selector('example.csv')
+            results = select.aggregate({'amount': 'sum', 'qty': ['count', 'max']})
+            total = results[('amount', 'sum')]
+
+        To group results, wrap *measures* in a dictionary whose key
+        gives the grouping column (or a tuple of columns). Each
+        grouped measure is a :class:`Result` that evaluates to a
+        dictionary::
+
+            results = select.aggregate({'region': {'amount': 'sum', 'qty': 'count'}})
+            results[('amount', 'sum')].fetch()  # <- {'east': 235, 'west': 117}
+
+        These are the same values that would be returned by separate
+        queries (like ``select({'region': 'amount'}).sum()``) but
+        the table is only scanned once.
+        """
+        key = None
+        if len(measures) == 1:
+            only_key, only_value = tuple(measures.items())[0]
+            if isinstance(only_value, collections.Mapping):
+                key, measures = only_key, only_value
+
+        measure_list = []
+        for column, functions in sorted(measures.items()):
+            if isinstance(functions, str):
+                functions = [functions]
+            for function in functions:
+                if function not in self._aggregate_functions:
+                    msg = 'unsupported aggregate function {0!r}, expected one of: {1}'
+                    expected = ', '.join(repr(x) for x in self._aggregate_functions)
+                    raise ValueError(msg.format(function, expected))
+                measure_list.append((column, function))
+
+        if key is None:
+            key_fields = ()
+        elif isinstance(key, str):
+            key_fields = (key,)
+        else:
+            key_fields = tuple(key)
+        value_fields = tuple(column for column, _ in measure_list)
+        self._assert_fields_exist(key_fields + value_fields)
+
+        key_columns = tuple(self._escape_field_name(x) for x in key_fields)
+        value_columns = tuple(
+            '{0}({1})'.format(function.upper(), self._escape_field_name(column))
+            for column, function in measure_list
+        )
+        select_clause = ', '.join(key_columns + value_columns)
+        if key_columns:
+            group_by = 'GROUP BY {0}'.format(', '.join(key_columns))
+        else:
+            group_by = None
+        with self._advise_index(key, where):
+            cursor = self._execute_query(select_clause, group_by, **where)
+        rows = cursor.fetchall()
+
+        if key is None:
+            row = rows[0]
+            return dict((measure, row[i]) for i, measure in enumerate(measure_list))
+
+        key_type = type(key)
+        slice_index = len(key_fields)
+        if issubclass(key_type, str):
+            keyfunc = lambda row: row[0]
+        elif issubclass(key_type, tuple) and hasattr(key_type, '_fields'):
+            keyfunc = lambda row: key_type(*row[:slice_index])  # If namedtuple.
+        else:
+            keyfunc = lambda row: key_type(row[:slice_index])
+        keys = [keyfunc(row) for row in rows]
+
+        results = {}
+        for index, measure in enumerate(measure_list, start=slice_index):
+            items = DictItems([(k, row[index]) for k, row in zip(keys, rows)])
+            results[measure] = Result(items, evaluation_type=dict)
+        return results
+
     def create_index(self, *columns):
         """Create an index for specified columns---can speed up
         testing in many cases.
@@ -1327,24 +3996,110 @@ class Selector(object):
                   a test suite's over-all performance.  Creating
                   several indexes before testing even begins could
                   lead to longer run times so use indexes with care.
+                  To create indexes only for the columns that are
+                  used most often, see :meth:`enable_auto_index`.
+
+        Indexes can not be created on tables that were attached with
+        :meth:`attach` (their database files are opened read-only).
+        Records loaded from a *cache_dir* entry are copied out of the
+        entry before the first index is created (so the entry itself
+        is never changed).
         """
         self._assert_fields_exist(columns)
-
-        # Build index name.
-        whitelist = lambda col: ''.join(x for x in col if x.isalnum())
-        idx_name = '_'.join(whitelist(col) for col in columns)
-        idx_name = 'idx_{0}_{1}'.format(self._table, idx_name)
+        if self._cached_entry:
+            self._copy_attached()
+        elif self._read_only:
+            raise RuntimeError(
+                'cannot create indexes on an attached read-only table')
 
         # Build column names.
+        whitelist = lambda col: ''.join(x for x in col if x.isalnum())
+        idx_suffix = '_'.join(whitelist(col) for col in columns)
         columns = tuple(self._escape_field_name(x) for x in columns)
 
-        # Prepare statement.
-        statement = 'CREATE INDEX IF NOT EXISTS {0} ON {1} ({2})'
-        statement = statement.format(idx_name, self._table, ', '.join(columns))
+        # Partitioned Selectors get an index for each partition.
+        with self._pool.writer() as connection:
+            for qualified_name in (self._partitions or [self._table]):
+                # Build index name.
+                schema, table = split_table_name(qualified_name)
+                idx_name = 'idx_{0}_{1}'.format(table, idx_suffix)
+                if schema:
+                    idx_name = '{0}.{1}'.format(schema, idx_name)
+
+                # Prepare statement and create index.
+                statement = 'CREATE INDEX IF NOT EXISTS {0} ON {1} ({2})'
+                statement = statement.format(idx_name, table, ', '.join(columns))
+                connection.execute(statement)
+
+    def _copy_attached(self):
+        """Copy the records of the Selector's attached table into a
+        new table (and detach its database) so they can be changed.
+        """
+        with self._pool.writer() as connection:
+            cursor = connection.cursor()
+            schema, _ = split_table_name(self._table)
+            table = new_table_name(cursor)
+            with savepoint(cursor):
+                copy_table(cursor, self._table, table, temporary=False)
+            self._pool.detach(schema)
+            self._table = table
+            self._read_only = False
+            self._cached_entry = False
+            self._reset_caches()
+        self._update_budget()
 
-        # Create index.
-        cursor = self._connection.cursor()
-        cursor.execute(statement)
+    def enable_auto_index(self, hits=10, seconds=None):
+        """Automatically create indexes for the columns that are
+        used most often to filter, group, or sort results.
+
+        Each query records its combination of where-clause columns
+        and GROUP BY or ORDER BY columns. Once a combination has been
+        used *hits* times or its queries have taken *seconds* in
+        total, an index is created for it::
+
+            select = datatest.Selector('example.csv')
+            select.enable_auto_index(hits=5)
+
+        Setting both thresholds to None disables automatic indexing.
+        Indexes created so far are listed in :attr:`auto_indexes`.
+        Indexes are not created automatically for attached tables
+        (including *cache_dir* entries that are queried in place).
+        """
+        if hits is None and seconds is None:
+            self._index_advisor = None
+        else:
+            self._index_advisor = IndexAdvisor(hits=hits, seconds=seconds)
+
+    def enable_result_cache(self, maxsize=128):
+        """Cache the results of repeated queries. Up to *maxsize*
+        results are kept (least recently used results are discarded
+        first) and the cache is cleared whenever data is loaded::
+
+            select = datatest.Selector('example.csv')
+            select.enable_result_cache()
+
+            select({'A': 'C'}).sum().fetch()  # <- Runs query.
+            select({'A': 'C'}).sum().fetch()  # <- Uses cached result.
+
+        Only queries with no query steps or with aggregate and
+        distinct steps (sum, count, avg, min, max, and distinct)
+        are cached. Queries that use functions (in *where* clauses
+        or query steps like map and filter) are always executed.
+        Setting *maxsize* to None or 0 disables the cache.
+        """
+        if maxsize:
+            self._result_cache = LRUCache(maxsize)
+        else:
+            self._result_cache = None
+
+    @property
+    def auto_indexes(self):
+        """A list of column-name tuples for the indexes that were
+        created automatically (see :meth:`enable_auto_index`).
+        """
+        if not self._index_advisor:
+            return []
+        return list(self._index_advisor.created)
 
 
 # Prepare error message for old or non-standard builds of Python
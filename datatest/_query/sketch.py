@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""Mergeable sketches for approximate aggregates of large data sets."""
+from __future__ import absolute_import
+import math
+import random
+
+
+_MASK64 = (1 << 64) - 1
+
+
+def _hash64(value):
+    """Return a well-mixed 64-bit hash of *value*. Values that are
+    equal (e.g., 1 and 1.0) have the same hash, just like members
+    of a set.
+    """
+    x = hash(value) & _MASK64
+    x = ((x ^ (x >> 30)) * 0xbf58476d1ce4e5b9) & _MASK64  # SplitMix64
+    x = ((x ^ (x >> 27)) * 0x94d049bb133111eb) & _MASK64  # finalizer.
+    return x ^ (x >> 31)
+
+
+class HyperLogLog(object):
+    """A HyperLogLog sketch that estimates the number of distinct
+    values it has seen using 2 ** *precision* registers (one byte
+    each)::
+
+        sketch = HyperLogLog(precision=14)
+        sketch.update(values)
+        estimate = sketch.estimate()
+
+    The relative standard error of the estimate is given by the
+    :attr:`error` property (about 0.8% for a *precision* of 14).
+    Sketches with the same precision can be merged. Since values
+    are hashed with the built-in hash() function, sketches should
+    only be merged with sketches from the same process.
+    """
+    def __init__(self, precision=14):
+        if not 4 <= precision <= 16:
+            raise ValueError('precision must be from 4 to 16, got {0!r}'.format(precision))
+        self.precision = precision
+        self._registers = bytearray(1 << precision)
+
+    @property
+    def error(self):
+        """The relative standard error of estimates."""
+        return 1.04 / math.sqrt(len(self._registers))
+
+    def add(self, value):
+        """Add a hashable *value* to the sketch."""
+        x = _hash64(value)
+        remaining_bits = 64 - self.precision
+        index = x >> remaining_bits
+        rank = remaining_bits - (x & ((1 << remaining_bits) - 1)).bit_length() + 1
+        if rank > self._registers[index]:
+            self._registers[index] = rank
+
+    def update(self, iterable):
+        """Add all of the values from *iterable* to the sketch."""
+        for value in iterable:
+            self.add(value)
+
+    def merge(self, other):
+        """Merge the *other* sketch into this one (afterwards, this
+        sketch estimates the distinct values seen by either sketch).
+        """
+        if other.precision != self.precision:
+            raise ValueError('cannot merge sketches with different precisions')
+        registers = self._registers
+        for index, rank in enumerate(other._registers):
+            if rank > registers[index]:
+                registers[index] = rank
+
+    def estimate(self):
+        """Return the estimated number of distinct values."""
+        m = len(self._registers)
+        if m >= 128:
+            alpha = 0.7213 / (1 + 1.079 / m)
+        else:
+            alpha = {16: 0.673, 32: 0.697, 64: 0.709}[m]
+
+        estimate = alpha * m * m / sum(2.0 ** -rank for rank in self._registers)
+        zeros = self._registers.count(b'\x00')
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(float(m) / zeros)  # <- Small range correction.
+        return int(round(estimate))
+
+
+class QuantileSketch(object):
+    """A KLL sketch that estimates quantiles of the values it has
+    seen while keeping about 3 * *k* of them::
+
+        sketch = QuantileSketch(k=200)
+        sketch.update(values)
+        median = sketch.quantile(0.5)
+
+    Values are ordered by *key* (like the built-in sorted()). The
+    returned value's rank is within :attr:`rank_error` (as a fraction
+    of all values) of the requested quantile with about 99% confidence
+    (about 1.3% for a *k* of 200). Sketches with the same *k* can be
+    merged.
+
+    Compactions randomly keep the odd or even values of a level. The
+    random generator is seeded with *seed* so that results can be
+    reproduced.
+    """
+    def __init__(self, k=200, key=None, seed=0):
+        if k < 8:
+            raise ValueError('k must be 8 or greater, got {0!r}'.format(k))
+        self.k = k
+        self.key = key
+        self.count = 0
+        self._levels = [[]]  # <- Values in level h have a weight of 2 ** h.
+        self._size = 0       # <- Number of values in all levels.
+        self._max_size = self._capacity(0)
+        self._random = random.Random(seed)
+
+    @property
+    def rank_error(self):
+        """The normalized rank error of quantile estimates."""
+        return 2.296 / self.k ** 0.9723
+
+    def _capacity(self, level):
+        depth = len(self._levels) - level - 1
+        return int(math.ceil(self.k * (2.0 / 3.0) ** depth)) + 1
+
+    def _add_level(self):
+        self._levels.append([])
+        self._max_size = sum(self._capacity(x) for x in range(len(self._levels)))
+
+    def _compress(self):
+        """Compact full levels until the sketch is within its size."""
+        while self._size >= self._max_size:
+            for level, values in enumerate(self._levels):
+                if len(values) >= self._capacity(level):
+                    if level + 1 == len(self._levels):
+                        self._add_level()
+                    values.sort(key=self.key)
+                    leftover = [values.pop()] if len(values) % 2 else []
+                    promoted = values[self._random.randint(0, 1)::2]
+                    self._levels[level + 1].extend(promoted)
+                    self._levels[level] = leftover
+                    self._size -= len(values) - len(promoted)
+                    break
+
+    def add(self, value):
+        """Add *value* to the sketch."""
+        self._levels[0].append(value)
+        self.count += 1
+        self._size += 1
+        if self._size >= self._max_size:
+            self._compress()
+
+    def update(self, iterable):
+        """Add all of the values from *iterable* to the sketch."""
+        for value in iterable:
+            self.add(value)
+
+    def merge(self, other):
+        """Merge the *other* sketch into this one (afterwards, this
+        sketch estimates quantiles of the values seen by either sketch).
+        """
+        if other.k != self.k:
+            raise ValueError('cannot merge sketches with different k values')
+        while len(self._levels) < len(other._levels):
+            self._add_level()
+        for level, values in enumerate(other._levels):
+            self._levels[level].extend(values)
+        self.count += other.count
+        self._size += other._size
+        self._compress()
+
+    def quantile(self, q):
+        """Return the estimated value at quantile *q* (from 0.0 to
+        1.0) or None if the sketch is empty.
+        """
+        if not 0.0 <= q <= 1.0:
+            raise ValueError('q must be from 0.0 to 1.0, got {0!r}'.format(q))
+
+        weighted = []
+        for level, values in enumerate(self._levels):
+            weighted.extend((value, 1 << level) for value in values)
+        if not weighted:
+            return None
+
+        key = self.key
+        weighted.sort(key=(lambda x: key(x[0])) if key else (lambda x: x[0]))
+        target = q * self.count
+        cumulative = 0
+        for value, weight in weighted:
+            cumulative += weight
+            if cumulative >= target:
+                return value
+        return weighted[-1][0]
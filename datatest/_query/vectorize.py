@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""Vectorized execution of query steps using the optional, third-party
+library NumPy. When NumPy is not installed, every call raises
+CannotVectorize so callers fall back to executing steps in Python.
+"""
+from __future__ import absolute_import
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class CannotVectorize(Exception):
+    """Raised when values or steps can not be handled with NumPy
+    (the caller should execute them in Python instead).
+    """
+    pass
+
+
+AGGREGATES = frozenset(['sum', 'count', 'avg', 'min', 'max'])
+
+
+def is_ufunc(function):
+    """Return True if *function* is a NumPy ufunc that takes one
+    argument and returns one value.
+    """
+    return (numpy is not None
+            and isinstance(function, numpy.ufunc)
+            and function.nin == 1
+            and function.nout == 1)
+
+
+def _as_array(values):
+    """Return a list of *values* as a one-dimensional array of
+    booleans, integers, or floats. Raises CannotVectorize for any
+    other values (strings, None, large integers, tuples, etc.).
+    """
+    if numpy is None:
+        raise CannotVectorize('NumPy not installed')
+
+    try:
+        array = numpy.array(values)
+    except (TypeError, ValueError):  # <- Ragged sequences, etc.
+        raise CannotVectorize('values not supported')
+
+    if array.ndim != 1 or array.dtype.kind not in 'biuf':
+        raise CannotVectorize('values not supported')
+    return array
+
+
+def _has_nan(array):
+    return array.dtype.kind == 'f' and bool(numpy.isnan(array).any())
+
+
+def _call_ufunc(function, array):
+    try:
+        return function(array)
+    except (TypeError, ValueError):  # <- Unsupported input types, etc.
+        raise CannotVectorize('{0!r} not supported'.format(function))
+
+
+def execute(steps, values):
+    """Execute *steps* on a list of *values* and return the result
+    (a single value if the last step is an aggregate, else a list).
+
+    Each step is a (name, function) tuple where name is 'map' or
+    'filter' (with a one-argument ufunc) or one of the aggregates
+    'sum', 'count', 'avg', 'min', or 'max' (with no function). An
+    aggregate can only be the last step.
+
+    Results match the Python implementations of these steps: sums
+    and averages are floats added in order, min and max return the
+    original value, and None is returned for empty input.
+    """
+    array = _as_array(values)
+    index = numpy.arange(len(array))  # Positions of original values
+    original = True                   # (until a map step changes them).
+
+    for name, function in steps:
+        if name == 'map':
+            array = _call_ufunc(function, array)
+            if array.dtype.kind not in 'biuf':
+                raise CannotVectorize('map result not supported')
+            original = False
+        elif name == 'filter':
+            mask = _call_ufunc(function, array).astype(bool)
+            array = array[mask]
+            index = index[mask]
+        elif name == 'count':
+            return len(array)  # <- EXIT!
+        elif not len(array):
+            return None  # <- EXIT! (Aggregates of no values are None.)
+        elif name in ('sum', 'avg'):
+            total = float(numpy.cumsum(array, dtype=float)[-1])
+            if name == 'sum':
+                return total  # <- EXIT!
+            return total / len(array)  # <- EXIT!
+        elif name in ('min', 'max'):
+            if _has_nan(array):
+                raise CannotVectorize('NaN values are not ordered')
+            position = int(array.argmin() if name == 'min' else array.argmax())
+            if original:
+                return values[int(index[position])]  # <- EXIT!
+            return array[position].item()  # <- EXIT!
+        else:
+            raise CannotVectorize('unknown step {0!r}'.format(name))
+
+    if original:
+        if len(index) == len(values):
+            return list(values)  # <- EXIT!
+        return [values[i] for i in index.tolist()]  # <- EXIT!
+    return array.tolist()
@@ -12,6 +12,7 @@ from ._compatibility.decimal import Decimal
 from ._compatibility.itertools import chain
 from ._compatibility.itertools import filterfalse
 from ._compatibility.itertools import islice
+from ._compatibility.weakref import WeakKeyDictionary
 
 
 try:
@@ -180,15 +181,33 @@ if _version_info[:2] == (3, 4):  # For version 3.4 only!
         return lengths
 
 
+_multiple_params_cache = WeakKeyDictionary()
+
+
 def _expects_multiple_params(func):
     """Returns True if *func* accepts multiple positional arguments and
     returns False if it accepts one or zero arguments.
 
     Returns None if the number of arguments cannot be determined--this
     is usually the case for built-in functions and types.
+
+    Results are cached for each function (as long as the function
+    can be weakly referenced).
     """
+    try:
+        return _multiple_params_cache[func]
+    except (KeyError, TypeError):  # <- TypeError if not weak-referenceable.
+        pass
+
     try:
         arglen, vararglen = _get_arg_lengths(func)
     except ValueError:
-        return None
-    return (arglen > 1) or (vararglen > 0)
+        expects_multiple = None
+    else:
+        expects_multiple = (arglen > 1) or (vararglen > 0)
+
+    try:
+        _multiple_params_cache[func] = expects_multiple
+    except TypeError:
+        pass
+    return expects_multiple
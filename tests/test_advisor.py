@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from . import _unittest as unittest
+
+from datatest._query.advisor import IndexAdvisor
+from datatest._query.query import Selector
+
+
+class TestIndexAdvisor(unittest.TestCase):
+    def test_get_columns(self):
+        columns = IndexAdvisor.get_columns(['C', 'A'], ('B', 'A'))
+        self.assertEqual(columns, ('A', 'C', 'B'))
+
+    def test_hits(self):
+        advisor = IndexAdvisor(hits=3)
+        self.assertFalse(advisor.record(('A',)))
+        self.assertFalse(advisor.record(('A',)))
+        self.assertFalse(advisor.record(('B',)), msg='other columns counted separately')
+        self.assertTrue(advisor.record(('A',)))
+        self.assertFalse(advisor.record(('A',)), msg='only advised once')
+        self.assertEqual(advisor.created, [('A',)])
+
+    def test_seconds(self):
+        advisor = IndexAdvisor(hits=None, seconds=1.0)
+        self.assertFalse(advisor.record(('A',), elapsed=0.6))
+        self.assertTrue(advisor.record(('A',), elapsed=0.6))
+
+    def test_no_columns(self):
+        advisor = IndexAdvisor(hits=1)
+        self.assertFalse(advisor.record(()))
+
+
+class TestSelectorAutoIndex(unittest.TestCase):
+    def setUp(self):
+        data = [['A', 'B', 'C'], ['x', 'foo', 1], ['y', 'bar', 2], ['x', 'bar', 3]]
+        self.select = Selector(data)
+
+    def get_indexes(self):
+        cursor = self.select._connection.cursor()
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type='index' AND tbl_name=?",
+            (self.select._table,),
+        )
+        return [row[0] for row in cursor]
+
+    def test_disabled_by_default(self):
+        for _ in range(20):
+            self.select({'A': 'C'}).sum().fetch()
+        self.assertEqual(self.select.auto_indexes, [])
+        self.assertEqual(self.get_indexes(), [])
+
+    def test_grouped_queries(self):
+        self.select.enable_auto_index(hits=2)
+
+        expected = {'x': 4, 'y': 2}
+        self.assertEqual(self.select({'A': 'C'}).sum().fetch(), expected)
+        self.assertEqual(self.select.auto_indexes, [])
+
+        self.assertEqual(self.select({'A': 'C'}).sum().fetch(), expected)
+        self.assertEqual(self.select.auto_indexes, [('A',)])
+        self.assertEqual(len(self.get_indexes()), 1)
+
+        self.assertEqual(self.select({'A': 'C'}).sum().fetch(), expected)
+        self.assertEqual(len(self.get_indexes()), 1)
+
+    def test_where_and_order_columns(self):
+        self.select.enable_auto_index(hits=1)
+        self.select({'A': 'C'}, B='bar').fetch()
+        self.assertEqual(self.select.auto_indexes, [('B', 'A')])
+
+    def test_function_predicates_ignored(self):
+        self.select.enable_auto_index(hits=1)
+        self.select('C', B=lambda x: x == 'bar').fetch()
+        self.assertEqual(self.select.auto_indexes, [])
+
+    def test_disable(self):
+        self.select.enable_auto_index(hits=None, seconds=None)
+        self.select({'A': 'C'}).fetch()
+        self.assertEqual(self.select.auto_indexes, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
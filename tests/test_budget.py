@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from . import _unittest as unittest
+
+from datatest._query.budget import MemoryBudget
+
+
+class TestMemoryBudget(unittest.TestCase):
+    def test_within_budget(self):
+        budget = MemoryBudget(max_bytes=100)
+        budget.set_size('a', 60)
+        budget.set_size('b', 40)
+        self.assertEqual(budget.total, 100)
+        self.assertEqual(budget.get_evictions(), [])
+
+    def test_least_recently_used(self):
+        budget = MemoryBudget(max_bytes=100)
+        budget.set_size('a', 40)
+        budget.set_size('b', 40)
+        budget.set_size('c', 40)
+        budget.touch('a')  # <- Makes 'a' most recently used.
+
+        self.assertEqual(budget.get_evictions(), ['b'])
+        self.assertEqual(len(budget), 2, msg='evicted keys are not tracked')
+
+    def test_keep(self):
+        budget = MemoryBudget(max_bytes=100)
+        budget.set_size('a', 150)
+        budget.set_size('b', 10)
+        self.assertEqual(budget.get_evictions(keep='a'), ['b'])
+        self.assertEqual(budget.get_evictions(keep='a'), [])
+
+    def test_discard(self):
+        budget = MemoryBudget(max_bytes=100)
+        budget.set_size('a', 150)
+        budget.discard('a')
+        budget.touch('a')  # <- Untracked keys are ignored.
+        self.assertEqual(budget.get_evictions(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from . import _unittest as unittest
+
+import datatest._load.cache as cache
+from datatest._load.cache import (
+    is_cacheable,
+    get_fingerprint,
+    get_cache_file,
+    load_cache_file,
+    evict,
+    CACHE_TABLE,
+)
+from datatest._load.temptable import load_data
+from datatest._query.query import Selector
+
+
+class CacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.temp_dir, 'cache')
+
+        self.csv_path = os.path.join(self.temp_dir, 'data.csv')
+        with open(self.csv_path, 'w') as fh:
+            fh.write('A,B\nx,1\ny,2\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def cache_entries(self):  # <- Helper function.
+        if not os.path.isdir(self.cache_dir):
+            return []
+        return sorted(os.listdir(self.cache_dir))
+
+
+class TestFingerprint(CacheTestCase):
+    def test_is_cacheable(self):
+        self.assertTrue(is_cacheable(self.csv_path))
+        self.assertFalse(is_cacheable(self.temp_dir), msg='directory')
+        self.assertFalse(is_cacheable('missing.csv'), msg='missing file')
+        self.assertFalse(is_cacheable([['A', 'B'], ['x', 1]]))
+
+    def test_same_file(self):
+        fingerprint1 = get_fingerprint(self.csv_path)
+        fingerprint2 = get_fingerprint(self.csv_path)
+        self.assertEqual(fingerprint1, fingerprint2)
+
+    def test_changed_contents(self):
+        fingerprint1 = get_fingerprint(self.csv_path)
+        stat = os.stat(self.csv_path)
+        with open(self.csv_path, 'w') as fh:
+            fh.write('A,B\nx,1\ny,3\n')  # <- Same size as original.
+        os.utime(self.csv_path, (stat.st_atime, stat.st_mtime))
+
+        fingerprint2 = get_fingerprint(self.csv_path)
+        self.assertNotEqual(fingerprint1, fingerprint2)
+
+    def test_load_arguments(self):
+        fingerprint1 = get_fingerprint(self.csv_path)
+        fingerprint2 = get_fingerprint(self.csv_path, encoding='latin-1')
+        self.assertNotEqual(fingerprint1, fingerprint2)
+
+
+class TestGetCacheFile(CacheTestCase):
+    def setUp(self):
+        super(TestGetCacheFile, self).setUp()
+        self.calls = []
+
+    def loader(self, cursor, table):  # <- Helper function.
+        self.calls.append(table)
+        load_data(cursor, table, [['A', 'B'], ['x', 1], ['y', 2]],
+                  temporary=False)
+
+    def test_build_and_reuse(self):
+        cache_file = get_cache_file(self.cache_dir, self.csv_path, self.loader)
+        self.assertEqual(self.calls, [CACHE_TABLE])
+        self.assertEqual(self.cache_entries(), [os.path.basename(cache_file)])
+
+        connection = sqlite3.connect(cache_file)
+        cursor = connection.execute('SELECT * FROM ' + CACHE_TABLE)
+        self.assertEqual(cursor.fetchall(), [('x', 1), ('y', 2)])
+        connection.close()
+
+        cache_file2 = get_cache_file(self.cache_dir, self.csv_path, self.loader)
+        self.assertEqual(cache_file, cache_file2)
+        self.assertEqual(self.calls, [CACHE_TABLE], msg='loader not called again')
+
+    def test_failed_load(self):
+        def bad_loader(cursor, table):
+            raise ValueError()
+
+        with self.assertRaises(ValueError):
+            get_cache_file(self.cache_dir, self.csv_path, bad_loader)
+        self.assertEqual(self.cache_entries(), [], msg='no partial entries')
+
+    def test_load_cache_file(self):
+        cache_file = get_cache_file(self.cache_dir, self.csv_path, self.loader)
+
+        connection = sqlite3.connect(':memory:')
+        connection.isolation_level = None
+        cursor = connection.cursor()
+        load_data(cursor, 'tbl0', [['A', 'C'], ['z', 3]])
+        load_cache_file(cursor, 'tbl0', cache_file)
+
+        cursor.execute('SELECT A, B, C FROM tbl0')
+        expected = [('z', '', 3), ('x', 1, ''), ('y', 2, '')]
+        self.assertEqual(cursor.fetchall(), expected)
+
+
+class TestEvict(CacheTestCase):
+    def make_entry(self, name, size, age):  # <- Helper function.
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        path = os.path.join(self.cache_dir, name + cache.CACHE_SUFFIX)
+        with open(path, 'wb') as fh:
+            fh.write(b'x' * size)
+        last_used = time.time() - age
+        os.utime(path, (last_used, last_used))
+
+    def test_no_limits(self):
+        self.make_entry('a', size=10, age=1000)
+        evict(self.cache_dir)
+        self.assertEqual(len(self.cache_entries()), 1)
+
+    def test_max_age(self):
+        self.make_entry('a', size=10, age=1000)
+        self.make_entry('b', size=10, age=10)
+        evict(self.cache_dir, max_age=100)
+        self.assertEqual(self.cache_entries(), ['b' + cache.CACHE_SUFFIX])
+
+    def test_max_size(self):
+        self.make_entry('a', size=10, age=30)
+        self.make_entry('b', size=10, age=20)
+        self.make_entry('c', size=10, age=10)
+        evict(self.cache_dir, max_size=25)
+        expected = ['b' + cache.CACHE_SUFFIX, 'c' + cache.CACHE_SUFFIX]
+        self.assertEqual(self.cache_entries(), expected)
+
+    def test_entries_in_use(self):
+        self.make_entry('a', size=10, age=1000)
+        self.make_entry('b', size=10, age=1000)
+        self.make_entry('c', size=10, age=1000)
+        path_a = os.path.join(self.cache_dir, 'a' + cache.CACHE_SUFFIX)
+        path_b = os.path.join(self.cache_dir, 'b' + cache.CACHE_SUFFIX)
+
+        cache.hold(path_a)
+        cache.hold(path_a)
+        evict(self.cache_dir, max_age=100, keep=[path_b])
+        expected = ['a' + cache.CACHE_SUFFIX, 'b' + cache.CACHE_SUFFIX]
+        self.assertEqual(self.cache_entries(), expected)
+
+        cache.release(path_a)
+        evict(self.cache_dir, max_age=100)
+        self.assertEqual(self.cache_entries(), ['a' + cache.CACHE_SUFFIX])
+
+        cache.release(path_a)
+        evict(self.cache_dir, max_age=100)
+        self.assertEqual(self.cache_entries(), [])
+
+
+class TestSelectorCache(CacheTestCase):
+    def test_cached_selector(self):
+        select = Selector(self.csv_path, cache_dir=self.cache_dir)
+        self.assertEqual(len(self.cache_entries()), 1)
+        self.assertEqual(select.fieldnames, ['A', 'B'])
+        self.assertEqual(select({'A': 'B'}).fetch(), {'x': ['1'], 'y': ['2']})
+
+        select = Selector(self.csv_path, cache_dir=self.cache_dir)  # <- From cache.
+        self.assertEqual(len(self.cache_entries()), 1)
+        self.assertEqual(select('B').sum().fetch(), 3)
+
+        select.create_index('A')
+        self.assertEqual(select('B', A='y').fetch(), ['2'])
+
+    def test_cache_entry_not_changed(self):
+        select = Selector(self.csv_path, cache_dir=self.cache_dir)
+        cache_file = os.path.join(self.cache_dir, self.cache_entries()[0])
+
+        select.enable_auto_index(hits=1)
+        select('B', A='y').fetch()
+        select.create_index('A')  # <- Copies records out of the entry.
+        self.assertEqual(select('B', A='y').fetch(), ['2'])
+
+        connection = sqlite3.connect(cache_file)
+        cursor = connection.execute(
+            "SELECT name FROM sqlite_master WHERE type='index'")
+        self.assertEqual(cursor.fetchall(), [], msg='no indexes in entry')
+        connection.close()
+
+    def test_many_cached_selectors(self):
+        """When no more databases can be attached, cache entries
+        should be copied instead.
+        """
+        selectors = []
+        for _ in range(Selector()._pool.max_attached + 2):
+            selectors.append(Selector(self.csv_path, cache_dir=self.cache_dir))
+        self.addCleanup(lambda: [x.close() for x in selectors])
+
+        for select in selectors:
+            self.assertEqual(select('A').fetch(), ['x', 'y'])
+        self.assertFalse(selectors[-1]._read_only, msg='copied, not attached')
+
+    def test_load_more_data(self):
+        select = Selector(self.csv_path, cache_dir=self.cache_dir)
+        select.load_data([['A', 'C'], ['z', 'foo']])
+        self.assertEqual(select.fieldnames, ['A', 'B', 'C'])
+        self.assertEqual(select('A').fetch(), ['x', 'y', 'z'])
+
+    def test_multiple_sources(self):
+        other_path = os.path.join(self.temp_dir, 'other.csv')
+        with open(other_path, 'w') as fh:
+            fh.write('A,B\nw,0\n')
+
+        select = Selector()
+        select.load_data([other_path, self.csv_path], cache_dir=self.cache_dir)
+        self.assertEqual(len(self.cache_entries()), 2)
+        self.assertEqual(select('A').fetch(), ['w', 'x', 'y'])
+
+    def test_cache_limits(self):
+        other_path = os.path.join(self.temp_dir, 'other.csv')
+        with open(other_path, 'w') as fh:
+            fh.write('A,B\nw,0\n')
+
+        select = Selector(self.csv_path, cache_dir=self.cache_dir)  # <- Attached.
+        attached_entry = self.cache_entries()[0]
+
+        # Adding an entry with a limit of 1 byte does not remove
+        # the entry that is attached to the first Selector.
+        other = Selector(other_path, cache_dir=self.cache_dir, cache_max_size=1)
+        self.assertEqual(len(self.cache_entries()), 2)
+        self.assertEqual(select('A').fetch(), ['x', 'y'])
+
+        # Once it's no longer attached, the entry can be removed.
+        select.close()
+        other.close()
+        with open(other_path, 'a') as fh:
+            fh.write('v,5\n')  # <- Changed file needs a new entry.
+        Selector(other_path, cache_dir=self.cache_dir, cache_max_age=0)
+        self.assertNotIn(attached_entry, self.cache_entries())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+import os
+import sys
+import threading
+from . import _unittest as unittest
+
+from datatest._query.pool import ConnectionPool
+from datatest._query.query import Selector
+
+
+def run_in_thread(function):
+    """Call *function* in a new thread and return its result."""
+    results = []
+    thread = threading.Thread(target=lambda: results.append(function()))
+    thread.start()
+    thread.join()
+    return results[0]
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = ConnectionPool()
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_temporary_file(self):
+        database = self.pool.database
+        self.assertTrue(os.path.exists(database))
+
+        self.pool.close()
+        self.assertFalse(os.path.exists(database))
+
+    def test_connection_per_thread(self):
+        connection = self.pool.connection()
+        self.assertIs(self.pool.connection(), connection, msg='same thread')
+
+        other_connection = run_in_thread(self.pool.connection)
+        self.assertIsNot(other_connection, connection, msg='other thread')
+        self.assertIsNot(connection, self.pool.write_connection)
+
+    def test_writer(self):
+        with self.pool.writer() as connection:
+            self.assertIs(connection, self.pool.write_connection)
+            connection.execute('CREATE TABLE tbl0 (A, B)')
+            connection.execute("INSERT INTO tbl0 VALUES ('x', 1)")
+
+        def read_table():
+            cursor = self.pool.connection().cursor()
+            cursor.execute('SELECT * FROM tbl0')
+            return cursor.fetchall()
+
+        self.assertEqual(read_table(), [('x', 1)])
+        self.assertEqual(run_in_thread(read_table), [('x', 1)])
+
+    def test_writer_lock(self):
+        events = []
+
+        def write():
+            with self.pool.writer():
+                events.append('other thread')
+
+        with self.pool.writer():
+            thread = threading.Thread(target=write)
+            thread.start()
+            thread.join(0.1)  # <- Blocks until lock is released.
+            events.append('this thread')
+        thread.join()
+
+        self.assertEqual(events, ['this thread', 'other thread'])
+
+
+class TestStorageModes(unittest.TestCase):
+    def check_pool(self, pool):
+        with pool.writer() as connection:
+            connection.execute('CREATE TABLE tbl0 (A, B)')
+            connection.execute("INSERT INTO tbl0 VALUES ('x', 1)")
+
+        def read_table():
+            cursor = pool.connection().cursor()
+            cursor.execute('SELECT * FROM tbl0')
+            return cursor.fetchall()
+
+        self.assertEqual(read_table(), [('x', 1)])
+        self.assertEqual(run_in_thread(read_table), [('x', 1)])
+
+    def test_memory(self):
+        pool = ConnectionPool(mode='memory')
+        self.addCleanup(pool.close)
+        self.assertIs(pool.connection(), pool.write_connection)
+        self.check_pool(pool)
+
+    @unittest.skipIf(sys.version_info[:2] < (3, 4), 'requires 3.4 or newer')
+    def test_shared_memory(self):
+        pool = ConnectionPool(mode='shared-memory')
+        self.addCleanup(pool.close)
+        self.assertIsNot(pool.connection(), pool.write_connection)
+        self.check_pool(pool)
+
+    def test_mmap_size(self):
+        pool = ConnectionPool(mmap_size=1048576)
+        self.addCleanup(pool.close)
+        self.check_pool(pool)
+
+    def test_bad_mode(self):
+        with self.assertRaises(ValueError):
+            ConnectionPool(mode='bad-mode')
+
+    def test_selector_storage(self):
+        select = Selector([['A', 'B'], ['x', 1]], storage='memory')
+        select.load_data([['A', 'B'], ['y', 2]])
+        self.assertEqual(select._pool.mode, 'memory')
+        self.assertEqual(run_in_thread(lambda: select('A').fetch()), ['x', 'y'])
+
+
+class TestSelectorThreading(unittest.TestCase):
+    def test_concurrent_queries(self):
+        data = [['A', 'B']] + [['x' if i % 2 else 'y', i] for i in range(100)]
+        select = Selector(data)
+        expected = select({'A': 'B'}).sum().fetch()
+
+        results = []
+        def worker():
+            results.append(select({'A': 'B'}).sum().fetch())
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [expected] * 8)
+
+    def test_load_from_other_thread(self):
+        select = Selector([['A', 'B'], ['x', 1]])
+        run_in_thread(lambda: select.load_data([['A', 'B'], ['y', 2]]))
+        self.assertEqual(select('A').fetch(), ['x', 'y'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 from __future__ import division
+import gc
+import itertools
 import os
+import random
 import re
+import shutil
 import sqlite3
 import tempfile
 import textwrap
@@ -12,7 +16,10 @@ from . import _unittest as unittest
 from datatest._compatibility.builtins import *
 from datatest._compatibility import collections
 from datatest._utils import nonstringiter
+from datatest import allowed
+from datatest import validate
 
+from datatest._load.temptable import table_exists
 from datatest._load.working_directory import working_directory
 from datatest._query.query import (
     BaseElement,
@@ -20,6 +27,12 @@ from datatest._query.query import (
     DictItems,
     _map_data,
     _filter_data,
+    _map_group,
+    _filter_group,
+    _map_filter_data,
+    _fuse_steps,
+    _make_dataresult,
+    _get_evaluation_type,
     _reduce_data,
     _apply_data,
     _apply_to_data,  # <- TODO: Change function name.
@@ -29,14 +42,28 @@ from datatest._query.query import (
     _sqlite_min,
     _sqlite_max,
     _sqlite_distinct,
+    _sqlite_aggregate,
+    _aggregate_data,
+    _sample_values,
+    _sample_data,
+    _rowid_blocks_clause,
+    _limit_data,
     _normalize_columns,
     _parse_columns,
     RESULT_TOKEN,
+    _get_function_name,
+    _register_function,
+    CompiledQuery,
     Query,
     Result,
     Selector,
 )
 
+try:
+    FileNotFoundError
+except NameError:
+    FileNotFoundError = OSError
+
 
 class TestWorkingDirectory(unittest.TestCase):
     def setUp(self):
@@ -280,6 +307,80 @@ class TestFilterData(unittest.TestCase):
             #result.fetch()
 
 
+class TestMapFilterData(unittest.TestCase):
+    def assertSameAsSteps(self, steps, data):
+        """Check that fused *steps* give the same result as applying
+        each map or filter step in turn.
+        """
+        expected = Result(data, _get_evaluation_type(data))
+        for step_function, function in steps:
+            expected = step_function(function, expected)
+        expected = expected.fetch() if isinstance(expected, Result) else expected
+
+        group_functions = {_map_data: _map_group, _filter_data: _filter_group}
+        fused_steps = tuple((group_functions[x], y) for x, y in steps)
+        result = _map_filter_data(fused_steps, Result(data, _get_evaluation_type(data)))
+        result = result.fetch() if isinstance(result, Result) else result
+        self.assertEqual(result, expected)
+        return result
+
+    def test_list(self):
+        steps = [(_map_data, lambda x: x * 2),
+                 (_filter_data, lambda x: x > 2),
+                 (_map_data, str)]
+        result = self.assertSameAsSteps(steps, [1, 2, 3])
+        self.assertEqual(result, ['4', '6'])
+
+    def test_set(self):
+        steps = [(_filter_data, lambda x: x > 1), (_map_data, lambda x: x % 2)]
+        result = self.assertSameAsSteps(steps, set([1, 2, 3]))
+        self.assertIsInstance(result, list, msg='map() of set gives a list')
+
+        steps = [(_filter_data, lambda x: x > 1), (_filter_data, None)]
+        result = self.assertSameAsSteps(steps, set([0, 1, 2, 3]))
+        self.assertEqual(result, set([2, 3]))
+
+    def test_multiple_params(self):
+        steps = [(_map_data, lambda a, b: a + b), (_filter_data, lambda x: x > 3)]
+        result = self.assertSameAsSteps(steps, [(1, 2), (3, 4)])
+        self.assertEqual(result, [7])
+
+    def test_groups(self):
+        steps = [(_map_data, lambda x: x + 1), (_filter_data, lambda x: x % 2)]
+        result = self.assertSameAsSteps(steps, {'a': [1, 2, 3], 'b': [4, 5]})
+        self.assertEqual(result, {'a': [3], 'b': [5]})
+
+    def test_element_groups(self):
+        steps = [(_map_data, lambda x: x + 1), (_map_data, lambda x: x * 10)]
+        result = self.assertSameAsSteps(steps, {'a': 1, 'b': 2})
+        self.assertEqual(result, {'a': 20, 'b': 30})
+
+        steps = [(_map_data, lambda x: x + 1), (_filter_data, lambda x: x)]
+        with self.assertRaises(TypeError):
+            _map_filter_data(
+                [(_map_group, steps[0][1]), (_filter_group, steps[1][1])],
+                Result({'a': 1}, dict),
+            ).fetch()
+
+    def test_fuse_steps(self):
+        func1 = lambda x: x
+        func2 = lambda x: x
+        plan = (
+            (_make_dataresult, (RESULT_TOKEN,), {}),
+            (_map_data, (func1, RESULT_TOKEN), {}),
+            (_filter_data, (func2, RESULT_TOKEN), {}),
+            (_apply_to_data, (_sqlite_sum, RESULT_TOKEN), {}),
+            (_map_data, (func1, RESULT_TOKEN), {}),
+        )
+        fused = (
+            (_make_dataresult, (RESULT_TOKEN,), {}),
+            (_map_filter_data, (((_map_group, func1), (_filter_group, func2)), RESULT_TOKEN), {}),
+            (_apply_to_data, (_sqlite_sum, RESULT_TOKEN), {}),
+            (_map_data, (func1, RESULT_TOKEN), {}),  # <- Single step not fused.
+        )
+        self.assertEqual(_fuse_steps(plan), fused)
+
+
 class TestReduceData(unittest.TestCase):
     def test_list_iter(self):
         iterable = Result([1, 2, 3], list)
@@ -545,6 +646,101 @@ class TestDistinctData(unittest.TestCase):
         self.assertEqual(result.fetch(), {'a': 2, 'b': 3})
 
 
+class TestAggregateData(unittest.TestCase):
+    def test_single_pass(self):
+        functions = ('sum', 'count', 'avg', 'min', 'max')
+        data = [3, None, 1.5, 'x', 1.5, 2]
+        result = _sqlite_aggregate(functions, iter(data))  # <- Iterated once.
+        expected = (
+            _sqlite_sum(data),
+            _sqlite_count(data),
+            _sqlite_avg(data),
+            _sqlite_min(data),
+            _sqlite_max(data),
+        )
+        self.assertEqual(result, expected)
+        self.assertEqual(result._fields, functions)
+        self.assertEqual(result.max, 'x')
+
+    def test_no_values(self):
+        result = _sqlite_aggregate(('count', 'sum', 'avg', 'min'), [None, None])
+        self.assertEqual(result, (0, None, None, None))
+
+        result = _sqlite_aggregate(('count', 'max'), [])
+        self.assertEqual(result, (0, None))
+
+    def test_element(self):
+        result = _sqlite_aggregate(('count', 'max', 'sum'), 5)
+        self.assertEqual(result, (1, 5, 5.0))
+
+    def test_groups(self):
+        data = Result({'a': [1, 2], 'b': [4]}, dict)
+        result = _aggregate_data(('min', 'max'), data)
+        self.assertEqual(result.fetch(), {'a': (1, 2), 'b': (4, 4)})
+
+
+class TestSampleData(unittest.TestCase):
+    def test_reservoir(self):
+        result = _sample_values(3, None, random.Random(0), iter(range(100)))
+        self.assertEqual(len(result), 3)
+        self.assertEqual(result, sorted(result), msg='should keep order')
+        self.assertTrue(set(result) <= set(range(100)))
+
+        result = _sample_values(5, None, random.Random(0), [1, 2])
+        self.assertEqual(result, [1, 2], msg='fewer values than n')
+
+    def test_fraction(self):
+        result = list(_sample_values(None, 0.25, random.Random(0), range(4000)))
+        self.assertAlmostEqual(len(result), 1000, delta=100)
+        self.assertEqual(result, sorted(result))
+
+        result = list(_sample_values(None, 1.0, random.Random(0), range(10)))
+        self.assertEqual(result, list(range(10)))
+
+    def test_seed(self):
+        data = list(range(1000))
+        result1 = _sample_data(10, None, 42, data).fetch()
+        result2 = _sample_data(10, None, 42, data).fetch()
+        self.assertEqual(result1, result2)
+
+    def test_groups(self):
+        data = Result({'a': list(range(100)), 'b': [1, 2], 'c': set([1, 2, 3])}, dict)
+        result = _sample_data(3, None, 0, data).fetch()
+        self.assertEqual(len(result['a']), 3)
+        self.assertEqual(result['b'], [1, 2])
+        self.assertIsInstance(result['c'], set)
+        self.assertEqual(result['c'], set([1, 2, 3]))
+
+    def test_element(self):
+        self.assertEqual(_sample_data(3, None, 0, 5), 5)
+
+    def test_rowid_blocks_clause(self):
+        clause = _rowid_blocks_clause('rowid', 1, 10, 1.0, random.Random(0))
+        self.assertEqual(clause, 'rowid BETWEEN 1 AND 10', msg='adjacent blocks combined')
+
+        clause = _rowid_blocks_clause('rowid', 1, 100, 0.01, random.Random(0))
+        self.assertRegex(clause, r'^rowid=\d+$')
+
+        clause = _rowid_blocks_clause('oid', 1, 1000000, 0.5, random.Random(0))
+        self.assertLessEqual(clause.count(' OR ') + 1, 500)
+
+
+class TestLimitData(unittest.TestCase):
+    def test_short_circuit(self):
+        data = Result(itertools.count(), list)  # <- Never ends.
+        result = _limit_data(3, data)
+        self.assertEqual(result.fetch(), [0, 1, 2])
+
+    def test_groups(self):
+        data = Result({'a': [1], 'b': [2], 'c': [3]}, dict)
+        result = _limit_data(2, data).fetch()
+        self.assertEqual(len(result), 2)
+        self.assertIsInstance(result, dict)
+
+    def test_element(self):
+        self.assertEqual(_limit_data(3, 5), 5)
+
+
 class Test_select_functions(unittest.TestCase):
     def test_normalize_columns(self):
         no_change = 'no change for valid containers'
@@ -806,6 +1002,236 @@ class TestQuery(unittest.TestCase):
         self.assertIsInstance(result, Result)
         self.assertEqual(result.fetch(), [1, 3, 4, 2])
 
+    def test_compile(self):
+        select = Selector([('A', 'B'), ('x', 1), ('y', 2), ('x', 3)])
+        query = select({'A': 'B'}, B=lambda x: x > 1).sum()
+        compiled = query.compile()
+        self.assertIsInstance(compiled, CompiledQuery)
+        self.assertEqual(compiled.fetch(), {'x': 3, 'y': 2})
+
+        plan = compiled._plans[True]
+        compiled.fetch()
+        self.assertIs(compiled._plans[True], plan, msg='should reuse plan')
+        prepared = plan[0].function
+        self.assertEqual(len(prepared._statements), 1)
+
+        # Selector with the same fieldnames reuses the statement.
+        other = Selector([('A', 'B'), ('z', 5)])
+        self.assertEqual(compiled.fetch(other), {'z': 5})
+        self.assertEqual(len(prepared._statements), 1)
+
+        # Selector with different fieldnames gets its own statement.
+        other = Selector([('B', 'A', 'C'), (7, 'x', 0)])
+        self.assertEqual(compiled.fetch(other), {'x': 7})
+        self.assertEqual(len(prepared._statements), 2)
+
+        regex = "expected 'Selector', got 'list'"
+        with self.assertRaisesRegex(TypeError, regex):
+            compiled.execute([1, 2])
+
+    def test_compile_other_source(self):
+        compiled = Query.from_object([1, 3, 4, 2]).map(lambda x: x * 2).compile()
+        self.assertEqual(compiled.fetch(), [2, 6, 8, 4])
+        self.assertEqual(compiled.fetch(), [2, 6, 8, 4])
+
+    def test_execute_reuses_compiled(self):
+        select = Selector([('A', 'B'), ('x', 1), ('y', 2)])
+        query = select('B').filter(lambda x: x > 1)
+        self.assertEqual(query.fetch(), [2])
+        compiled = query._compiled[(True, False)]
+        self.assertEqual(query.fetch(), [2])
+        self.assertIs(query._compiled[(True, False)], compiled)
+
+        self.assertEqual(query.map(str).fetch(), ['2'])  # <- New query.
+
+    def test_execute_vectorize(self):
+        """Vectorized results should match Python results (groups
+        that can't be vectorized fall back to Python).
+        """
+        select = Selector([
+            ('A', 'B', 'C'),
+            ('x', 1, 'a'),
+            ('x', 2.5, 'b'),
+            ('y', 3, 'c'),
+            ('y', None, 'd'),
+            ('z', 4, 'e'),
+        ])
+        queries = [
+            select({'A': 'B'}).sum(),
+            select({'A': 'B'}).avg(),
+            select({'A': 'B'}).min(),
+            select({'A': 'B'}).max(),
+            select({'A': 'B'}).count(),
+            select('B').filter(lambda x: x is not None).sum(),
+            select('B').filter(lambda x: x is not None).map(abs),
+            select({'A': 'C'}).max(),
+            select({'A': 'B'}).sum().map(lambda x: x * 2),
+            Query.from_object([1, 2, 3, 4]).sum(),
+            Query.from_object({'a': [1, 2], 'b': [3]}).avg(),
+        ]
+        for query in queries:
+            expected = query.fetch()
+            result = query.execute(vectorize=True)
+            if isinstance(result, Result):
+                result = result.fetch()
+            self.assertEqual(result, expected, msg=repr(query))
+
+        plan = query.compile(vectorize=True)._get_plan(query.source)
+        self.assertEqual(len(plan), 2, msg='aggregate replaced by vectorized step')
+
+    def test_aggregate(self):
+        query = Query.from_object({'a': [1, None, 3], 'b': []})
+        result = query.aggregate('count', 'avg', 'max').fetch()
+        self.assertEqual(result, {'a': (2, 2.0, 3), 'b': (0, None, None)})
+        self.assertEqual(result['a'].avg, 2.0)
+
+        with self.assertRaises(TypeError):
+            query.aggregate()
+
+        with self.assertRaisesRegex(ValueError, "got 'median'"):
+            query.aggregate('sum', 'median')
+
+        with self.assertRaisesRegex(ValueError, 'unique'):
+            query.aggregate('sum', 'sum')
+
+    def test_aggregate_selector(self):
+        """Aggregates calculated in SQL should match those calculated
+        in Python.
+        """
+        select = Selector([
+            ('A', 'B'), ('x', 1.5), ('x', None), ('y', 3.0), ('y', 3.0), ('z', None),
+        ])
+        functions = ('sum', 'count', 'avg', 'min', 'max')
+        for query in [select('B').aggregate(*functions),
+                      select({'A': 'B'}).aggregate(*functions),
+                      select({'A'}).aggregate('count', 'min'),
+                      select({'A': 'B'}).distinct().aggregate(*functions)]:
+            result = query.execute()
+            expected = query.execute(optimize=False)
+            if isinstance(result, Result):
+                result, expected = result.fetch(), expected.fetch()
+            self.assertEqual(result, expected, msg=repr(query))
+
+        query = select({'A': 'B'}).aggregate('count', 'sum')
+        self.assertIn('_select_aggregates', query._explain(file=None))
+        self.assertEqual(
+            query.fetch(),
+            {'x': (1, 1.5), 'y': (2, 6.0), 'z': (0, None)},
+        )
+
+        select.partition('A', 2)
+        self.assertEqual(
+            select('B').aggregate('count', 'max').fetch(),
+            (3, 3.0),
+        )
+        self.assertEqual(
+            query.fetch(),
+            {'x': (1, 1.5), 'y': (2, 6.0), 'z': (0, None)},
+        )
+
+    def test_approx_count_distinct(self):
+        select = Selector(
+            [('A', 'B')]
+            + [('x', i % 1000) for i in range(3000)]
+            + [('y', 'a'), ('y', 'b'), ('y', None)]
+        )
+        result = select({'A': 'B'}).approx_count_distinct().fetch()
+        self.assertAlmostEqual(result['x'], 1000, delta=30)
+        self.assertEqual(result['y'], 2)
+
+        query = select('B').approx_count_distinct(precision=10)
+        with allowed.percent(0.15):
+            validate(query, 1002)
+
+        with self.assertRaises(ValueError):
+            select('B').approx_count_distinct(precision=20)
+
+    def test_approx_quantile(self):
+        select = Selector(
+            [('A', 'B')]
+            + [('x', i) for i in range(1, 10001)]
+            + [('y', 5), ('y', None), ('z', None)]
+        )
+        result = select({'A': 'B'}).approx_quantile(0.5).fetch()
+        self.assertAlmostEqual(result['x'], 5000, delta=150)
+        self.assertEqual(result['y'], 5)
+        self.assertIsNone(result['z'])
+
+        query = Query.from_object(['b', 3, 'a', 1, 2]).approx_quantile(0.75)
+        self.assertEqual(query.fetch(), 'a', msg='numbers sort before text')
+
+        with self.assertRaises(ValueError):
+            select('B').approx_quantile(1.5)
+
+        with self.assertRaises(ValueError):
+            select('B').approx_quantile(0.5, k=2)
+
+    def test_sample(self):
+        query = Query.from_object({'x': list(range(100)), 'y': [1, 2]})
+        result = query.sample(n=3, seed=1).fetch()
+        self.assertEqual(len(result['x']), 3)
+        self.assertEqual(result['y'], [1, 2])
+        self.assertEqual(result, query.sample(n=3, seed=1).fetch())
+
+        query = Query.from_object(list(range(1000))).sample(fraction=0.1, seed=1)
+        self.assertAlmostEqual(len(query.fetch()), 100, delta=40)
+
+        with self.assertRaises(TypeError):
+            query.sample()
+
+        with self.assertRaises(TypeError):
+            query.sample(n=5, fraction=0.5)
+
+        with self.assertRaises(ValueError):
+            query.sample(n=0)
+
+        with self.assertRaises(ValueError):
+            query.sample(fraction=1.5)
+
+    def test_sample_selector(self):
+        select = Selector([('A', 'B')] + [(i % 3, i) for i in range(3000)])
+
+        query = select('B').sample(n=10, seed=7)
+        result = query.fetch()
+        self.assertEqual(len(result), 10)
+        self.assertEqual(result, sorted(result))
+        self.assertEqual(result, query.fetch(), msg='same seed, same sample')
+
+        result = select('B').sample(fraction=0.1, seed=7).fetch()
+        self.assertAlmostEqual(len(result), 300, delta=30)
+
+        result = select('B', A=1).sample(n=10, seed=7).fetch()
+        self.assertEqual(len(result), 10)
+        self.assertTrue(all(x % 3 == 1 for x in result))
+
+        result = select('B', A=1).sample(n=2000, seed=7).fetch()
+        self.assertEqual(len(result), 1000, msg='all matching rows')
+
+        result = select({'A': 'B'}).sample(n=2, seed=7).fetch()
+        self.assertEqual(sorted(result.keys()), [0, 1, 2])
+        self.assertTrue(all(len(x) == 2 for x in result.values()))
+
+        # A column named "rowid" uses another rowid alias.
+        select = Selector([('rowid', 'B')] + [(i, i) for i in range(100)])
+        result = select('B').sample(n=5, seed=7).fetch()
+        self.assertEqual(len(result), 5)
+
+    def test_limit(self):
+        query = Query.from_object(Result(itertools.count(), list))
+        result = query.map(lambda x: x * 2).limit(3).fetch()
+        self.assertEqual(result, [0, 2, 4])
+
+        select = Selector([('A', 'B')] + [(i % 3, i) for i in range(30)])
+        self.assertEqual(select('B').limit(3).fetch(), [0, 1, 2])
+        self.assertEqual(select('B', A=1).limit(3).fetch(), [1, 4, 7])
+        self.assertEqual(select('B').limit(0).fetch(), [])
+
+        result = select({'A': 'B'}).limit(2).count().fetch()
+        self.assertEqual(result, {0: 10, 1: 10})
+
+        with self.assertRaises(ValueError):
+            select('B').limit(-1)
+
     def test_map(self):
         query1 = Query(['col2'])
         query2 = query1.map(int)
@@ -881,6 +1307,163 @@ class TestQuery(unittest.TestCase):
         )
         self.assertEqual(optimized, expected)
 
+    def test_optimize_distinct_aggregation(self):
+        unoptimized = (
+            (getattr, (RESULT_TOKEN, '_select'), {}),
+            (RESULT_TOKEN, ({'col1': ['values']},), {'col2': 'xyz'}),
+            (_sqlite_distinct, (RESULT_TOKEN,), {}),
+            (_apply_to_data, (_sqlite_count, RESULT_TOKEN,), {}),
+        )
+        optimized = Query._optimize(unoptimized)
+
+        expected = (
+            (getattr, (RESULT_TOKEN, '_select_aggregate'), {}),
+            (RESULT_TOKEN, ('COUNT', {'col1': set(['values'])},), {'col2': 'xyz'}),
+        )
+        self.assertEqual(optimized, expected)
+
+    def test_optimize_aggregates(self):
+        unoptimized = (
+            (getattr, (RESULT_TOKEN, '_select'), {}),
+            (RESULT_TOKEN, ({'col1': ['values']},), {}),
+            (_aggregate_data, (('sum', 'max'), RESULT_TOKEN,), {}),
+        )
+        expected = (
+            (getattr, (RESULT_TOKEN, '_select_aggregates'), {}),
+            (RESULT_TOKEN, (('sum', 'max'), {'col1': ['values']},), {}),
+        )
+        self.assertEqual(Query._optimize(unoptimized), expected)
+
+        unoptimized = (
+            (getattr, (RESULT_TOKEN, '_select'), {}),
+            (RESULT_TOKEN, (['values'],), {}),
+            (_sqlite_distinct, (RESULT_TOKEN,), {}),
+            (_aggregate_data, (('count',), RESULT_TOKEN,), {}),
+        )
+        expected = (
+            (getattr, (RESULT_TOKEN, '_select_aggregates'), {}),
+            (RESULT_TOKEN, (('count',), set(['values']),), {}),
+        )
+        self.assertEqual(Query._optimize(unoptimized), expected)
+
+        multicolumn = (
+            (getattr, (RESULT_TOKEN, '_select'), {}),
+            (RESULT_TOKEN, ([('col1', 'col2')],), {}),
+            (_aggregate_data, (('count',), RESULT_TOKEN,), {}),
+        )
+        self.assertIsNone(Query._optimize(multicolumn))
+
+    def test_optimize_sample(self):
+        unoptimized = (
+            (getattr, (RESULT_TOKEN, '_select'), {}),
+            (RESULT_TOKEN, (['values'],), {}),
+            (_sample_data, (10, None, 42, RESULT_TOKEN,), {}),
+        )
+        expected = (
+            (getattr, (RESULT_TOKEN, '_select_sample'), {}),
+            (RESULT_TOKEN, ((10, None, 42), ['values'],), {}),
+        )
+        self.assertEqual(Query._optimize(unoptimized), expected)
+
+        # Grouped selections are not changed (groups are sampled
+        # separately).
+        grouped = (
+            (getattr, (RESULT_TOKEN, '_select'), {}),
+            (RESULT_TOKEN, ({'col1': ['values']},), {}),
+            (_sample_data, (10, None, 42, RESULT_TOKEN,), {}),
+        )
+        self.assertIsNone(Query._optimize(grouped))
+
+    def test_optimize_limit(self):
+        unoptimized = (
+            (getattr, (RESULT_TOKEN, '_select'), {}),
+            (RESULT_TOKEN, (['values'],), {}),
+            (_limit_data, (5, RESULT_TOKEN,), {}),
+            (_sqlite_distinct, (RESULT_TOKEN,), {}),
+        )
+        expected = (
+            (getattr, (RESULT_TOKEN, '_select_limit'), {}),
+            (RESULT_TOKEN, (5, ['values'],), {}),
+            (_sqlite_distinct, (RESULT_TOKEN,), {}),
+        )
+        self.assertEqual(Query._optimize(unoptimized), expected)
+
+        # Grouped selections are not changed (LIMIT would count rows
+        # instead of groups).
+        grouped = (
+            (getattr, (RESULT_TOKEN, '_select'), {}),
+            (RESULT_TOKEN, ({'col1': ['values']},), {}),
+            (_limit_data, (5, RESULT_TOKEN,), {}),
+        )
+        self.assertIsNone(Query._optimize(grouped))
+
+    def test_optimize_filter(self):
+        isdigit = lambda x: x.isdigit()
+        unoptimized = (
+            (getattr, (RESULT_TOKEN, '_select'), {}),
+            (RESULT_TOKEN, (['values'],), {}),
+            (_filter_data, (isdigit, RESULT_TOKEN,), {}),
+            (_map_data, (int, RESULT_TOKEN,), {}),
+        )
+        optimized = Query._optimize(unoptimized)
+
+        self.assertEqual(optimized[0], (getattr, (RESULT_TOKEN, '_select'), {}))
+        self.assertEqual(list(optimized[1][2].keys()), ['values'])
+        self.assertEqual(optimized[2], (_map_data, (int, RESULT_TOKEN,), {}))
+
+        # Grouped selections are not changed (filtering in SQL would
+        # drop groups that have no matching values).
+        grouped = (
+            (getattr, (RESULT_TOKEN, '_select'), {}),
+            (RESULT_TOKEN, ({'col1': ['values']},), {}),
+            (_filter_data, (isdigit, RESULT_TOKEN,), {}),
+        )
+        self.assertIsNone(Query._optimize(grouped))
+
+    def test_optimized_results(self):
+        source = Selector([
+            ['A', 'B'],
+            ['x', '1'], ['x', '1'], ['x', ''], ['y', '2'], ['y', 'z'], ['y', '3'],
+        ])
+        queries = [
+            source('B').filter(lambda x: x.isdigit()),
+            source('B').filter(),
+            source('B').filter(lambda x: x.isdigit()).filter(lambda x: x != '3'),
+            source('B').filter(lambda x: x.isdigit()).distinct().count(),
+            source('B').distinct().count(),
+            source('B').filter(lambda x: x.isdigit()).distinct().sum(),
+            source({'A': 'B'}).distinct().count(),
+            source({'A': 'B'}).filter(lambda x: x.isdigit()),
+            source('B').filter(lambda x: x.isdigit()).map(int),
+        ]
+        def fetch(query, optimize):
+            result = query.execute(optimize=optimize)
+            return result.fetch() if isinstance(result, Result) else result
+
+        for query in queries:
+            self.assertEqual(fetch(query, True), fetch(query, False),
+                             msg=repr(query))
+
+    def test_optimized_filter_error(self):
+        """Errors raised by filter functions should not be changed
+        when filters are executed in SQLite.
+        """
+        source = Selector([['A', 'B'], ['x', '1'], ['y', '2'], ['z', 'a']])
+
+        for optimize in (True, False):
+            query = source('B').filter(lambda x: int(x) > 1)
+            with self.assertRaises(ValueError) as cm:
+                query.execute(optimize=optimize).fetch()
+            self.assertIn("invalid literal for int()", str(cm.exception))
+
+        query = source('B').filter(lambda x: int(x) > 1).count()
+        with self.assertRaises(ValueError):
+            query.execute()
+
+        # Following queries are not affected.
+        query = source('B').filter(lambda x: x.isdigit()).map(int)
+        self.assertEqual(query.fetch(), [1, 2])
+
     def test_explain(self):
         query = Query(['col1'])
         expected = """
@@ -919,6 +1502,50 @@ class TestQuery(unittest.TestCase):
         returned_value = query._explain(file=None)
         self.assertEqual(returned_value, expected)
 
+    def test_public_explain(self):
+        source = Selector([['A', 'B', 'C'], ['a', 'x', 1], ['b', 'y', 2]])
+        query = source({'A': 'C'}, B='x').sum()
+
+        explained = query.explain(file=None)
+        self.assertIn('Execution Plan (optimized):', explained)
+        self.assertIn('SQL:\n  SELECT "A", SUM("C") FROM ', explained)
+        self.assertIn("-- params: ['x']", explained)
+        self.assertIn('-- index: none', explained)
+        self.assertIn('Query Plan:', explained)
+        self.assertNotIn('Step Timings:', explained)
+
+        source.create_index('B')
+        explained = query.explain(file=None)
+        self.assertRegex(explained, r'-- index: idx_\w+_B')
+
+        string_io = io.StringIO()
+        self.assertIsNone(query.explain(file=string_io))
+        self.assertIn('Query Plan:', string_io.getvalue())
+
+    def test_public_explain_analyze(self):
+        source = Selector([['A', 'B'], ['a', 1], ['b', 2], ['a', 3]])
+        query = source({'A': 'B'}).map(lambda x: x * 2)
+        explained = query.explain(analyze=True, file=None)
+        self.assertIn('SQL:', explained)
+        self.assertRegex(explained, r"Step Timings:\n  1\. prepared _select\(\{'A': \['B'\]\}\)")
+        self.assertRegex(explained, r'\d+\.\d{6} seconds, 2 groups, 3 rows')
+
+        # Timings are for the compiled plan run by execute() (where
+        # consecutive map() and filter() steps are fused).
+        query = source('B').map(lambda x: x * 2).filter(lambda x: x > 2)
+        explained = query.explain(analyze=True, file=None)
+        fused_step = '_map_filter_data, (map(<lambda>), filter(<lambda>), <RESULT>)'
+        self.assertIn('  2. ' + fused_step, explained)
+        self.assertNotIn('  3. ', explained)
+        self.assertIn('seconds, 2 rows', explained)
+
+        query = Query.from_object([1, 2, 3]).filter(lambda x: x > 1).sum()
+        explained = query.explain(analyze=True, file=None)
+        self.assertNotIn('SQL:', explained)
+        self.assertIn('seconds, 3 rows', explained)
+        self.assertIn('seconds, 2 rows', explained)
+        self.assertIn('seconds, 1 value', explained)
+
     def test_repr(self):
         # Check "no selector" signature.
         query = Query(['label1'])
@@ -1001,6 +1628,523 @@ class TestSelector(unittest.TestCase):
         select.load_data(readerlike2)
         self.assertEqual(select.fieldnames, ['col1', 'col2', 'col3'])
 
+    def test_iter_empty(self):
+        select = Selector()  # <- Empty selector.
+        self.assertEqual(list(select), [])
+
+    def test_iter_rows(self):
+        data = [['A', 'B-C']] + [['x', i] for i in range(5)]
+        select = Selector(data)
+
+        rows = select.iter_rows(tuple, arraysize=2)
+        self.assertEqual(next(rows), ('x', 0))
+        self.assertEqual(len(list(rows)), 4, msg='remaining rows')
+
+        rows = list(select.iter_rows(collections.namedtuple))
+        self.assertEqual(rows[0].A, 'x')
+        self.assertEqual(rows[0]._fields, ('A', '_1'), msg='invalid name renamed')
+
+        with self.assertRaises(ValueError):
+            select.iter_rows(list)
+
+    def test_fieldnames_cache(self):
+        select = Selector([['A', 'B'], ['x', 1]])
+        fieldnames = select.fieldnames
+        fieldnames.append('C')  # <- Changing returned list
+        self.assertEqual(select.fieldnames, ['A', 'B'])  # doesn't change cache.
+
+        # Build cache and change table without using load_data().
+        select('A')
+        with select._pool.writer() as connection:
+            connection.execute('ALTER TABLE {0} ADD COLUMN C'.format(select._table))
+        self.assertEqual(select.fieldnames, ['A', 'B'], msg='should use cache')
+        with self.assertRaises(LookupError):
+            select('C')
+
+        select.load_data([['A', 'D'], ['y', 2]])  # <- Resets cache.
+        self.assertEqual(select.fieldnames, ['A', 'B', 'C', 'D'])
+        select('D')  # <- Should not raise error.
+
+    def test_result_cache(self):
+        select = Selector([['A', 'B'], ['x', 1], ['y', 2], ['x', 3]])
+        select.enable_result_cache(maxsize=4)
+        cache = select._result_cache
+
+        self.assertEqual(select({'A': 'B'}).sum().fetch(), {'x': 4, 'y': 2})
+        self.assertEqual(select({'A': 'B'}).sum().fetch(), {'x': 4, 'y': 2})
+        self.assertEqual(cache.hits, 1)
+
+        result = select('B', A='x').execute()
+        self.assertIsInstance(result, Result)
+        self.assertEqual(result.fetch(), [1, 3])
+        cached = select('B', A='x').fetch()
+        cached.append(5)  # <- Changing result should not change cache.
+        self.assertEqual(select('B', A='x').fetch(), [1, 3])
+
+        # Queries with functions are not cached.
+        select('B').map(lambda x: x * 2).fetch()
+        select('B', A=lambda x: x == 'x').fetch()
+        self.assertEqual(len(cache), 2)
+
+        # Loading data clears cache.
+        select.load_data([['A', 'B'], ['y', 4]])
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(select({'A': 'B'}).sum().fetch(), {'x': 4, 'y': 6})
+
+    def test_result_cache_aggregate(self):
+        select = Selector([['A', 'B'], ['x', 1], ['y', 2], ['x', 3]])
+        select.enable_result_cache()
+
+        query = select({'A': 'B'}).aggregate('sum', 'max')
+        self.assertEqual(query.fetch(), query.fetch())
+        self.assertEqual(select._result_cache.hits, 1)
+        self.assertEqual(query.fetch()['x'].sum, 4)
+
+        # Different function names are cached separately.
+        result = select('B').aggregate('count', 'min').fetch()
+        self.assertEqual((result.count, result.min), (3, 1))
+        result = select('B').aggregate('count', 'max').fetch()
+        self.assertEqual((result.count, result.max), (3, 3))
+
+    def test_result_cache_tuple_columns(self):
+        select = Selector([['A', 'B'], ['x', 1], ['y', 2]])
+        select.enable_result_cache()
+        Row = collections.namedtuple('Row', ['A', 'B'])
+
+        uncached = select(Row('A', 'B')).max().execute()
+        cached = select(Row('A', 'B')).max().execute()
+        self.assertEqual(uncached, Row('y', 2))
+        self.assertEqual(cached, Row('y', 2))
+        self.assertIsInstance(cached, Row)
+        self.assertEqual(select._result_cache.hits, 1)
+
+        uncached = select(('A', 'B')).max().execute()
+        cached = select(('A', 'B')).max().execute()
+        self.assertEqual(uncached, ('y', 2))
+        self.assertEqual(cached, ('y', 2))
+        self.assertIs(type(cached), tuple)
+
+        cached = select([Row('A', 'B')]).execute()
+        self.assertIsInstance(cached, Result)
+        cached = select([Row('A', 'B')]).fetch()
+        self.assertEqual(cached, [Row('x', 1), Row('y', 2)])
+
+    def test_aggregate(self):
+        select = Selector([
+            ['region', 'amount', 'qty'],
+            ['east', 1, 2],
+            ['west', 3, ''],
+            ['east', 5, 6],
+        ])
+
+        results = select.aggregate({'amount': 'sum', 'qty': ['count', 'min']})
+        expected = {('amount', 'sum'): 9, ('qty', 'count'): 3, ('qty', 'min'): 2}
+        self.assertEqual(results, expected)
+
+        results = select.aggregate({'amount': 'sum'}, region='east')
+        self.assertEqual(results, {('amount', 'sum'): 6})
+
+        with self.assertRaises(ValueError):
+            select.aggregate({'amount': 'median'})
+
+    def test_aggregate_grouped(self):
+        select = Selector([
+            ['region', 'amount', 'qty'],
+            ['east', 1, 2],
+            ['west', 3, ''],
+            ['east', 5, 6],
+        ])
+        results = select.aggregate({'region': {'amount': ['sum', 'max'], 'qty': 'avg'}})
+
+        self.assertEqual(len(results), 3)
+        for (column, function), result in results.items():
+            self.assertIsInstance(result, Result)
+            query = getattr(select({'region': column}), function)()
+            self.assertEqual(result.fetch(), query.fetch())
+
+    def test_load_data_profile(self):
+        select = Selector([['A', 'B'], ['x', 1]])
+        select.create_index('A')
+
+        select.load_data([['A', 'B'], ['y', 2]], profile='fast-ephemeral')
+        self.assertEqual(select('A').fetch(), ['x', 'y'])
+
+        select.load_data([['A', 'B'], ['z', 3]], profile={'batch_size': 1})
+        self.assertEqual(select('A').fetch(), ['x', 'y', 'z'])
+
+        with self.assertRaises(ValueError):
+            select.load_data([['A', 'B'], ['w', 4]], profile='bad-name')
+
+    def test_load_data_dtypes(self):
+        data = [['A', 'B'], ['x', '2'], ['y', '10']]
+
+        select = Selector(data)
+        self.assertEqual(select('B').max().fetch(), '2', msg='compared as text')
+
+        select = Selector(data, dtypes={'B': int})
+        self.assertEqual(select('B').max().fetch(), 10)
+
+        select = Selector(data, dtypes='infer')
+        self.assertEqual(select('B').fetch(), [2, 10])
+
+    def test_load_data_workers(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+
+        file_contents = [
+            ('file1.csv', u'A,B\nx,1\n'),
+            ('file2.csv', u'A,C\ny,2\n'),
+            ('file3.csv', u'A,B\nz,3\n'),
+        ]
+        paths = []
+        for name, contents in file_contents:
+            path = os.path.join(temp_dir, name)
+            with open(path, 'w') as fh:
+                fh.write(contents)
+            paths.append(path)
+
+        select = Selector()
+        select.load_data(paths, workers=2)
+
+        self.assertEqual(select.fieldnames, ['A', 'B', 'C'])
+        self.assertEqual(
+            select(('A', 'B', 'C')).fetch(),
+            [('x', '1', ''), ('y', '', '2'), ('z', '3', '')],
+        )
+
+    def _make_database(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        path = os.path.join(temp_dir, 'warehouse.db')
+        connection = sqlite3.connect(path)
+        connection.execute('CREATE TABLE orders (region TEXT, amount INTEGER)')
+        connection.executemany(
+            'INSERT INTO orders VALUES (?, ?)',
+            [('east', 10), ('east', 5), ('west', 7)],
+        )
+        connection.commit()
+        connection.close()
+        return path
+
+    def test_attach(self):
+        path = self._make_database()
+
+        select = Selector()
+        select.attach(path, table='orders')
+
+        self.assertEqual(select.fieldnames, ['region', 'amount'])
+        self.assertEqual(select({'region': 'amount'}).sum().fetch(),
+                         {'east': 15, 'west': 7})
+        self.assertEqual(select('amount', region='west').fetch(), [7])
+        self.assertEqual(repr(select), '<Selector {0!r}>'.format(path))
+
+        # Attached table is copied before new records are added.
+        select.load_data([['region', 'amount'], ['north', 1]])
+        self.assertEqual(select('region').distinct().fetch(),
+                         ['east', 'west', 'north'])
+
+        connection = sqlite3.connect(path)
+        count = connection.execute('SELECT COUNT(*) FROM orders').fetchone()[0]
+        connection.close()
+        self.assertEqual(count, 3, msg='attached file should be unchanged')
+
+    def test_attach_to_loaded_selector(self):
+        path = self._make_database()
+
+        select = Selector([['region', 'amount'], ['north', 1]])
+        select.attach(path, table='orders')
+        self.assertEqual(select('region').distinct().fetch(),
+                         ['north', 'east', 'west'])
+        self.assertEqual(select('amount').sum().fetch(), 23)
+
+    def test_attach_errors(self):
+        path = self._make_database()
+        select = Selector()
+
+        with self.assertRaises(LookupError):
+            select.attach(path, table='missing')
+        self.assertEqual(select.fieldnames, [])
+
+        with self.assertRaises(FileNotFoundError):
+            select.attach(path + '.missing', table='orders')
+
+    def test_attach_limit(self):
+        """When no more databases can be attached, records should be
+        copied instead.
+        """
+        path = self._make_database()
+        selectors = []
+        for _ in range(Selector()._pool.max_attached + 2):
+            selectors.append(Selector())
+            selectors[-1].attach(path, table='orders')
+        self.addCleanup(lambda: [x.close() for x in selectors])
+
+        select = selectors[-1]
+        self.assertFalse(select._read_only, msg='copied, not attached')
+        self.assertEqual(select({'region': 'amount'}).sum().fetch(),
+                         {'east': 15, 'west': 7})
+        select.create_index('region')
+
+        with self.assertRaises(LookupError):
+            Selector().attach(path, table='missing')
+
+    def test_attach_create_index(self):
+        path = self._make_database()
+        select = Selector()
+        select.attach(path, table='orders')
+
+        regex = 'cannot create indexes on an attached read-only table'
+        with self.assertRaisesRegex(RuntimeError, regex):
+            select.create_index('region')
+
+        # Indexes can be created once records are copied.
+        select.load_data([['region', 'amount'], ['north', 1]])
+        select.create_index('region')
+        self.assertEqual(select('amount', region='north').fetch(), [1])
+
+    def _write_file(self, path, contents, mode='w'):
+        with open(path, mode) as fh:
+            fh.write(contents)
+
+    def test_refresh(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        path = os.path.join(temp_dir, 'feed.csv')
+        self._write_file(path, u'A,B\nx,1\ny,2\n')
+
+        select = Selector(path)
+        select.refresh()  # <- No changes.
+        self.assertEqual(select(('A', 'B')).fetch(), [('x', '1'), ('y', '2')])
+
+        self._write_file(path, u'z,3\nw,', mode='a')  # <- Last line incomplete.
+        select.refresh()
+        self.assertEqual(select('A').fetch(), ['x', 'y', 'z'])
+
+        self._write_file(path, u'4\n', mode='a')
+        select.refresh()
+        self.assertEqual(select(('A', 'B')).fetch(),
+                         [('x', '1'), ('y', '2'), ('z', '3'), ('w', '4')])
+
+    def test_refresh_changed_file(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        path1 = os.path.join(temp_dir, 'file1.csv')
+        path2 = os.path.join(temp_dir, 'file2.csv')
+        self._write_file(path1, u'A,B\nx,1\ny,2\n')
+        self._write_file(path2, u'A,B\nz,3\n')
+
+        select = Selector([path1, path2])
+        self._write_file(path1, u'A,B\nx,10\n')  # <- Rewritten (not appended).
+        self._write_file(path2, u'w,4\n', mode='a')
+        select.refresh()
+
+        self.assertEqual(select({'A': 'B'}).fetch(),
+                         {'x': ['10'], 'z': ['3'], 'w': ['4']})
+
+    def test_refresh_multiline_field(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        path = os.path.join(temp_dir, 'feed.csv')
+        self._write_file(path, u'A,B\nx,1\n')
+
+        select = Selector(path)
+        self._write_file(path, u'y,"a ""b""\n', mode='a')  # <- Open quote.
+        select.refresh()
+        self.assertEqual(select('A').fetch(), ['x'])
+
+        self._write_file(path, u'c"\nz,3\n', mode='a')  # <- Closed.
+        select.refresh()
+        expected = [('x', '1'), ('y', 'a "b"\nc'), ('z', '3')]
+        self.assertEqual(select(('A', 'B')).fetch(), expected)
+        self.assertEqual(Selector(path)(('A', 'B')).fetch(), expected)
+
+    def test_refresh_edited_row(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        path = os.path.join(temp_dir, 'feed.csv')
+        lines = [u'A,B\n'] + [u'x,{0:05d}\n'.format(i) for i in range(2000)]
+        self._write_file(path, u''.join(lines))
+
+        select = Selector(path)
+        self._write_file(path, u'y,99999\n', mode='a')
+        select.refresh()  # <- Continues checksum past the appended row.
+        self.assertEqual(select('B').count().execute(), 2001)
+
+        # Edit a row far before the end of the file (in place, same size).
+        lines[2] = u'z,00001\n'
+        self._write_file(path, u''.join(lines) + u'y,99999\n')
+        select.refresh()
+
+        self.assertEqual(select('B', A='z').fetch(), ['00001'])
+        self.assertEqual(select('B').count().execute(), 2001)
+
+    def test_refresh_cache_dir(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        path = os.path.join(temp_dir, 'feed.csv')
+        self._write_file(path, u'A,B\nx,1\n')
+
+        select = Selector(path, cache_dir=os.path.join(temp_dir, 'cache'))
+        self._write_file(path, u'y,2\n', mode='a')
+        select.refresh()
+        self.assertEqual(select(('A', 'B')).fetch(), [('x', '1'), ('y', '2')])
+
+    def _partition_data(self):
+        data = [['A', 'B', 'C']]
+        for i in range(60):
+            data.append(['abc'[i % 3], 'xyzw'[i % 4], i])
+        data.append([None, 'x', 5])
+        data.append([1, 'y', 7])
+        data.append([1.0, 'y', 8])  # <- Same group as 1 in SQLite.
+        return data
+
+    def _assert_partitioned_results(self, select, expected):
+        queries = [
+            ({'A': 'C'}, None),
+            ({('A', 'B'): 'C'}, None),
+            ({'A': {'B'}}, None),
+            ({'A': 'C'}, 'sum'),
+            ({'A': 'C'}, 'avg'),
+            ({'B': 'C'}, 'sum'),    # <- Grouped by other column.
+            ({'B': 'C'}, 'count'),
+            ({'B': 'C'}, 'min'),
+            ({'B': 'C'}, 'max'),
+            ({'B': {'C'}}, 'count'),
+            ('C', 'sum'),
+            ('C', 'max'),
+        ]
+        for columns, method in queries:
+            query1 = select(columns)
+            query2 = expected(columns)
+            if method:
+                query1 = getattr(query1, method)()
+                query2 = getattr(query2, method)()
+            self.assertEqual(query1.fetch(), query2.fetch(),
+                             msg=(columns, method))
+
+    def test_partition(self):
+        expected = Selector(self._partition_data())
+
+        for method in ('hash', 'range'):
+            select = Selector(self._partition_data())
+            select.partition('A', 3, method=method)
+            self.assertEqual(len(select._partitions), 3)
+            self.assertEqual(select.fieldnames, ['A', 'B', 'C'])
+            self._assert_partitioned_results(select, expected)
+
+    def test_partition_ungrouped_order(self):
+        """Ungrouped results contain the same records but their order
+        is unspecified after partitioning.
+        """
+        data = self._partition_data()
+        expected = Selector(data)
+        select = Selector(data)
+        select.partition('A', 3)
+
+        self.assertEqual(sorted(select('C').fetch()),
+                         sorted(expected('C').fetch()))
+
+        limited = select('C').limit(3).fetch()
+        self.assertEqual(len(limited), 3)
+        self.assertTrue(set(limited) <= set(expected('C').fetch()))
+
+        # Grouped results are still ordered by key.
+        result = select({'B': 'C'}).sum().execute()
+        self.assertEqual([key for key, _ in result], ['w', 'x', 'y', 'z'])
+
+    def test_partition_load_more(self):
+        data = self._partition_data()
+        select = Selector(data[:30])
+        select.partition('A', 4, method='range')
+        select.create_index('A')
+        select.load_data([data[0]] + data[30:])
+
+        expected = Selector(data)
+        self._assert_partitioned_results(select, expected)
+
+        select.load_data([['A', 'D'], ['a', 'new']])  # <- New column.
+        self.assertEqual(select.fieldnames, ['A', 'B', 'C', 'D'])
+        self.assertEqual(select(('A', 'D'), D='new').fetch(), [('a', 'new')])
+
+    def test_partition_refresh(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        path = os.path.join(temp_dir, 'feed.csv')
+        self._write_file(path, u'A,B\nx,1\ny,2\n')
+
+        select = Selector(path)
+        select.partition('A', 2)
+        self._write_file(path, u'z,3\n', mode='a')
+        with self.assertRaisesRegex(RuntimeError, 'cannot refresh a partitioned Selector'):
+            select.refresh()
+
+    def test_partition_close(self):
+        select = Selector(self._partition_data())
+        select.partition('B', 2)
+        tables = [select._table] + select._partitions
+        select.close()
+        with select._pool.writer() as connection:
+            cursor = connection.cursor()
+            for table in tables:
+                cursor.execute('SELECT 1 FROM sqlite_master WHERE name=?', (table,))
+                self.assertIsNone(cursor.fetchone())
+
+    def _table_exists(self, select, table):
+        with select._pool.writer() as connection:
+            return table_exists(connection.cursor(), table)
+
+    def test_close(self):
+        select = Selector([['A', 'B'], ['x', 1]])
+        table = select._table
+        select.create_index('A')
+        select.close()
+
+        self.assertFalse(self._table_exists(select, table))
+        self.assertEqual(select.fieldnames, [])
+        self.assertEqual(repr(select), '<Selector (no data loaded)>')
+        select.close()  # <- Closing twice is OK.
+
+    def test_context_manager(self):
+        with Selector([['A', 'B'], ['x', 1]]) as select:
+            table = select._table
+            self.assertEqual(select('B').fetch(), [1])
+        self.assertFalse(self._table_exists(select, table))
+
+    def test_garbage_collected(self):
+        select = Selector([['A', 'B'], ['x', 1]])
+        table = select._table
+        pool = select._pool
+        del select
+        gc.collect()
+
+        Selector([['A'], ['y']])  # <- Drops pending tables.
+        with pool.writer() as connection:
+            self.assertFalse(table_exists(connection.cursor(), table))
+
+    def test_memory_budget(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        path = os.path.join(temp_dir, 'example.csv')
+        with open(path, 'w') as fh:
+            fh.write(u'A,B\n' + u'x,1\n' * 500)
+
+        Selector.set_memory_budget(1)
+        self.addCleanup(Selector.set_memory_budget, None)
+
+        select1 = Selector(path)
+        table1 = select1._table_name
+        select2 = Selector(path)  # <- Evicts select1.
+        not_evictable = Selector([['A', 'B'], ['y', 2]])
+
+        self.assertFalse(self._table_exists(select1, table1))
+        self.assertTrue(self._table_exists(select2, select2._table_name))
+
+        # Evicted tables are rebuilt when used.
+        self.assertEqual(select1('B').count().fetch(), 500)
+        self.assertEqual(repr(select1), '<Selector {0!r}>'.format(path))
+        self.assertIsNone(select2._table_name, msg='select2 is evicted')
+        self.assertEqual(not_evictable('A').fetch(), ['y'])
+
     def test_repr(self):
         data = [['A', 'B'], ['x', 100], ['y', 200]]
 
@@ -1057,9 +2201,105 @@ class TestSelector(unittest.TestCase):
 
         userfunc = lambda x: len(x) == 1
         result = _build_where_clause({'A': userfunc})
-        expected = ('FUNC{0}(A)'.format(id(userfunc)), [])
+        expected = ('{0}(A)'.format(_get_function_name(userfunc)), [])
+        self.assertEqual(result, expected)
+
+        result = _build_where_clause({'A': Ellipsis, 'B': 'x'})
+        expected = ('B=?', ['x'])
+        self.assertEqual(result, expected)
+
+        result = _build_where_clause({'A': float})
+        expected = ("typeof(A) IN ('real')", [])
+        self.assertEqual(result, expected)
+
+        result = _build_where_clause({'A': object})
+        expected = ('', [])
+        self.assertEqual(result, expected)
+
+        result = _build_where_clause({'A': re.compile(r'^a\*b')})
+        expected = ("CASE WHEN typeof(A)='text' THEN A GLOB ? "
+                    "ELSE A REGEXP ? END", ['a[*]b*', r'^a\*b'])
         self.assertEqual(result, expected)
 
+        result = _build_where_clause({'A': re.compile('a_b', re.IGNORECASE)})
+        expected = ("CASE WHEN typeof(A)='text' "
+                    "AND length(A)=length(CAST(A AS BLOB)) "
+                    "THEN A LIKE ? ESCAPE '\\' ELSE A REGEXP ? END",
+                    ['%a\\_b%', '(?i)a_b'])
+        self.assertEqual(result, expected)
+
+        result = _build_where_clause({'A': re.compile('^a.b')})
+        expected = ('A REGEXP ?', ['^a.b'])
+        self.assertEqual(result, expected)
+
+    def test_function_names(self):
+        func1 = lambda x: True
+        func2 = lambda x: False
+        name1 = _get_function_name(func1)
+        self.assertEqual(_get_function_name(func1), name1, msg='should be stable')
+        self.assertNotEqual(_get_function_name(func2), name1)
+
+        # Registers every function, even when some are already registered.
+        select = Selector([('A',), ('x',)])
+        connection = select._connection
+        _register_function(connection, [func1])
+        _register_function(connection, [func1, func2])
+        cursor = connection.execute('SELECT {0}(1)'.format(_get_function_name(func2)))
+        self.assertEqual(cursor.fetchall(), [(False,)])
+
+    def test_native_predicates(self):
+        select = Selector([
+            ['A', 'B'],
+            ['abc', 1],
+            ['xabc', 2],
+            ['ABC', 3],
+            [5, 4],
+            [1.5, 5],
+        ])
+        self.assertEqual(select('B', A=Ellipsis).fetch(), [1, 2, 3, 4, 5])
+        self.assertEqual(select('B', A=int).fetch(), [4])
+        self.assertEqual(select('B', A={'abc', 5}).fetch(), [1, 4])
+
+        select = Selector([['A', 'B'], ['abc', 1], ['xabc', 2], ['ABC', 3]])
+        self.assertEqual(select('B', A=re.compile('^abc')).fetch(), [1])
+        self.assertEqual(select('B', A=re.compile('abc$')).fetch(), [1, 2])
+        self.assertEqual(select('B', A=re.compile('^abc$', re.I)).fetch(), [1, 3])
+        self.assertEqual(select('B', A=re.compile('^[ax]')).fetch(), [1, 2])
+
+    def test_native_regex_non_text(self):
+        """Like datatest's regex predicates, non-string values should
+        raise a TypeError (not be silently excluded).
+        """
+        select = Selector([['A', 'B'], ['abc', 1], [5, 2]])
+        regexes = [
+            re.compile('^abc'),            # <- GLOB
+            re.compile('abc', re.I),       # <- LIKE
+            re.compile('^a.c'),            # <- REGEXP
+        ]
+        for regex in regexes:
+            with self.assertRaisesRegex(TypeError, 'got int: 5'):
+                select('B', A=regex).fetch()
+
+    def test_native_regex_ignorecase_unicode(self):
+        """Python folds some non-ASCII characters to ASCII letters
+        (e.g., KELVIN SIGN to "k" and LATIN SMALL LETTER LONG S to
+        "s") but LIKE does not.
+        """
+        select = Selector([
+            ['A', 'B'],
+            [u'\u212aey', 1],  # <- KELVIN SIGN
+            [u'key', 2],
+            [u'\u017fun', 3],  # <- LATIN SMALL LETTER LONG S
+            [u'SUN', 4],
+        ])
+        regex = re.compile(u'key', re.IGNORECASE | re.UNICODE)
+        expected = [1, 2] if regex.match(u'\u212aey') else [2]
+        self.assertEqual(select('B', A=regex).fetch(), expected)
+
+        regex = re.compile(u'^sun$', re.IGNORECASE | re.UNICODE)
+        expected = [3, 4] if regex.match(u'\u017fun') else [4]
+        self.assertEqual(select('B', A=regex).fetch(), expected)
+
     def test_execute_query(self):
         data = [['A', 'B'], ['x', 101], ['y', 202], ['z', 303]]
         source = Selector(data)
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+import bisect
+import random
+from . import _unittest as unittest
+
+from datatest._query.sketch import HyperLogLog
+from datatest._query.sketch import QuantileSketch
+
+
+class TestHyperLogLog(unittest.TestCase):
+    def assertWithinError(self, sketch, expected):
+        estimate = sketch.estimate()
+        allowed = 4 * sketch.error * expected  # <- Four standard errors.
+        msg = 'estimate {0} not within {1} of {2}'.format(estimate, allowed, expected)
+        self.assertLessEqual(abs(estimate - expected), allowed, msg=msg)
+
+    def test_estimate(self):
+        sketch = HyperLogLog(precision=12)
+        sketch.update(range(20000))
+        sketch.update(range(10000))  # <- Repeated values.
+        self.assertWithinError(sketch, 20000)
+
+    def test_small_counts(self):
+        sketch = HyperLogLog()
+        self.assertEqual(sketch.estimate(), 0)
+
+        sketch.update(['a', 'b', 'c', 'a', 1, 1.0])  # <- 1 and 1.0 are equal.
+        self.assertEqual(sketch.estimate(), 4)
+
+    def test_error(self):
+        self.assertAlmostEqual(HyperLogLog(precision=14).error, 0.008125)
+        self.assertAlmostEqual(HyperLogLog(precision=4).error, 0.26)
+
+    def test_precision(self):
+        with self.assertRaises(ValueError):
+            HyperLogLog(precision=3)
+
+        with self.assertRaises(ValueError):
+            HyperLogLog(precision=17)
+
+    def test_merge(self):
+        sketch1 = HyperLogLog(precision=12)
+        sketch1.update(range(0, 15000))
+        sketch2 = HyperLogLog(precision=12)
+        sketch2.update(range(10000, 25000))
+        sketch1.merge(sketch2)
+        self.assertWithinError(sketch1, 25000)
+
+        with self.assertRaises(ValueError):
+            sketch1.merge(HyperLogLog(precision=10))
+
+
+class TestQuantileSketch(unittest.TestCase):
+    def setUp(self):
+        rand = random.Random(1234)
+        self.values = [rand.random() for _ in range(50000)]
+        self.sorted_values = sorted(self.values)
+
+    def assertWithinRankError(self, sketch, q):
+        value = sketch.quantile(q)
+        rank = bisect.bisect_left(self.sorted_values, value) / float(len(self.values))
+        msg = 'rank {0} not within {1} of {2}'.format(rank, sketch.rank_error, q)
+        self.assertLessEqual(abs(rank - q), sketch.rank_error, msg=msg)
+
+    def test_exact_for_few_values(self):
+        sketch = QuantileSketch(k=200)
+        sketch.update([5, 1, 4, 2, 3])
+        self.assertEqual(sketch.quantile(0.0), 1)
+        self.assertEqual(sketch.quantile(0.5), 3)
+        self.assertEqual(sketch.quantile(0.6), 3)
+        self.assertEqual(sketch.quantile(0.61), 4)
+        self.assertEqual(sketch.quantile(1.0), 5)
+
+    def test_quantile(self):
+        sketch = QuantileSketch(k=200)
+        sketch.update(self.values)
+        self.assertEqual(sketch.count, 50000)
+        self.assertLess(sum(len(x) for x in sketch._levels), 3 * 200 + 10)
+        for q in (0.0, 0.01, 0.25, 0.5, 0.75, 0.99, 1.0):
+            self.assertWithinRankError(sketch, q)
+
+    def test_reproducible(self):
+        sketch1 = QuantileSketch(k=50)
+        sketch1.update(self.values)
+        sketch2 = QuantileSketch(k=50)
+        sketch2.update(self.values)
+        self.assertEqual(sketch1.quantile(0.5), sketch2.quantile(0.5))
+
+    def test_merge(self):
+        sketch1 = QuantileSketch(k=200)
+        sketch1.update(self.values[:20000])
+        sketch2 = QuantileSketch(k=200)
+        sketch2.update(self.values[20000:])
+        sketch1.merge(sketch2)
+        self.assertEqual(sketch1.count, 50000)
+        for q in (0.1, 0.5, 0.9):
+            self.assertWithinRankError(sketch1, q)
+
+        with self.assertRaises(ValueError):
+            sketch1.merge(QuantileSketch(k=100))
+
+    def test_key(self):
+        sketch = QuantileSketch(key=lambda x: -x)
+        sketch.update([1, 2, 3])
+        self.assertEqual(sketch.quantile(0.0), 3)
+
+    def test_empty_and_bad_values(self):
+        sketch = QuantileSketch()
+        self.assertIsNone(sketch.quantile(0.5))
+
+        with self.assertRaises(ValueError):
+            sketch.quantile(1.5)
+
+        with self.assertRaises(ValueError):
+            QuantileSketch(k=4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,13 +10,20 @@ from datatest._load.temptable import (
     new_table_name,
     normalize_names,
     normalize_default,
+    normalize_dtypes,
+    infer_dtypes,
     create_table,
+    get_dtypes,
     get_columns,
     insert_records,
     alter_table,
     drop_table,
     savepoint,
     load_data,
+    get_indexes,
+    LoadProfile,
+    get_load_profile,
+    bulk_load,
 )
 
 
@@ -108,6 +115,59 @@ class TestNormalizeDefault(unittest.TestCase):
         self.assertEqual(normalized, "''")
 
 
+class TestNormalizeDtypes(unittest.TestCase):
+    def test_types_and_names(self):
+        dtypes = {'A': int, 'B': float, 'C': str, 'D': 'integer', 'E': 'NUMERIC'}
+        expected = {
+            '"A"': 'INTEGER',
+            '"B"': 'REAL',
+            '"C"': 'TEXT',
+            '"D"': 'INTEGER',
+            '"E"': 'NUMERIC',
+        }
+        self.assertEqual(normalize_dtypes(dtypes), expected)
+
+    def test_none(self):
+        self.assertEqual(normalize_dtypes(None), {})
+
+    def test_unsupported_type(self):
+        with self.assertRaises(ValueError):
+            normalize_dtypes({'A': list})
+
+        with self.assertRaises(ValueError):
+            normalize_dtypes({'A': 'INTEGER; DROP TABLE foo'})
+
+
+class TestInferDtypes(unittest.TestCase):
+    def test_strings(self):
+        records = [
+            ('x', '1', '1.5', '007', '', '1.5'),
+            ('y', '-20', '-0.25', '', '', '2'),
+            ('z', '', '1e+22', '12', '', '.5e3'),
+        ]
+        dtypes = infer_dtypes(['A', 'B', 'C', 'D', 'E', 'F'], records)
+        self.assertEqual(dtypes, {'B': 'INTEGER', 'C': 'REAL'})
+
+    def test_non_canonical_strings(self):
+        """Strings whose text would be changed by SQLite should not
+        be treated as numbers.
+        """
+        records = [
+            ('12345678901234567890123', '1.50', '+5', '-0', '9223372036854775807'),
+            ('1', '2.5', '5', '1', '1'),
+        ]
+        dtypes = infer_dtypes(['A', 'B', 'C', 'D', 'E'], records)
+        self.assertEqual(dtypes, {'E': 'INTEGER'})
+
+    def test_numbers(self):
+        records = [
+            (1, 1.5, True, None),
+            (2, 2, False, None),
+        ]
+        dtypes = infer_dtypes(['A', 'B', 'C', 'D'], records)
+        self.assertEqual(dtypes, {'A': 'INTEGER', 'B': 'REAL'})
+
+
 class TestCreateTable(unittest.TestCase):
     def setUp(self):
         connection = sqlite3.connect(':memory:')
@@ -130,6 +190,17 @@ class TestCreateTable(unittest.TestCase):
         create_table(self.cursor, 'test_table2', ['A', 'B'])  # <- Create table!
         self.assertEqual(self.count_tables(), 2, msg='two tables')
 
+    def test_regular_table(self):
+        create_table(self.cursor, 'test_table1', ['A', 'B'], temporary=False)
+        self.assertEqual(self.count_tables(), 0, msg='no temporary tables')
+
+        self.cursor.execute('''
+            SELECT COUNT(*)
+            FROM sqlite_master
+            WHERE type='table' AND name='test_table1'
+        ''')
+        self.assertEqual(self.cursor.fetchone()[0], 1)
+
     def test_default_value(self):
         # When unspecified, default is empty string.
         create_table(self.cursor, 'test_table1', ['A', 'B'])
@@ -155,6 +226,21 @@ class TestCreateTable(unittest.TestCase):
         ]
         self.assertEqual(self.cursor.fetchall(), expected)
 
+    def test_dtypes(self):
+        create_table(self.cursor, 'test_table1', ['A', 'B', 'C'],
+                     dtypes={'A': int, 'B': 'REAL'})
+        self.assertEqual(get_dtypes(self.cursor, 'test_table1'),
+                         {'A': 'INTEGER', 'B': 'REAL'})
+
+        self.cursor.execute("INSERT INTO test_table1 VALUES ('1', '2', '3')")
+        self.cursor.execute("INSERT INTO test_table1 (C) VALUES ('x')")
+        self.cursor.execute('SELECT * FROM test_table1')
+        expected = [
+            (1, 2.0, '3'),  # <- Converted by type affinity.
+            ('', '', 'x'),  # <- Defaults are unchanged.
+        ]
+        self.assertEqual(self.cursor.fetchall(), expected)
+
     def test_sqlite3_errors(self):
         """Sqlite errors should not be caught."""
         # Table already exists.
@@ -257,6 +343,16 @@ class TestInsertRecords(unittest.TestCase):
 
         self.assertEqual(results, [])
 
+    def test_batch_size(self):
+        cursor = self.cursor
+
+        cursor.execute('CREATE TEMPORARY TABLE test_table ("A", "B")')
+        records = iter([('x', 1), ('y', 2), ('z', 3)])
+        insert_records(cursor, 'test_table', ['A', 'B'], records, batch_size=2)
+
+        cursor.execute('SELECT * FROM test_table')
+        self.assertEqual(cursor.fetchall(), [('x', 1), ('y', 2), ('z', 3)])
+
     def test_sqlite3_errors(self):
         """Sqlite errors should not be caught."""
         # No such table.
@@ -371,6 +467,18 @@ class TestSavepoint(unittest.TestCase):
         cursor.execute('SELECT * FROM test_table')
         self.assertEqual(cursor.fetchall(), [], 'Table should exist but contain no records.')
 
+    def test_rollback_ends_transaction(self):
+        connection = self.cursor.connection
+        if not hasattr(connection, 'in_transaction'):  # New in 3.2.
+            return
+
+        try:
+            with savepoint(self.cursor):  # <- Rolled back!
+                raise Exception()
+        except Exception:
+            pass
+        self.assertFalse(connection.in_transaction)
+
     def test_nested_rollback(self):
         cursor = self.cursor
 
@@ -471,6 +579,37 @@ class TestLoadData(unittest.TestCase):
         self.cursor.execute('SELECT A, B FROM testtable2')
         self.assertEqual(self.cursor.fetchall(), [('x', 1), ('y', None), (None, 3)])
 
+    def test_dtypes(self):
+        load_data(self.cursor, 'testtable1', ['A', 'B'], [('x', '1')],
+                  dtypes={'B': int})
+        load_data(self.cursor, 'testtable1', ['A', 'C'], [('y', '2.5')],
+                  dtypes={'C': float})
+        self.cursor.execute('SELECT A, B, C FROM testtable1')
+        self.assertEqual(self.cursor.fetchall(), [('x', 1, ''), ('y', '', 2.5)])
+
+    def test_infer_dtypes(self):
+        records = [['A', 'B', 'C'], ['x', '1', '007'], ['y', '2', '010']]
+        load_data(self.cursor, 'testtable', records, dtypes='infer')
+        self.assertEqual(get_dtypes(self.cursor, 'testtable'), {'B': 'INTEGER'})
+
+        self.cursor.execute('SELECT A, B, C FROM testtable')
+        self.assertEqual(self.cursor.fetchall(), [('x', 1, '007'), ('y', 2, '010')])
+
+    def test_infer_dtypes_keeps_values(self):
+        records = [
+            ['A', 'B', 'C'],
+            ['12345678901234567890123', '1.50', '+5'],
+            ['1', '2.5', '5'],
+        ]
+        load_data(self.cursor, 'testtable', records, dtypes='infer')
+        self.assertEqual(get_dtypes(self.cursor, 'testtable'), {})
+
+        self.cursor.execute('SELECT A, B, C FROM testtable')
+        self.assertEqual(self.cursor.fetchall(), [
+            ('12345678901234567890123', '1.50', '+5'),
+            ('1', '2.5', '5'),
+        ])
+
     def test_empty_records(self):
         records = []
 
@@ -490,5 +629,86 @@ class TestLoadData(unittest.TestCase):
             load_data(self.cursor, 'testtable', columns, records)
 
 
+class TestGetIndexes(unittest.TestCase):
+    def setUp(self):
+        connection = sqlite3.connect(':memory:')
+        self.cursor = connection.cursor()
+
+    def test_get_indexes(self):
+        self.cursor.execute('CREATE TABLE test_table ("A", "B")')
+        self.assertEqual(get_indexes(self.cursor, 'test_table'), [])
+
+        sql = 'CREATE INDEX idx_a ON test_table ("A")'
+        self.cursor.execute(sql)
+        self.assertEqual(get_indexes(self.cursor, 'test_table'), [('idx_a', sql)])
+
+
+class TestGetLoadProfile(unittest.TestCase):
+    def test_none(self):
+        self.assertEqual(get_load_profile(None), temptable.load_profiles['default'])
+
+    def test_preset_name(self):
+        profile = get_load_profile('fast-ephemeral')
+        self.assertIsInstance(profile, LoadProfile)
+        self.assertEqual(profile.temp_store, 'MEMORY')
+        self.assertTrue(profile.defer_indexes)
+
+        profile = get_load_profile('low-memory')
+        self.assertEqual(profile.batch_size, 1000)
+
+    def test_mapping(self):
+        profile = get_load_profile({'batch_size': 500})
+        self.assertEqual(profile.batch_size, 500)
+        self.assertIsNone(profile.journal_mode, msg='unspecified fields use default')
+
+    def test_profile_object(self):
+        profile = LoadProfile(100, None, None, None, None, False)
+        self.assertIs(get_load_profile(profile), profile)
+
+    def test_unknown_name(self):
+        with self.assertRaises(ValueError):
+            get_load_profile('bad-name')
+
+
+class TestBulkLoad(unittest.TestCase):
+    def setUp(self):
+        connection = sqlite3.connect(':memory:')
+        connection.isolation_level = None
+        self.cursor = connection.cursor()
+
+    def get_pragma(self, name):
+        self.cursor.execute('PRAGMA {0}'.format(name))
+        return self.cursor.fetchone()[0]
+
+    def test_restore_pragmas(self):
+        cache_size = self.get_pragma('cache_size')
+        temp_store = self.get_pragma('temp_store')
+
+        with bulk_load(self.cursor, 'test_table', 'fast-ephemeral'):
+            self.assertEqual(self.get_pragma('cache_size'), -262144)
+            self.assertEqual(self.get_pragma('temp_store'), 2)  # <- 2 is MEMORY.
+            load_data(self.cursor, 'test_table', ['A', 'B'], [('x', 1)])
+
+        self.assertEqual(self.get_pragma('cache_size'), cache_size)
+        self.assertEqual(self.get_pragma('temp_store'), temp_store)
+
+    def test_defer_indexes(self):
+        self.cursor.execute('CREATE TABLE test_table ("A", "B")')
+        self.cursor.execute('CREATE INDEX idx_a ON test_table ("A")')
+
+        with bulk_load(self.cursor, 'test_table', {'defer_indexes': True}):
+            self.assertEqual(get_indexes(self.cursor, 'test_table'), [])
+            load_data(self.cursor, 'test_table', ['A', 'B'], [('x', 1)])
+
+        indexes = get_indexes(self.cursor, 'test_table')
+        self.assertEqual([name for name, _ in indexes], ['idx_a'])
+
+    def test_default_profile(self):
+        cache_size = self.get_pragma('cache_size')
+        with bulk_load(self.cursor, 'test_table') as profile:
+            self.assertEqual(profile, temptable.load_profiles['default'])
+            self.assertEqual(self.get_pragma('cache_size'), cache_size)
+
+
 if __name__ == '__main__':
     unittest.main()
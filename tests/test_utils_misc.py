@@ -68,6 +68,13 @@ class TestExpectsMultipleParams(unittest.TestCase):
         expects_multiple = _utils._expects_multiple_params(userfunc)
         self.assertIs(expects_multiple, True)
 
+    def test_cached(self):
+        def userfunc(a, b):
+            return True
+        self.assertIs(_utils._expects_multiple_params(userfunc), True)
+        self.assertIs(_utils._multiple_params_cache[userfunc], True)
+        self.assertIs(_utils._expects_multiple_params(userfunc), True)
+
     def test_builtin_type(self):
         expects_multiple = _utils._expects_multiple_params(int)
         self.assertIsNone(expects_multiple)
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from . import _unittest as unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from datatest._query import vectorize
+from datatest._query.vectorize import CannotVectorize
+
+
+class TestIsUfunc(unittest.TestCase):
+    def test_not_ufunc(self):
+        self.assertFalse(vectorize.is_ufunc(abs))
+        self.assertFalse(vectorize.is_ufunc(lambda x: x * 2))
+
+    @unittest.skipIf(not numpy, 'numpy not found')
+    def test_ufunc(self):
+        self.assertTrue(vectorize.is_ufunc(numpy.sqrt))
+        self.assertFalse(vectorize.is_ufunc(numpy.add), msg='takes 2 arguments')
+        self.assertFalse(vectorize.is_ufunc(numpy.modf), msg='returns 2 values')
+
+
+@unittest.skipIf(numpy, 'numpy found')
+class TestNumpyNotInstalled(unittest.TestCase):
+    def test_cannot_vectorize(self):
+        with self.assertRaises(CannotVectorize):
+            vectorize.execute([('sum', None)], [1, 2, 3])
+
+
+@unittest.skipIf(not numpy, 'numpy not found')
+class TestExecute(unittest.TestCase):
+    def test_aggregates(self):
+        values = [3, 1, 4, 1, 5]
+        self.assertEqual(vectorize.execute([('sum', None)], values), 14.0)
+        self.assertEqual(vectorize.execute([('count', None)], values), 5)
+        self.assertEqual(vectorize.execute([('avg', None)], values), 2.8)
+        self.assertEqual(vectorize.execute([('min', None)], values), 1)
+        self.assertEqual(vectorize.execute([('max', None)], values), 5)
+
+    def test_empty(self):
+        self.assertIsNone(vectorize.execute([('sum', None)], []))
+        self.assertIsNone(vectorize.execute([('avg', None)], []))
+        self.assertIsNone(vectorize.execute([('min', None)], []))
+        self.assertEqual(vectorize.execute([('count', None)], []), 0)
+
+    def test_sum_order(self):
+        """Floats should be added in order (like the built-in sum)."""
+        values = [0.1] * 10 + [1e16, 1.0, -1e16]
+        self.assertEqual(vectorize.execute([('sum', None)], values), sum(values))
+
+    def test_min_max_original_value(self):
+        values = [2.5, 1, 3, 1.0]
+        result = vectorize.execute([('min', None)], values)
+        self.assertIsInstance(result, int, msg='should return first minimum')
+        result = vectorize.execute([('max', None)], values)
+        self.assertEqual(result, 3)
+        self.assertIsInstance(result, int)
+
+    def test_map_filter(self):
+        steps = [('filter', numpy.isfinite), ('map', numpy.negative)]
+        result = vectorize.execute(steps, [1.0, float('inf'), 2.0])
+        self.assertEqual(result, [-1.0, -2.0])
+
+        steps = [('filter', numpy.signbit)]
+        self.assertEqual(vectorize.execute(steps, [1, -2, 3, -4]), [-2, -4])
+
+        steps = [('map', numpy.abs), ('max', None)]
+        self.assertEqual(vectorize.execute(steps, [1, -7, 3]), 7)
+
+    def test_cannot_vectorize(self):
+        with self.assertRaises(CannotVectorize):
+            vectorize.execute([('sum', None)], ['1', '2'])
+
+        with self.assertRaises(CannotVectorize):
+            vectorize.execute([('sum', None)], [1, None, 2])
+
+        with self.assertRaises(CannotVectorize):
+            vectorize.execute([('sum', None)], [(1, 2), (3, 4)])
+
+        with self.assertRaises(CannotVectorize):
+            vectorize.execute([('min', None)], [1.0, float('nan')])
+
+        with self.assertRaises(CannotVectorize):
+            vectorize.execute([('map', numpy.negative)], [True, False])
+
+
+if __name__ == '__main__':
+    unittest.main()